@@ -1,18 +1,50 @@
 # -*- coding: utf-8 -*-
+from __future__ import annotations
 import streamlit as st
-import yfinance as yf
-import pandas as pd
-from core_strategy import decide
-from narrator import humanize
-from backtest import run_backtest
+# остальное импортируется по месту: первая отрисовка и вкладка «Анализ» не тянут бэктест,
+# robustness и их зависимости (см. benchmarks/import_time.py)
 
 st.set_page_config(page_title="CapinteL-Q AI (with filters)", page_icon="📈", layout="centered")
 st.title("CapinteL-Q AI — живой анализ рынка (фильтры включены)")
 
 @st.cache_data(ttl=900)
 def load_yahoo(ticker: str, years: str) -> pd.DataFrame:
-    df = yf.download(ticker, period=years, interval="1d", auto_adjust=False, progress=False)
-    return df.rename(columns=str.title)[["Open","High","Low","Close"]].dropna()
+    # локальное хранилище: с диска + докачка хвоста, а не полная загрузка на каждый запрос
+    import price_store
+    return price_store.load_history(ticker, years)
+
+def job_panel(key: str, render, what: str):
+    """
+    Статус фоновой задачи из st.session_state[key]; пока она идёт, блок перерисовывается
+    сам раз в секунду, по готовности — render(job, result).
+    """
+    if key not in st.session_state:
+        return
+    import jobs
+    sched = jobs.default_scheduler()
+    jid = st.session_state[key]
+    job = sched.status(jid)
+    active = job is not None and job["status"] in jobs.ACTIVE
+
+    @st.fragment(run_every=1.0 if active else None)
+    def panel():
+        job = sched.status(jid)
+        if job is None:
+            st.info("Задача не найдена.")
+        elif job["status"] in jobs.ACTIVE:
+            st.progress(job.get("progress", 0.0), text=f"{job['spec']['ticker']}: {job.get('message', '')}")
+        elif active:  # только что завершилась — полный перезапуск, чтобы снять опрос
+            st.rerun()
+        elif job["status"] == "failed":
+            st.error(f"Ошибка {what}: {job.get('error')}")
+        else:
+            res = sched.result(jid)
+            if res is None:
+                st.info("Результат задачи удалён — запустите заново.")
+            else:
+                render(job, res)
+
+    panel()
 
 # --- Input ---
 col1, col2 = st.columns([2,1])
@@ -51,9 +83,11 @@ with tab1:
                         else:
                             pos = (data["Close"].iloc[-1] - rng["min"].iloc[-1]) / max(1e-9, (rng["max"].iloc[-1]-rng["min"].iloc[-1]))
                             hz = "LT" if pos > 0.85 or pos < 0.15 else ("MID" if 0.25 < pos < 0.75 else "ST")
-                    res = decide(data, hz)
-                    txt = humanize(ticker, hz, res)
+                    import decision_cache
+                    res, txt = decision_cache.default_cache().analyze(ticker, data, hz)
                     st.markdown(txt)
+                    c = decision_cache.default_cache().stats()
+                    st.caption(f"Кэш решений: {c['hits'] + c['disk_hits']} попаданий, {c['misses']} промахов")
         except Exception as e:
             st.error(f"Ошибка анализа: {e}")
 
@@ -67,42 +101,99 @@ with tab2:
         capital = st.number_input("Стартовый капитал, $", 10000, 10000000, 100000, step=10000)
     with colb3:
         risk = st.slider("Риск на сделку", 0.2, 5.0, 1.0, step=0.2) / 100.0
+    with st.expander("Исполнение сделок"):
+        realistic = st.checkbox("Реалистичное исполнение (гэпы, проскальзывание, комиссии)", value=True)
+        colf1, colf2, colf3 = st.columns(3)
+        with colf1:
+            fill_entry = st.selectbox("Вход", ["Открытие следующего бара", "Уровень сигнала"])
+            breakeven = st.checkbox("Стоп в безубыток после TP1")
+        with colf2:
+            fill_path = st.selectbox("Стоп и цель на одной свече",
+                                     ["Сначала стоп", "По форме свечи", "Сначала цель"])
+        with colf3:
+            slippage = st.number_input("Проскальзывание, б.п.", 0.0, 100.0, 5.0, step=1.0)
+            commission = st.number_input("Комиссия, б.п. оборота", 0.0, 50.0, 1.0, step=0.5)
+    show_prof = st.checkbox("Профиль по стадиям (время, память)")
 
     if st.button("Запустить Backtest"):
+        # считается в фоновом процессе: страница не блокируется, результат переживает перезапуск
+        import jobs
+        fills = None
+        if realistic:
+            fills = {"entry": "next_open" if fill_entry.startswith("Открытие") else "signal",
+                     "path": {"Сначала стоп": "worst", "По форме свечи": "ohlc", "Сначала цель": "best"}[fill_path],
+                     "slippage_bps": slippage, "commission_bps": commission, "breakeven": breakeven}
         try:
-            with st.spinner("Грузим данные и считаем сделки..."):
-                data = load_yahoo(ticker, years)
-                hz = map_hz(bt_hz_label)
-                eq, tr = run_backtest(data, hz, capital, risk)
-                if eq is None or eq.empty:
-                    st.info("Нет сделок по заданным условиям.")
-                else:
-                    st.line_chart(eq, y="equity")
-                    st.write(f"Сделки: {len(tr)}")
-                    if not tr.empty:
-                        st.dataframe(tr)
-
-                        # --- метрики бэктеста ---
-                        if "tp1_hit" in tr.columns:
-                            tr["tp1_hit"] = tr["tp1_hit"].fillna(False)
-                            wins = int(tr["tp1_hit"].sum())
-                        else:
-                            wins = 0
-                        total = len(tr)
-                        hit_rate = 100.0 * wins / max(1, total)
-
-                        total_pnl = float(tr.get("pnl", pd.Series([0]*total)).sum())
-                        roll_max = eq["equity"].cummax()
-                        drawdown = (eq["equity"] - roll_max) / roll_max
-                        max_dd = 100.0 * float(drawdown.min())
-
-                        st.markdown(
-                            f"**Hit-rate (TP1 до SL):** {hit_rate:.1f}%  \n"
-                            f"**Сделок:** {total}  \n"
-                            f"**Итоговый P/L:** ${total_pnl:,.0f}  \n"
-                            f"**Макс. просадка:** {max_dd:.1f}%"
-                        )
+            st.session_state["bt_job"] = jobs.default_scheduler().submit(
+                "backtest", ticker=ticker, period=years, horizon=map_hz(bt_hz_label),
+                capital=capital, risk=risk, fills=fills, profile=show_prof)
         except Exception as e:
             st.error(f"Ошибка бэктеста: {e}")
 
+    def show_backtest(job: dict, res: dict):
+        spec = job["spec"]
+        eq, tr, m = res["equity"], res["trades"], res["metrics"]
+        if res.get("profile") is not None:
+            st.dataframe(res["profile"].round(4))
+        if eq is None or eq.empty:
+            st.info("Нет сделок по заданным условиям.")
+            return
+        st.line_chart(eq, y="equity")
+        st.write(f"Сделки: {len(tr)}")
+        if tr.empty:
+            return
+        st.dataframe(tr)
+
+        # --- метрики бэктеста ---
+        hit_rate, total = m["hit_rate"], m["trades"]
+        total_pnl, max_dd = m["total_pnl"], m["max_dd_pct"]
+
+        st.markdown(
+            f"**Hit-rate (TP1 до SL):** {hit_rate:.1f}%  \n"
+            f"**Сделок:** {total}  \n"
+            f"**Итоговый P/L:** ${total_pnl:,.0f}  \n"
+            f"**Макс. просадка:** {max_dd:.1f}%"
+        )
+        if spec.get("fills") is not None:
+            st.markdown(
+                f"**Доля прибыльных:** {m['win_rate']:.1f}%  \n"
+                f"**Ожидание на сделку:** ${m['expectancy']:,.0f} ({m['expectancy_r']:+.2f} R)  \n"
+                f"**Profit factor:** {m['profit_factor']:.2f}  \n"
+                f"**Средние MAE / MFE:** {m['avg_mae_r']:.2f} R / {m['avg_mfe_r']:.2f} R  \n"
+                f"**Комиссии:** ${m['commission']:,.0f}"
+            )
+
+    job_panel("bt_job", show_backtest, "бэктеста")
+
+    st.markdown("**Устойчивость:** walk-forward по окнам истории и Monte Carlo по сделкам")
+    if st.button("Проверить устойчивость"):
+        # та же очередь задач, что у бэктеста: процессы spawn, общий лимит параллелизма
+        import jobs
+        try:
+            st.session_state["rb_job"] = jobs.default_scheduler().submit(
+                "robustness", ticker=ticker, period=years, horizon=map_hz(bt_hz_label),
+                capital=capital, risk=risk, train_bars=252, test_bars=63, n_paths=5000, seed=0)
+        except Exception as e:
+            st.error(f"Ошибка проверки устойчивости: {e}")
+
+    def show_robustness(job: dict, res: dict):
+        wf = res["walk_forward"]
+        if len(wf):
+            st.dataframe(wf[["test_start", "test_end", "test_return_pct", "test_max_dd_pct", "test_trades"]])
+        if res["distribution"] is not None:
+            st.dataframe(res["distribution"].round(1))
+        else:
+            st.info("Нет сделок для Monte Carlo.")
+
+    job_panel("rb_job", show_robustness, "проверки устойчивости")
+
+    if "bt_job" in st.session_state or "rb_job" in st.session_state:
+        import jobs
+        with st.expander("Последние задачи"):
+            recent = jobs.default_scheduler().jobs(10)
+            if recent:
+                st.dataframe([{"id": j["id"], "вид": j["kind"], "тикер": j["spec"].get("ticker"),
+                               "горизонт": j["spec"].get("horizon"), "статус": j["status"],
+                               "прогресс": j.get("progress", 0.0)} for j in recent])
+
 st.caption("⚠️ Результаты — не инвестиционный совет. Продукт демонстрационный, логика скрыта от клиента.")
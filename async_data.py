@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+Асинхронная загрузка истории многих тикеров: ограниченный параллелизм, повторы с backoff
+и склейка одинаковых запросов, которые уже выполняются.
+
+    frames = load_many(["QQQ", "SPY", "AAPL"], "3y")            # {тикер: DataFrame | Exception}
+
+    fetcher = AsyncFetcher(CSVSource("fixtures").fetch)         # офлайн: CSVSource / FrameSource
+    frames = await fetcher.fetch_many(tickers)
+
+Источник — функция fn(ticker, arg) -> DataFrame: по умолчанию price_store.load_history
+(arg — период), подходит и fetch любого источника PriceStore (arg — start).
+Обычная функция выполняется в пуле из max_concurrency потоков: yfinance держит один
+HTTP-сеанс на процесс, так что соединения переиспользуются. async-функция (свой клиент,
+фейковый сервер) вызывается напрямую под тем же семафором.
+"""
+from __future__ import annotations
+import asyncio
+import inspect
+import random
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+
+# ошибки, которые повтором не лечатся: нет тикера/файла, неверные аргументы
+FATAL = (FileNotFoundError, KeyError, ValueError, TypeError)
+
+class AsyncFetcher:
+    def __init__(self, fn=None, max_concurrency: int = 8, retries: int = 2, backoff: float = 0.5,
+                 max_backoff: float = 8.0, timeout: float | None = None):
+        if fn is None:
+            from price_store import load_history
+            fn = load_history
+        self.fn = fn
+        self.is_async = inspect.iscoroutinefunction(fn)
+        self.max_concurrency = max_concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.calls = self.coalesced = self.retried = 0
+        self._pool = None if self.is_async else ThreadPoolExecutor(max_concurrency, thread_name_prefix="fetch")
+        # семафор и запросы «в полёте» привязаны к циклу событий
+        self._loop = None
+        self._sem: asyncio.Semaphore | None = None
+        self._inflight: dict[tuple, asyncio.Task] = {}
+
+    def _bind(self):
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop, self._sem, self._inflight = loop, asyncio.Semaphore(self.max_concurrency), {}
+
+    async def _call(self, ticker: str, arg):
+        if self.is_async:
+            coro = self.fn(ticker, arg)
+        else:
+            coro = self._loop.run_in_executor(self._pool, self.fn, ticker, arg)
+        return await (asyncio.wait_for(coro, self.timeout) if self.timeout else coro)
+
+    async def _fetch(self, ticker: str, arg) -> pd.DataFrame:
+        for attempt in range(self.retries + 1):
+            async with self._sem:
+                self.calls += 1
+                try:
+                    return await self._call(ticker, arg)
+                except FATAL:
+                    raise
+                except Exception:
+                    if attempt == self.retries:
+                        raise
+            self.retried += 1
+            # экспоненциальная пауза с полным джиттером — вне семафора
+            await asyncio.sleep(random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt)))
+
+    async def fetch(self, ticker: str, arg=None) -> pd.DataFrame:
+        """Один тикер; повторный запрос того же (ticker, arg), пока первый не завершён, ждёт его."""
+        self._bind()
+        key = (ticker, arg)
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._loop.create_task(self._fetch(ticker, arg))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    async def fetch_many(self, tickers, arg=None) -> dict:
+        """{тикер: DataFrame или исключение} — ошибка одного тикера не прерывает остальные."""
+        tickers = list(dict.fromkeys(tickers))
+        res = await asyncio.gather(*(self.fetch(t, arg) for t in tickers), return_exceptions=True)
+        return dict(zip(tickers, res))
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+
+def load_many(tickers, arg="3y", fn=None, max_concurrency: int = 8, **kw) -> dict:
+    """Синхронная обёртка fetch_many() для скриптов, сканера и Streamlit."""
+    fetcher = AsyncFetcher(fn, max_concurrency, **kw)
+    try:
+        return asyncio.run(fetcher.fetch_many(tickers, arg))
+    finally:
+        fetcher.close()
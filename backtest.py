@@ -1,76 +1,140 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 import pandas as pd
-from core_strategy import decide
+from core_strategy import MTFBars, decide, decide_series
+from ledger import LONG, SIDES, EquityCurve, TradeLedger
+from profiling import stage
 
-def run_backtest(df: pd.DataFrame, horizon: str, initial_capital=100000, risk_per_trade=0.01):
+def _manage_position(led: TradeLedger, high: float, low: float, date, cap: float) -> float:
+    """SL/TP1/TP2 по High/Low бара для открытой сделки журнала. Возвращает cap."""
+    r = led.rows[led.open_row]
+    entry, tp1, tp2, sl, size = float(r["entry"]), float(r["tp1"]), float(r["tp2"]), float(r["sl"]), int(r["size"])
+
+    if r["side"] == LONG:
+        if low <= sl:
+            pnl = (sl - entry) * size
+            cap += pnl
+            led.close(sl, pnl, date)
+            return cap
+        if high >= tp1 and not r["tp1_hit"]:
+            cap += (tp1 - entry) * size*0.5; r["tp1_hit"] = True
+        if high >= tp2:
+            pnl = (tp2 - entry) * size*0.5
+            cap += pnl
+            led.close(tp2, pnl + (tp1-entry) * size*0.5, date)
+
+    else:  # SHORT
+        if high >= sl:
+            pnl = (entry - sl) * size
+            cap += pnl
+            led.close(sl, pnl, date)
+            return cap
+        if low <= tp1 and not r["tp1_hit"]:
+            cap += (entry - tp1) * size*0.5; r["tp1_hit"] = True
+        if low <= tp2:
+            pnl = (entry - tp2) * size*0.5
+            cap += pnl
+            led.close(tp2, pnl + (entry-tp1) * size*0.5, date)
+    return cap
+
+def run_backtest(df: pd.DataFrame, horizon: str, initial_capital=100000, risk_per_trade=0.01,
+                 params: dict | None = None, features: dict | None = None, ticker: str = ""):
+    """
+    Один проход: решения по всем барам считает decide_series(), позиция ведётся по массивам.
+    Сделки и equity совпадают с run_backtest_replay() бар в бар.
+    params — переопределение порогов стратегии, features — готовый series_features(df, horizon),
+    ticker — для календаря событий.
+    """
+    sig = decide_series(df, horizon, params, features, ticker)
+    with stage("simulate"):
+        return simulate(df, sig, initial_capital, risk_per_trade)
+
+def simulate(df: pd.DataFrame, sig: pd.DataFrame, initial_capital=100000, risk_per_trade=0.01, start: int = 59):
+    """
+    Ведение позиции по готовым сигналам decide_series() (колонки base_*).
+    start — первый бар торговли (по умолчанию как в replay: после 60 баров прогрева).
+    """
+    cap = initial_capital
+    first, last = max(59, start), len(df) - 1
+    led = TradeLedger()
+    days = df.index.normalize().values
+    curve = EquityCurve(days[first:max(first, last)])
+
+    act = sig["base_action"].to_numpy()
+    entries, tp1s, tp2s, sls = (sig[f"base_{k}"].to_numpy() for k in ("entry", "tp1", "tp2", "sl"))
+    highs = df["High"].to_numpy()
+    lows = df["Low"].to_numpy()
+
+    # бар i в replay видит df.iloc[:i] -> работаем с последним баром префикса t = i-1
+    for t in range(first, last):
+        date = days[t]
+
+        # управление активной позицией
+        if led.open_row >= 0:
+            cap = _manage_position(led, highs[t], lows[t], date, cap)
+
+        # открытие новой позиции
+        if led.open_row < 0 and act[t] != "WAIT":
+            entry, tp1, tp2, sl = float(entries[t]), float(tp1s[t]), float(tp2s[t]), float(sls[t])
+            risk_amt = cap * risk_per_trade
+            risk_per_share = abs(entry - sl)
+            if risk_per_share > 0:
+                size = max(1, int(risk_amt / risk_per_share))
+                led.open(SIDES[act[t]], entry, tp1, tp2, sl, size, date)
+
+        curve.append(cap)
+
+    return curve.to_frame(), led.to_frame()
+
+def backtest_metrics(eq: pd.DataFrame, tr: pd.DataFrame, initial_capital=100000) -> dict:
+    """Сводка прогона: hit-rate (TP1 до SL), число сделок, P/L, доходность и макс. просадка, %."""
+    total = len(tr)
+    wins = int(tr["tp1_hit"].fillna(False).sum()) if total and "tp1_hit" in tr.columns else 0
+    total_pnl = float(tr["pnl"].sum()) if total and "pnl" in tr.columns else 0.0
+    if len(eq):
+        roll_max = eq["equity"].cummax()
+        max_dd = 100.0 * float(((eq["equity"] - roll_max) / roll_max).min())
+        ret = 100.0 * (float(eq["equity"].iloc[-1]) / initial_capital - 1.0)
+    else:
+        max_dd = ret = 0.0
+    return {
+        "return_pct": ret,
+        "max_dd_pct": max_dd,
+        "hit_rate": 100.0 * wins / max(1, total),
+        "trades": total,
+        "total_pnl": total_pnl,
+    }
+
+def run_backtest_replay(df: pd.DataFrame, horizon: str, initial_capital=100000, risk_per_trade=0.01):
+    """Исходный эталон: decide() на каждом префиксе, O(N²). Для сверки с run_backtest()."""
     cap = initial_capital
-    pos = None
-    trades = []
-    equity = []
+    led = TradeLedger()
+    days = df.index.normalize().values
+    curve = EquityCurve(days[59:len(df) - 1])
 
+    bars = None
     for i in range(60, len(df)):
-        sub = df.iloc[:i].copy()
-        dec = decide(sub, horizon)
-        price = sub["Close"].iloc[-1]
-        date  = sub.index[-1].date()
+        sub = df.iloc[:i]
+        # W/M/Y-агрегаты дописываются по бару, а не ресэмплятся заново на каждом префиксе
+        with stage("resample"):
+            bars = MTFBars(sub) if bars is None else bars.refresh(sub)
+        dec = decide(sub, horizon, bars)
+        date = days[i - 1]
 
         # управление активной позицией
-        if pos:
-            high = sub["High"].iloc[-1]
-            low  = sub["Low"].iloc[-1]
-            closed = False
-
-            if pos["side"] == "LONG":
-                if low <= pos["sl"]:
-                    pnl = (pos["sl"] - pos["entry"]) * pos["size"]
-                    cap += pnl
-                    pos["exit"], pos["pnl"], pos["exit_date"] = pos["sl"], pnl, date
-                    trades.append(pos); pos=None; closed=True
-                if not closed:
-                    if high >= pos["tp1"] and not pos.get("tp1_hit"):
-                        pnl = (pos["tp1"] - pos["entry"]) * pos["size"]*0.5
-                        cap += pnl; pos["tp1_hit"]=True
-                    if high >= pos["tp2"]:
-                        pnl = (pos["tp2"] - pos["entry"]) * pos["size"]*0.5
-                        cap += pnl
-                        pos["exit"], pos["pnl"], pos["exit_date"] = pos["tp2"], pnl + (pos["tp1"]-pos["entry"]) * pos["size"]*0.5, date
-                        trades.append(pos); pos=None
-
-            else:  # SHORT
-                if high >= pos["sl"]:
-                    pnl = (pos["entry"] - pos["sl"]) * pos["size"]
-                    cap += pnl
-                    pos["exit"], pos["pnl"], pos["exit_date"] = pos["sl"], pnl, date
-                    trades.append(pos); pos=None; closed=True
-                if not closed:
-                    if low <= pos["tp1"] and not pos.get("tp1_hit"):
-                        pnl = (pos["entry"] - pos["tp1"]) * pos["size"]*0.5
-                        cap += pnl; pos["tp1_hit"]=True
-                    if low <= pos["tp2"]:
-                        pnl = (pos["entry"] - pos["tp2"]) * pos["size"]*0.5
-                        cap += pnl
-                        pos["exit"], pos["pnl"], pos["exit_date"] = pos["tp2"], pnl + (pos["entry"]-pos["tp1"]) * pos["size"]*0.5, date
-                        trades.append(pos); pos=None
+        if led.open_row >= 0:
+            cap = _manage_position(led, sub["High"].iloc[-1], sub["Low"].iloc[-1], date, cap)
 
         # открытие новой позиции
-        if (pos is None) and (dec["base"]["action"] in ["LONG","SHORT"]):
+        if led.open_row < 0 and (dec["base"]["action"] in ["LONG","SHORT"]):
             entry, tp1, tp2, sl = dec["base"]["entry"], dec["base"]["tp1"], dec["base"]["tp2"], dec["base"]["sl"]
             if None not in [entry,tp1,tp2,sl]:
                 risk_amt = cap * risk_per_trade
                 risk_per_share = abs(entry - sl)
                 if risk_per_share > 0:
                     size = max(1, int(risk_amt / risk_per_share))
-                    pos = {
-                        "side": dec["base"]["action"],
-                        "entry": entry, "tp1": tp1, "tp2": tp2, "sl": sl,
-                        "size": size, "entry_date": date, "comment": ""
-                    }
-
-        equity.append({"date": date, "equity": cap})
+                    led.open(SIDES[dec["base"]["action"]], entry, tp1, tp2, sl, size, date)
 
-    eq = pd.DataFrame(equity).set_index("date")
-    tr = pd.DataFrame(trades)
-    return eq, tr
+        curve.append(cap)
 
-        
+    return curve.to_frame(), led.to_frame()
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""
+Микро-бенчмарк heikin_ashi: прежний цикл по iat против ewm-версии.
+Запуск из корня репозитория:  python -m benchmarks.bench_heikin_ashi
+"""
+from __future__ import annotations
+import time
+import pandas as pd
+from core_strategy import heikin_ashi
+from benchmarks.synthetic import synthetic_ohlc
+
+def heikin_ashi_loop(df: pd.DataFrame) -> pd.DataFrame:
+    # прежняя реализация — эталон для сверки и замера
+    ha = pd.DataFrame(index=df.index)
+    o, h, l, c = df["Open"], df["High"], df["Low"], df["Close"]
+    ha["HA_Close"] = (o + h + l + c) / 4.0
+    ha["HA_Open"] = ha["HA_Close"].copy()
+    for i in range(1, len(ha)):
+        ha.iat[i, ha.columns.get_loc("HA_Open")] = (
+            ha.iat[i-1, ha.columns.get_loc("HA_Open")] + ha.iat[i-1, ha.columns.get_loc("HA_Close")]
+        ) / 2.0
+    return ha
+
+def best_of(fn, df, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(df)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+def main():
+    print(f"{'bars':>8} {'loop, s':>10} {'ewm, s':>10} {'x':>8}")
+    for n in (1_000, 10_000, 100_000):
+        df = synthetic_ohlc(n)
+        pd.testing.assert_frame_equal(heikin_ashi(df), heikin_ashi_loop(df), check_exact=True)
+        t_loop = best_of(heikin_ashi_loop, df, 1 if n >= 100_000 else 3)
+        t_fast = best_of(heikin_ashi, df, 5)
+        print(f"{n:>8} {t_loop:>10.4f} {t_fast:>10.4f} {t_loop / t_fast:>8.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+Холодный старт: время импорта модулей в свежем интерпретаторе (python -X importtime).
+
+    python -m benchmarks.import_time            # таблица: модуль, мс (лучший из --repeat), тяжёлые зависимости
+    python -m benchmarks.import_time --check    # код выхода 1 при нарушении бюджета
+
+Бюджет двух видов: FORBIDDEN — что модуль не должен загружать вовсе (проверяется строго),
+BUDGET_MS — потолок собственного времени импорта без BASE: numpy/pandas, если модуль их
+тянет, импортируются заранее и меряются отдельно (base ms). Холодный импорт стандартной
+библиотеки (STDLIB: typing, json, re, ...) модулю не подконтролен и сильно шумит — он тоже
+загружается до замера и в own ms не входит.
+"""
+from __future__ import annotations
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY = ("numpy", "pandas", "yfinance", "streamlit", "backtest", "robustness", "concurrent.futures.process")
+BASE = ("numpy", "pandas")
+STDLIB = ("typing", "json", "re", "enum", "hashlib", "contextlib", "concurrent.futures",
+          "datetime", "threading", "tracemalloc")
+
+# модуль -> чего он не должен тянуть при импорте
+FORBIDDEN = {
+    "core_strategy": ("pandas", "yfinance", "streamlit", "backtest"),
+    "profiling": ("pandas",),
+    "decision_cache": ("yfinance", "streamlit", "backtest"),
+    "price_store": ("yfinance", "streamlit", "backtest"),
+    "scanner": ("yfinance", "streamlit", "backtest"),
+    "streaming": ("yfinance", "streamlit", "backtest"),
+    "backtest": ("yfinance", "streamlit"),
+    "jobs": ("pandas", "yfinance", "streamlit", "backtest"),
+    "events": ("pandas", "yfinance", "streamlit", "backtest"),
+}
+# модуль -> мс собственного импорта (без BASE и STDLIB)
+BUDGET_MS = {
+    "core_strategy": 15.0,
+    "profiling": 10.0,
+    "decision_cache": 20.0,
+    "price_store": 15.0,
+    "scanner": 40.0,     # concurrent.futures.process + multiprocessing (~20 мс)
+    "streaming": 15.0,
+    "backtest": 15.0,
+    "jobs": 10.0,
+    "events": 15.0,
+}
+
+def _probe(module: str, pre: tuple = ()) -> tuple[dict[str, float], list[str]]:
+    """Кумулятивное время импорта (мс) модулей верхнего уровня и загруженные HEAVY (до pre)."""
+    code = (f"import sys; loaded = [m for m in {HEAVY!r} if m in sys.modules]; "
+            + "".join(f"import {m}; " for m in pre)
+            + f"import {module}; "
+            f"print(','.join(m for m in {HEAVY!r} if m in sys.modules and m not in loaded))")
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    env.pop("PYTHONDONTWRITEBYTECODE", None)  # меряем запуск с готовыми .pyc, а не компиляцию
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=ROOT, env=env,
+                         capture_output=True, text=True, check=True)
+    cum = {}
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, c, name = line[len("import time:"):].split("|")
+        if not c.strip().isdigit():
+            continue
+        if not name.startswith("  "):  # верхний уровень: импорт из -c, не вложенный
+            cum[name.strip()] = int(c) / 1000.0
+    loaded = [m for m in out.stdout.strip().split(",") if m]
+    return cum, loaded
+
+def measure(module: str, repeat: int = 5) -> dict:
+    _, loaded = _probe(module)  # что модуль тянет сам по себе
+    base_pre = tuple(m for m in BASE if m in loaded and m != module)
+    best = None
+    for _ in range(repeat):
+        cum, _ = _probe(module, STDLIB + base_pre)
+        own, base = cum.get(module, 0.0), sum(cum.get(m, 0.0) for m in base_pre)
+        if best is None or own + base < best["own_ms"] + best["base_ms"]:
+            best = {"module": module, "own_ms": own, "base_ms": base, "loaded": loaded}
+    return best
+
+def check(rows: list[dict]) -> list[str]:
+    errors = []
+    for r in rows:
+        bad = [m for m in FORBIDDEN.get(r["module"], ()) if m in r["loaded"]]
+        if bad:
+            errors.append(f"{r['module']}: при импорте загружает {', '.join(bad)}")
+        limit = BUDGET_MS.get(r["module"])
+        if limit is not None and r["own_ms"] > limit:
+            errors.append(f"{r['module']}: {r['own_ms']:.1f} мс > бюджета {limit:.0f} мс")
+    return errors
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Время импорта модулей проекта")
+    ap.add_argument("modules", nargs="*", default=list(FORBIDDEN))
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--check", action="store_true", help="код выхода 1 при нарушении бюджета")
+    args = ap.parse_args(argv)
+
+    rows = [measure(m, args.repeat) for m in args.modules]
+    print(f"{'module':>16} {'own ms':>8} {'+base ms':>9}  loaded")
+    for r in rows:
+        print(f"{r['module']:>16} {r['own_ms']:>8.1f} {r['base_ms']:>9.1f}  {', '.join(r['loaded'])}")
+    if args.check:
+        errors = check(rows)
+        for e in errors:
+            print("БЮДЖЕТ:", e, file=sys.stderr)
+        return 1 if errors else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
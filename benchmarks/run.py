@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+Бенчмарки стратегии на синтетических OHLC (benchmarks/synthetic.py).
+
+    python -m benchmarks.run                                  # 1k..1M баров, результат в bench_results.json
+    python -m benchmarks.run --sizes 1000 10000 --out res.json
+    python -m benchmarks.run --save-baseline                  # записать benchmarks/baseline.json
+    python -m benchmarks.run --compare benchmarks/baseline.json --threshold 0.25
+
+Для каждой функции и размера: лучшее время из нескольких прогонов и пик памяти (tracemalloc,
+отдельным прогоном — трассировка замедляет код). При --compare код выхода 1, если функция
+стала медленнее базовой более чем на threshold (и больше чем на --min-delta секунд)
+или её пик памяти вырос более чем на threshold (и больше чем на 1 MiB).
+Базовый файл машинно-зависимый и в репозиторий не входит: сначала --save-baseline на той же
+машине (и после осознанного изменения производительности), потом --compare.
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+import warnings
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+import core_strategy as cs
+from backtest import run_backtest
+from benchmarks.synthetic import synthetic_ohlc
+
+SIZES = (1_000, 10_000, 100_000, 1_000_000)
+BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+# имя -> (функция от df, максимальный размер; None — без ограничения)
+CASES = {
+    "heikin_ashi":        (lambda df: cs.heikin_ashi(df), None),
+    "macd_hist":          (lambda df: cs.macd_hist(df["Close"]), None),
+    "rsi_wilder":         (lambda df: cs.rsi_wilder(df["Close"]), None),
+    "atr":                (lambda df: cs.atr(df), None),
+    "aggregate_prev_HLC": (lambda df: cs.aggregate_prev_HLC(df, "MID"), None),
+    "regime_filter":      (lambda df: cs.regime_filter(df, "W"), None),
+    "decide":             (lambda df: cs.decide(df, "MID"), None),
+    "run_backtest":       (lambda df: run_backtest(df, "MID"), None),
+}
+
+def _time(fn, df, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(df)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+def _peak(fn, df) -> int:
+    tracemalloc.start()
+    try:
+        fn(df)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def run(sizes=SIZES, cases=None, seed=0, log=print) -> dict:
+    results = []
+    for n in sizes:
+        df = synthetic_ohlc(n, seed)
+        for name in cases or CASES:
+            fn, max_n = CASES[name]
+            if max_n is not None and n > max_n:
+                continue
+            fn(df)  # прогрев: импорты, кэши pandas
+            repeat = 5 if n <= 10_000 else (3 if n <= 100_000 else 1)
+            sec = _time(fn, df, repeat)
+            peak = _peak(fn, df)
+            results.append({"name": name, "bars": n, "seconds": sec, "peak_bytes": peak})
+            log(f"{name:>20} {n:>9} {sec:>10.4f} s {peak / 2**20:>9.1f} MiB")
+    return {
+        "meta": {
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "machine": platform.machine(),
+            "seed": seed,
+        },
+        "results": results,
+    }
+
+def compare(current: dict, baseline: dict, threshold: float = 0.25, min_delta: float = 0.005,
+            min_mem_delta: int = 2**20) -> list[str]:
+    """Список регрессий (пустой — всё в норме)."""
+    base = {(r["name"], r["bars"]): r for r in baseline["results"]}
+    out = []
+    for r in current["results"]:
+        b = base.get((r["name"], r["bars"]))
+        if b is None:
+            continue
+        if r["seconds"] > b["seconds"] * (1 + threshold) and r["seconds"] - b["seconds"] > min_delta:
+            out.append(f"{r['name']} @ {r['bars']}: {b['seconds']:.4f} -> {r['seconds']:.4f} s "
+                       f"(x{r['seconds'] / b['seconds']:.2f})")
+        if r["peak_bytes"] > b["peak_bytes"] * (1 + threshold) and r["peak_bytes"] - b["peak_bytes"] > min_mem_delta:
+            out.append(f"{r['name']} @ {r['bars']}: память {b['peak_bytes'] / 2**20:.1f} -> "
+                       f"{r['peak_bytes'] / 2**20:.1f} MiB")
+    return out
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Бенчмарки core_strategy/backtest")
+    ap.add_argument("--sizes", type=int, nargs="+", default=list(SIZES))
+    ap.add_argument("--cases", nargs="+", choices=list(CASES), default=None)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", default="bench_results.json")
+    ap.add_argument("--compare", nargs="?", const=BASELINE, default=None, help="файл базовых результатов")
+    ap.add_argument("--save-baseline", action="store_true", help=f"записать результат в {BASELINE}")
+    ap.add_argument("--threshold", type=float, default=0.25, help="допустимое замедление, доля")
+    ap.add_argument("--min-delta", type=float, default=0.005, help="игнорировать разницу меньше, с")
+    args = ap.parse_args(argv)
+
+    if args.compare and not os.path.exists(args.compare):  # до прогона, а не после
+        print(f"нет базового файла {args.compare}: сначала python -m benchmarks.run --save-baseline",
+              file=sys.stderr)
+        return 2
+
+    warnings.simplefilter("ignore", FutureWarning)  # алиасы 'M'/'Y' в resample
+    res = run(args.sizes, args.cases, args.seed)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(res, f, indent=1)
+    if args.save_baseline:
+        with open(BASELINE, "w", encoding="utf-8") as f:
+            json.dump(res, f, indent=1)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(res, json.load(f), args.threshold, args.min_delta)
+        for line in regressions:
+            print("РЕГРЕССИЯ:", line, file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""Детерминированный генератор OHLC для бенчмарков: GBM с гэпами, «плоскими» барами и свечами нулевого диапазона."""
+from __future__ import annotations
+import numpy as np
+import pandas as pd
+
+def synthetic_ohlc(n: int, seed: int = 0, vol: float = 0.015, drift: float = 0.0002,
+                   gap_prob: float = 0.02, flat_prob: float = 0.01, zero_range_prob: float = 0.01,
+                   start: str = "1800-01-01", freq: str | None = None) -> pd.DataFrame:
+    """
+    n баров Open/High/Low/Close.
+    gap_prob — доля баров с открытием гэпом от прошлого закрытия,
+    flat_prob — бар без движения (O=H=L=C=прошлое закрытие),
+    zero_range_prob — свеча с High == Low (O=H=L=C, но с движением от прошлого бара).
+    Календарь — рабочие дни; если n не помещается в диапазон дат pandas, часы.
+    Лог-цена — случайное блуждание за вычетом его медленной EMA, чтобы на 1M баров
+    цена оставалась в разумных пределах.
+    """
+    rng = np.random.default_rng(seed)
+    if freq is None:
+        freq = "B" if n <= 50_000 else "h"
+    idx = pd.date_range(start, periods=n, freq=freq)
+
+    walk = pd.Series(np.cumsum(rng.normal(drift, vol, n)))
+    close = 100.0 * np.exp((walk - walk.ewm(span=2000, adjust=False).mean()).to_numpy())
+    prev = np.r_[100.0, close[:-1]]
+    gap = rng.random(n) < gap_prob
+    open_ = prev * np.exp(np.where(gap, rng.normal(0, 3 * vol, n), rng.normal(0, vol / 4, n)))
+    wick = np.abs(rng.normal(0, vol / 2, (2, n)))
+    high = np.maximum(open_, close) * np.exp(wick[0])
+    low = np.minimum(open_, close) * np.exp(-wick[1])
+
+    flat = rng.random(n) < flat_prob
+    open_[flat] = high[flat] = low[flat] = close[flat] = prev[flat]
+    zero = ~flat & (rng.random(n) < zero_range_prob)
+    open_[zero] = high[zero] = low[zero] = close[zero]
+    # после «плоских» баров прошлое закрытие сдвинулось — пересоберём согласованность High/Low
+    high = np.maximum.reduce([high, open_, close])
+    low = np.minimum.reduce([low, open_, close])
+    return pd.DataFrame({"Open": open_, "High": high, "Low": low, "Close": close}, index=idx).round(4)
@@ -1,8 +1,40 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 import math
+from collections import Counter
+from typing import TYPE_CHECKING
 import numpy as np
-import pandas as pd
+from events import default_calendar
+from profiling import stage
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# pandas здесь не импортируется на уровне модуля: decide() получает уже готовый DataFrame,
+# а модуль должен грузиться с одним NumPy (воркеры, холодный старт). Где нужен сам pd —
+# локальный import (модуль к этому моменту уже загружен вызывающим кодом).
+
+# ---------- Parameters ----------
+# Пороги стратегии. Значения по горизонтам — dict, общие — скаляр.
+# Переопределение: params={"need_ha": 5, "min_rr": 1.5} во всех функциях, принимающих params.
+DEFAULT_PARAMS = {
+    "need_ha":   {"ST":4, "MID":5, "LT":6},
+    "need_hist": {"ST":4, "MID":6, "LT":8},
+    "tol":       {"ST":0.006, "MID":0.009, "LT":0.012},
+    "atr_k_sl":  {"ST":0.8, "MID":1.0, "LT":1.3},
+    "min_rr": 2.0,
+    "regime_slope": 0.01,
+    "regime_vol": 0.06,
+}
+
+def horizon_params(horizon: str, params: dict | None = None) -> dict:
+    """Плоский набор порогов для горизонта с учётом переопределений."""
+    p = {k: (v[horizon] if isinstance(v, dict) else v) for k, v in DEFAULT_PARAMS.items()}
+    for k, v in (params or {}).items():
+        if k not in p:
+            raise KeyError(f"неизвестный параметр стратегии: {k}")
+        p[k] = v[horizon] if isinstance(v, dict) else v
+    return p
 
 # ---------- Pivot (Fibonacci) ----------
 def fib_pivots(H: float, L: float, C: float) -> dict:
@@ -18,42 +50,101 @@ def fib_pivots(H: float, L: float, C: float) -> dict:
         "S3": P - 1.000 * R,
     }
 
-def aggregate_prev_HLC(df: pd.DataFrame, horizon: str) -> tuple[float,float,float,str]:
+# ---------- Multi-timeframe bars ----------
+RESAMPLE_CALLS: Counter = Counter()   # реальные вызовы resample() по ТФ — для замеров
+_PERIOD_FREQ = {"W": "W-SUN", "M": "M", "Y": "Y"}
+
+def resample_ohlc(df: pd.DataFrame, tf: str) -> pd.DataFrame:
+    RESAMPLE_CALLS[tf] += 1
+    agg = {k: v for k, v in (("Open","first"), ("High","max"), ("Low","min"), ("Close","last")) if k in df}
+    return df.resample(tf).agg(agg).dropna(subset=["High","Low","Close"])
+
+class MTFBars:
+    """
+    W/M/Y OHLC-агрегаты одного дневного df. Каждый ТФ ресэмплится один раз
+    и переиспользуется aggregate_prev_HLC/regime_filter во всех вызовах decide().
+    refresh(df) для df, дописанного новыми барами, обновляет только последний период.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self._bars: dict[str, pd.DataFrame] = {}
+
+    def __getitem__(self, tf: str) -> pd.DataFrame:
+        bars = self._bars.get(tf)
+        if bars is None:
+            bars = self._bars[tf] = resample_ohlc(self.df, tf)
+        return bars
+
+    def refresh(self, df: pd.DataFrame) -> "MTFBars":
+        """df = прежний df + новые бары в конце: без повторного resample всей истории."""
+        if len(df) < len(self.df) or (len(self.df) and df.index[len(self.df) - 1] != self.df.index[-1]):
+            self.df, self._bars = df, {}  # не продолжение — пересчитаем лениво
+            return self
+        new = df.iloc[len(self.df):]
+        self.df = df
+        for tf, bars in self._bars.items():
+            for ts, row in zip(new.index, new.itertuples(index=False)):
+                label = self._label(ts, tf)
+                if len(bars) and bars.index[-1] == label:
+                    last = bars.iloc[-1]
+                    vals = {"High": max(last["High"], row.High), "Low": min(last["Low"], row.Low),
+                            "Close": row.Close}
+                    if "Open" in bars:
+                        vals["Open"] = last["Open"]
+                else:
+                    vals = {k: getattr(row, k) for k in bars.columns}
+                bars.loc[label] = [vals[k] for k in bars.columns]
+        return self
+
+    @staticmethod
+    def _label(ts: pd.Timestamp, tf: str) -> pd.Timestamp:
+        # метка корзины resample(): конец недели (вс) / месяца / года, 00:00
+        label = ts.tz_localize(None) if ts.tz is not None else ts
+        label = label.to_period(_PERIOD_FREQ[tf]).end_time.normalize()
+        return label.tz_localize(ts.tz) if ts.tz is not None else label
+
+def aggregate_prev_HLC(df: pd.DataFrame, horizon: str, bars: MTFBars | None = None) -> tuple[float,float,float,str]:
     """
     ST -> strictly previous WEEK (weekly pivots)
     MID -> previous MONTH
     LT -> previous YEAR
     """
+    bars = bars if bars is not None else MTFBars(df)
     if horizon == "ST":
         base_tf = "W"
-        grp = df.resample("W").agg({"High":"max","Low":"min","Close":"last"}).dropna()
     elif horizon == "MID":
         base_tf = "M"
-        grp = df.resample("M").agg({"High":"max","Low":"min","Close":"last"}).dropna()
     else:
         base_tf = "Y"
-        grp = df.resample("Y").agg({"High":"max","Low":"min","Close":"last"}).dropna()
+    grp = bars[base_tf]
 
     if len(grp) < 2:
         if base_tf == "Y":
-            grp = df.resample("M").agg({"High":"max","Low":"min","Close":"last"}).dropna()
+            grp = bars["M"]
         elif base_tf == "M":
-            grp = df.resample("W").agg({"High":"max","Low":"min","Close":"last"}).dropna()
+            grp = bars["W"]
     row = grp.iloc[-2] if len(grp) >= 2 else df.iloc[-2]
     return float(row["High"]), float(row["Low"]), float(row["Close"]), base_tf
 
 # ---------- Heikin Ashi ----------
 def heikin_ashi(df: pd.DataFrame) -> pd.DataFrame:
+    # HA_Open[i] = (HA_Open[i-1] + HA_Close[i-1]) / 2 — это EMA с alpha=0.5 по HA_Close,
+    # сдвинутая на бар: HA_Open[i] = ema[i-1], HA_Open[0] = HA_Close[0].
+    # ewm(adjust=False) считает 0.5*a + 0.5*b, что для float64 бит в бит равно (a + b) / 2.
+    import pandas as pd
     ha = pd.DataFrame(index=df.index)
     o, h, l, c = df["Open"], df["High"], df["Low"], df["Close"]
     ha["HA_Close"] = (o + h + l + c) / 4.0
-    ha["HA_Open"] = ha["HA_Close"].copy()
-    for i in range(1, len(ha)):
-        ha.iat[i, ha.columns.get_loc("HA_Open")] = (
-            ha.iat[i-1, ha.columns.get_loc("HA_Open")] + ha.iat[i-1, ha.columns.get_loc("HA_Close")]
-        ) / 2.0
+    ema = ha["HA_Close"].ewm(alpha=0.5, adjust=False).mean()
+    ha["HA_Open"] = ema.shift(1).fillna(ha["HA_Close"])
     return ha
 
+def heikin_ashi_step(prev_open: float, prev_close: float,
+                     o: float, h: float, l: float, c: float) -> tuple[float, float]:
+    """Продление HA-ряда на один бар за O(1): (HA_Open, HA_Close) нового бара."""
+    return (prev_open + prev_close) / 2.0, (o + h + l + c) / 4.0
+
 def streak_len(series: pd.Series, positive=True) -> int:
     s = series.dropna()
     cnt = 0
@@ -97,6 +188,7 @@ def rsi_wilder(close: pd.Series, n=14) -> pd.Series:
 
 # ---------- ATR ----------
 def atr(df: pd.DataFrame, period=14) -> pd.Series:
+    import pandas as pd
     h, l, c = df["High"], df["Low"], df["Close"]
     tr = pd.concat([h-l, (h-c.shift()).abs(), (l-c.shift()).abs()], axis=1).max(axis=1)
     return tr.rolling(period).mean()
@@ -122,25 +214,27 @@ def targets_long(entry_zone: str, piv: dict) -> list[float]:
     return [min(piv["P"], piv["R1"]), piv["R2"]]
 
 # ---------- Filters ----------
-def regime_filter(df: pd.DataFrame, base_tf: str) -> str:
+def regime_filter(df: pd.DataFrame, base_tf: str, bars: MTFBars | None = None,
+                  slope_min: float = 0.01, vol_max: float = 0.06) -> str:
     # 'UP' | 'DOWN' | 'FLAT'  (на старшем ТФ)
-    if base_tf == "W": res = df.resample("W").last()
-    elif base_tf == "M": res = df.resample("M").last()
-    else: res = df.resample("Y").last()
-    close = res["Close"].dropna()
+    bars = bars if bars is not None else MTFBars(df)
+    close = bars[base_tf]["Close"]
     if len(close) < 60: return "FLAT"
     ma = close.rolling(50).mean()
     slope = (ma.iloc[-1] - ma.iloc[-10]) / max(1e-9, ma.iloc[-10])
     vol = (close.rolling(14).std() / close).iloc[-1]
-    if slope > 0.01 and vol < 0.06:
+    if slope > slope_min and vol < vol_max:
         return "UP"
-    if slope < -0.01 and vol < 0.06:
+    if slope < -slope_min and vol < vol_max:
         return "DOWN"
     return "FLAT"
 
 def zone_confirmation(df: pd.DataFrame) -> bool:
     # простейший price-action: длинная тень против входа
     o, h, l, c = df["Open"].iloc[-1], df["High"].iloc[-1], df["Low"].iloc[-1], df["Close"].iloc[-1]
+    return candle_confirmation(o, h, l, c)
+
+def candle_confirmation(o: float, h: float, l: float, c: float) -> bool:
     rng = h - l
     if rng <= 0: return False
     upper_wick = h - max(o, c)
@@ -155,21 +249,24 @@ def rr_ok(entry: float, tp1: float, sl: float, min_rr: float = 2.0) -> bool:
     reward = abs(tp1 - entry)
     return (risk > 0) and (reward / risk >= min_rr)
 
-def events_guard(date: pd.Timestamp, ticker: str) -> bool:
-    # Заглушка: всегда True. (Подключим календарь позже)
-    return True
+def events_guard(date: pd.Timestamp, ticker: str = "") -> bool:
+    """Нет ли рядом с date события тикера или общего (events.default_calendar())."""
+    return default_calendar().allowed(date, ticker)
 
 # ---------- Overheat detector ----------
-def detect_overheat(df: pd.DataFrame, piv: dict, horizon: str) -> dict:
+def detect_overheat(df: pd.DataFrame, piv: dict, horizon: str, params: dict | None = None) -> dict:
     price = float(df["Close"].iloc[-1])
     ha = heikin_ashi(df)
     ha_streak = streak_len(ha["HA_Close"].diff(), positive=True)
     hist = macd_hist(df["Close"])
     hist_streak, flatness = hist_streak_and_flatness(hist)
+    return overheat_ctx(price, piv, horizon, ha_streak, hist_streak, flatness, params)
 
-    need_ha   = {"ST":4, "MID":5, "LT":6}[horizon]
-    need_hist = {"ST":4, "MID":6, "LT":8}[horizon]
-    tol       = {"ST":0.006, "MID":0.009, "LT":0.012}[horizon]
+def overheat_ctx(price: float, piv: dict, horizon: str,
+                 ha_streak: int, hist_streak: int, flatness: float, params: dict | None = None) -> dict:
+    # пороги детектора по уже посчитанным сериям (общая часть для decide и потокового IndicatorState)
+    p = horizon_params(horizon, params)
+    need_ha, need_hist, tol = p["need_ha"], p["need_hist"], p["tol"]
 
     at_res = any([near(price, piv["R2"], tol), near(price, piv["R3"], tol)]) or price >= piv["R2"]
     is_overheat = (ha_streak >= need_ha) and (hist_streak >= need_hist) and at_res
@@ -187,19 +284,37 @@ def detect_overheat(df: pd.DataFrame, piv: dict, horizon: str) -> dict:
     }
 
 # ---------- Decision ----------
-def decide(df: pd.DataFrame, horizon: str) -> dict:
+def decide(df: pd.DataFrame, horizon: str, bars: MTFBars | None = None, params: dict | None = None,
+           ticker: str = "") -> dict:
+    # bars — общий MTFBars(df), если решения по одному df нужны для нескольких горизонтов;
+    # ticker — для календаря событий (пустой — только общие события)
+    bars = bars if bars is not None else MTFBars(df)
+    p = horizon_params(horizon, params)
     price = float(df["Close"].iloc[-1])
-    H,L,C, base_tf = aggregate_prev_HLC(df, horizon)
-    piv = fib_pivots(H,L,C)
-    ctx = detect_overheat(df, piv, horizon)
-    atr_last = float(atr(df).iloc[-1])
+    with stage("pivots"):
+        H,L,C, base_tf = aggregate_prev_HLC(df, horizon, bars)
+        piv = fib_pivots(H,L,C)
+    with stage("overheat"):
+        ctx = detect_overheat(df, piv, horizon, p)
+    with stage("atr"):
+        atr_last = float(atr(df).iloc[-1])
 
-    atr_k_sl = {"ST":0.8, "MID":1.0, "LT":1.3}[horizon]
-
-    def r(x):
-        if x is None: return None
-        try: return round(float(x), 2)
-        except: return None
+    base_tf_for_regime = {"ST":"W","MID":"M","LT":"Y"}[horizon]
+    with stage("regime"):
+        regime = regime_filter(df, base_tf_for_regime, bars, p["regime_slope"], p["regime_vol"])
+    with stage("confirmation"):
+        confirmed = events_guard(df.index[-1], ticker) and zone_confirmation(df)
+    with stage("rules"):
+        return decision_from(horizon, price, piv, ctx, atr_last, regime, confirmed, p)
+
+def decision_from(horizon: str, price: float, piv: dict, ctx: dict, atr_last: float,
+                  regime: str, confirmed: bool, params: dict | None = None) -> dict:
+    """
+    Правила входа и фильтры по уже посчитанным входам decide().
+    confirmed — events_guard и zone_confirmation последнего бара.
+    """
+    p = horizon_params(horizon, params)
+    atr_k_sl = p["atr_k_sl"]
 
     at_top    = price >= piv["R2"]
     at_bottom = price <= piv["S2"]
@@ -261,17 +376,12 @@ def decide(df: pd.DataFrame, horizon: str) -> dict:
             alt =("LONG", min(piv["P"], price), piv["R1"], piv["R2"], min(piv["P"], price) - atr_k_sl*atr_last)
 
     # -------- общие фильтры --------
-    base_tf_for_regime = {"ST":"W","MID":"M","LT":"Y"}[horizon]
-    regime = regime_filter(df, base_tf_for_regime)
-
     def apply_filters(side):
         act, entry, tp1, tp2, sl = side
         if act in ("LONG","SHORT"):
-            if not events_guard(df.index[-1], "TICKER"):
+            if not confirmed:
                 return ("WAIT", None, None, None, None)
-            if not zone_confirmation(df):
-                return ("WAIT", None, None, None, None)
-            if not rr_ok(entry, tp1, sl, 2.0):
+            if not rr_ok(entry, tp1, sl, p["min_rr"]):
                 return ("WAIT", None, None, None, None)
             if act == "LONG" and regime == "DOWN":
                 return ("WAIT", None, None, None, None)
@@ -296,3 +406,414 @@ def decide(df: pd.DataFrame, horizon: str) -> dict:
         "ctx": {**ctx, "regime": regime}
     }
     return out
+
+# ---------- Vectorized: все бары за один проход ----------
+# Те же правила, что в decide(), но индикаторы считаются один раз по всей истории,
+# а решение для каждого бара t совпадает с decide(df.iloc[:t+1], horizon).
+
+WAIT, LONG, SHORT = 0, 1, -1
+REGIMES = np.array(["FLAT", "UP", "DOWN"], dtype=object)
+
+def period_keys(index: pd.DatetimeIndex, tf: str) -> np.ndarray:
+    """
+    Номер дня / недели (W-SUN) / месяца / года для каждого бара — те же корзины, что у resample().
+    index — DatetimeIndex или массив datetime64[ns].
+    """
+    if getattr(index, "tz", None) is not None:
+        index = index.tz_localize(None)
+    ts = np.asarray(index, dtype="datetime64[ns]")
+    if tf == "D":
+        return ts.astype("datetime64[D]").astype(np.int64)
+    if tf == "W":
+        return (ts.astype("datetime64[D]").astype(np.int64) + 3) // 7
+    return ts.astype("datetime64[M]" if tf == "M" else "datetime64[Y]").astype(np.int64)
+
+def periods(keys: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Разбиение баров на периоды по ключам period_keys() (соседние бары с одним ключом — один период):
+    (порядковый номер непустого периода для каждого бара, индексы первых баров, индексы последних).
+    """
+    new = np.empty(len(keys), dtype=bool)
+    new[:1] = True
+    new[1:] = keys[1:] != keys[:-1]
+    starts = np.flatnonzero(new)
+    ends = np.append(starts[1:], len(keys)) - 1
+    return np.cumsum(new) - 1, starts, ends
+
+def prev_HLC_series(df: pd.DataFrame, horizon: str) -> tuple[np.ndarray,np.ndarray,np.ndarray]:
+    """aggregate_prev_HLC() для каждого префикса df, включая фолбэки Y->M, M->W и df.iloc[-2]."""
+    h, l, c = (df[k].to_numpy(dtype=float) for k in ("High", "Low", "Close"))
+    return prev_HLC_arrays(df.index, h, l, c, horizon)
+
+def prev_HLC_arrays(ts, h: np.ndarray, l: np.ndarray, c: np.ndarray,
+                    horizon: str) -> tuple[np.ndarray,np.ndarray,np.ndarray]:
+    """prev_HLC_series() по массивам; ts — DatetimeIndex или datetime64[ns]."""
+    n = len(c)
+    # df.iloc[-2] — последний фолбэк
+    H = np.full(n, np.nan); L = np.full(n, np.nan); C = np.full(n, np.nan)
+    H[1:], L[1:], C[1:] = h[:-1], l[:-1], c[:-1]
+    chain = {"ST": ["W"], "MID": ["W", "M"], "LT": ["M", "Y"]}[horizon]
+    for tf in chain:  # от младшего фолбэка к основному ТФ, основной перезаписывает
+        ordn, starts, ends = periods(period_keys(ts, tf))
+        ph = np.fmax.reduceat(h, starts); pl = np.fmin.reduceat(l, starts); pc = c[ends]
+        ok = ordn >= 1
+        prev = ordn[ok] - 1
+        H[ok], L[ok], C[ok] = ph[prev], pl[prev], pc[prev]
+    return H, L, C
+
+def regime_stats(df: pd.DataFrame, base_tf: str) -> tuple[np.ndarray, np.ndarray]:
+    """slope и vol из regime_filter() для каждого префикса (NaN, пока периодов < 60)."""
+    return regime_stats_arrays(df.index, df["Close"].to_numpy(dtype=float), base_tf)
+
+def regime_stats_arrays(ts, c: np.ndarray, base_tf: str) -> tuple[np.ndarray, np.ndarray]:
+    """regime_stats() по массивам; ts — DatetimeIndex или datetime64[ns]."""
+    slope = np.full(len(c), np.nan); vol = np.full(len(c), np.nan)
+    ordn, _, ends = periods(period_keys(ts, base_tf))
+    pc = c[ends]  # закрытия завершённых периодов
+    if len(pc) < 59:
+        return slope, vol
+    idx = np.flatnonzero(ordn >= 59)  # длина ряда закрытий = ordn + 1 >= 60
+    k = ordn[idx]; last = c[idx]
+    cs = np.concatenate(([0.0], np.cumsum(pc)))
+    ma_last = (cs[k] - cs[k-49] + last) / 50.0
+    ma_10 = (cs[k-8] - cs[k-58]) / 50.0
+    slope[idx] = (ma_last - ma_10) / np.maximum(1e-9, ma_10)
+    w = np.lib.stride_tricks.sliding_window_view(pc, 13)
+    s1 = w.sum(axis=1)[k-13] + last
+    s2 = (w * w).sum(axis=1)[k-13] + last * last
+    var = np.maximum(0.0, (s2 - s1 * s1 / 14.0) / 13.0)
+    vol[idx] = np.sqrt(var) / last
+    return slope, vol
+
+def regime_codes(slope: np.ndarray, vol: np.ndarray, slope_min=0.01, vol_max=0.06) -> np.ndarray:
+    """0 FLAT, 1 UP, 2 DOWN (индексы в REGIMES); NaN -> FLAT."""
+    out = np.zeros(len(slope), dtype=np.int8)
+    with np.errstate(invalid="ignore"):
+        calm = vol < vol_max
+        out[(slope > slope_min) & calm] = 1
+        out[(slope < -slope_min) & calm] = 2
+    return out
+
+def streak_series(values: np.ndarray, positive=True) -> np.ndarray:
+    """streak_len() для каждого префикса: нули и NaN пропускаются, противоположный знак обрывает серию."""
+    v = np.asarray(values, dtype=float)
+    hit = v > 0 if positive else v < 0
+    brk = v < 0 if positive else v > 0
+    cnt = np.cumsum(hit)
+    last_brk = np.maximum.accumulate(np.where(brk, np.arange(len(v)), -1))
+    return cnt - np.where(last_brk >= 0, cnt[np.maximum(last_brk, 0)], 0)
+
+def zone_confirmation_series(df: pd.DataFrame) -> np.ndarray:
+    return candle_confirmation_series(*(df[k].to_numpy(dtype=float) for k in ("Open", "High", "Low", "Close")))
+
+def candle_confirmation_series(o: np.ndarray, h: np.ndarray, l: np.ndarray, c: np.ndarray) -> np.ndarray:
+    """candle_confirmation() для каждого бара."""
+    rng = h - l
+    with np.errstate(divide="ignore", invalid="ignore"):
+        upper_wick = h - np.maximum(o, c)
+        lower_wick = np.minimum(o, c) - l
+        body_ok = np.abs(c - o) / rng <= 0.6
+        bull = (lower_wick / np.maximum(1e-9, rng) >= 0.4) & (c > o) & body_ok
+        bear = (upper_wick / np.maximum(1e-9, rng) >= 0.4) & (c < o) & body_ok
+    return (rng > 0) & (bull | bear)
+
+def _pick(cond, a, b):
+    return np.where(cond, a, b)
+
+def series_features(df: pd.DataFrame, horizon: str, ticker: str = "") -> dict:
+    """
+    Всё, что decide_series() считает по истории и что не зависит от порогов params:
+    пивоты, серии HA/MACD, ATR, RSI, slope/vol режима, подтверждение свечой и календарём
+    событий тикера (zone_ok — как confirmed в decide).
+    Перебор параметров (sweep) считает это один раз на тикер и горизонт.
+    """
+    close = df["Close"]
+    with stage("pivots"):
+        H, L, C = prev_HLC_series(df, horizon)
+        piv = fib_pivots(H, L, C)
+    with stage("overheat"):
+        ha_streak = streak_series(heikin_ashi(df)["HA_Close"].diff().to_numpy(), positive=True)
+        hist = macd_hist(close).to_numpy(dtype=float)
+        hist_streak = np.where(hist > 0, streak_series(hist, True),
+                               np.where(hist < 0, streak_series(hist, False), 0))
+    with stage("atr"):
+        atr_s = atr(df).to_numpy(dtype=float)
+    with stage("rsi"):
+        rsi = rsi_wilder(close).to_numpy(dtype=float)
+    with stage("regime"):
+        slope, vol = regime_stats(df, {"ST":"W","MID":"M","LT":"Y"}[horizon])
+    with stage("confirmation"):
+        zone_ok = zone_confirmation_series(df) & default_calendar().allowed_mask(df.index, ticker)
+    return {
+        "price": close.to_numpy(dtype=float),
+        "piv": piv,
+        "ha_streak": ha_streak,
+        "hist_streak": hist_streak,
+        "atr": atr_s,
+        "rsi": rsi,
+        "slope": slope,
+        "vol": vol,
+        "zone_ok": zone_ok,
+    }
+
+def signal_arrays(f: dict, horizon: str, params: dict | None = None) -> dict:
+    """
+    Пороговая часть decide_series() по готовым признакам (series_features / features_from_arrays).
+    Возвращает struct-of-arrays: price, P..S3, base_*/alt_* (action — int8 WAIT/LONG/SHORT = 0/1/-1,
+    уровни округлены как в decide, NaN для WAIT), overheat, ha_streak, hist_streak, at_res,
+    regime (int8, индекс в REGIMES), atr, rsi.
+    """
+    with stage("rules"):
+        p = horizon_params(horizon, params)
+        price = f["price"]
+        n = len(price)
+        piv = f["piv"]
+        P, R1, R2, R3, S1, S2, S3 = (piv[k] for k in ("P","R1","R2","R3","S1","S2","S3"))
+
+        # --- overheat (detect_overheat) ---
+        ha_streak, hist_streak = f["ha_streak"], f["hist_streak"]
+        denom = np.maximum(1e-9, price)
+        tol = p["tol"]
+        with np.errstate(invalid="ignore"):
+            at_res = (np.abs(price - R2) / denom <= tol) | (np.abs(price - R3) / denom <= tol) | (price >= R2)
+        overheat = (ha_streak >= p["need_ha"]) & (hist_streak >= p["need_hist"]) & at_res
+
+        atr_last = f["atr"]
+        atr_k_sl = p["atr_k_sl"]
+
+        at_top    = price >= R2
+        at_bottom = price <= S2
+        in_mid    = (S1 < price) & (price < R1)
+
+        # short-сторона: зона R3/R2 и цели targets_short
+        zs = price >= R3
+        s_t1 = _pick(zs, R2, np.maximum(P, S1))
+        s_t2 = _pick(zs, P, np.minimum(S1, S2))
+        s_lvl = _pick(zs, R3, R2)
+        # long-сторона: зона S3/S2 и цели targets_long
+        zl = price <= S3
+        l_t1 = _pick(zl, S2, np.minimum(P, R1))
+        l_t2 = _pick(zl, P, np.maximum(R1, R2))
+        l_lvl = _pick(zl, S3, S2)
+
+        nan = np.full(n, np.nan)
+        b_act = np.zeros(n, dtype=np.int8); a_act = np.zeros(n, dtype=np.int8)
+        b = [nan.copy() for _ in range(4)]; a = [nan.copy() for _ in range(4)]
+
+        def put(side, act, mask, code, entry, t1, t2, sl):
+            act[mask] = code
+            for arr, val in zip(side, (entry, t1, t2, sl)):
+                arr[mask] = np.broadcast_to(val, (n,))[mask]
+
+        if horizon == "ST":
+            wait = in_mid & ~at_top & ~at_bottom
+            short = ~wait & at_top & overheat
+            long_ = ~wait & ~short & at_bottom
+            put(b, b_act, short, SHORT, price, s_t1, s_t2, np.maximum(s_lvl, price) + atr_k_sl*atr_last)
+            put(b, b_act, long_, LONG, price, l_t1, l_t2, np.minimum(l_lvl, price) - atr_k_sl*atr_last)
+        else:
+            short = overheat & at_top if horizon == "MID" else overheat
+            long_ = ~short & (at_bottom if horizon == "MID" else price <= S2)
+            rest = ~short & ~long_
+            s_entry = np.maximum(R2, price)
+            l_entry = np.minimum(P, price)
+            put(a, a_act, short, SHORT, s_entry, s_t1, s_t2, np.maximum(s_lvl, s_entry) + atr_k_sl*atr_last)
+            put(b, b_act, long_, LONG, l_entry, l_t1, l_t2, np.minimum(l_lvl, l_entry) - atr_k_sl*atr_last)
+            put(a, a_act, rest, LONG, l_entry, R1, R2, l_entry - atr_k_sl*atr_last)
+
+        # -------- общие фильтры --------
+        regime = regime_codes(f["slope"], f["vol"], p["regime_slope"], p["regime_vol"])
+        zone_ok = f["zone_ok"]
+
+        def apply_filters(side, act):
+            entry, tp1, sl = side[0], side[1], side[3]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                risk = np.abs(entry - sl)
+                rr = (risk > 0) & (np.abs(tp1 - entry) / risk >= p["min_rr"])
+            drop = (act != WAIT) & ~(zone_ok & rr)
+            drop |= (act == LONG) & (regime == 2)
+            drop |= (act == SHORT) & (regime == 1)
+            act[drop] = WAIT
+            for arr in side:
+                arr[act == WAIT] = np.nan
+
+        apply_filters(b, b_act)
+        apply_filters(a, a_act)
+
+        out = {"price": price, **piv}
+        for name, side, act in (("base", b, b_act), ("alt", a, a_act)):
+            out[f"{name}_action"] = act
+            active = np.flatnonzero(act != WAIT)
+            for key, arr in zip(("entry", "tp1", "tp2", "sl"), side):
+                # python round(), а не np.round — уровни должны совпадать с decide() до цента
+                arr[active] = [round(float(x), 2) for x in arr[active]]
+                out[f"{name}_{key}"] = arr
+        out["overheat"] = overheat
+        out["ha_streak"] = ha_streak
+        out["hist_streak"] = hist_streak
+        out["at_res"] = at_res
+        out["regime"] = regime
+        out["atr"] = atr_last
+        out["rsi"] = f["rsi"]
+        return out
+
+def decide_series(df: pd.DataFrame, horizon: str, params: dict | None = None,
+                  features: dict | None = None, ticker: str = "") -> pd.DataFrame:
+    """
+    Решения decide() для каждого бара df за один проход.
+    Колонки: price, pivots (P..S3, без округления), base_*/alt_* (action, entry, tp1, tp2, sl —
+    округлены как в decide), overheat, ha_streak, hist_streak, at_res, regime, atr, rsi.
+    Ожидает очищенные от NaN бары (как из load_yahoo).
+    features — готовый series_features(df, horizon, ticker), чтобы не пересчитывать индикаторы.
+    """
+    f = features if features is not None else series_features(df, horizon, ticker)
+    return signals_frame(signal_arrays(f, horizon, params), df.index)
+
+def signals_frame(arrays: dict, index) -> pd.DataFrame:
+    """signal_arrays() -> DataFrame: action и regime — Categorical с метками вместо кодов."""
+    import pandas as pd
+    out = pd.DataFrame(arrays, index=index)
+    for name in ("base", "alt"):
+        out[f"{name}_action"] = pd.Categorical.from_codes(out[f"{name}_action"].to_numpy() % 3,
+                                                          ["WAIT", "LONG", "SHORT"])
+    out["regime"] = pd.Categorical.from_codes(out["regime"].to_numpy(), REGIMES)
+    return out
+
+# ---------- Array-native: NumPy-буферы без pandas ----------
+# decide_arrays() — те же решения, что decide_series(), но на вход OHLC (n, 4) float64
+# (например, ohlc.f8 из PriceStore как memmap) и int64-метки в нс, на выходе — dict массивов.
+# Рекурсивные фильтры (ewm MACD/RSI, rolling-mean ATR) идут одним циклом по барам
+# в тех же формулах, что у pandas 2.2, поэтому значения совпадают бит в бит.
+
+def _ewm_alpha(span: float | None = None, alpha: float | None = None) -> float:
+    # pandas переводит span/alpha в com и обратно — повторяем, чтобы совпасть бит в бит
+    com = (span - 1) / 2.0 if span is not None else 1.0 / alpha - 1.0
+    return 1.0 / (1.0 + com)
+
+def _ewm_step(prev: float, x: float, alpha: float) -> float:
+    # один шаг ewm(adjust=False).mean() в той же форме, что у pandas
+    if math.isnan(prev):
+        return x
+    if math.isnan(x) or prev == x:
+        return prev
+    old_wt = 1.0 - alpha
+    return (old_wt * prev + alpha * x) / (old_wt + alpha)
+
+def _kahan_step(total: float, comp: float, x: float) -> tuple[float, float]:
+    # одно слагаемое суммы с компенсацией Кахана, как в rolling().mean() pandas: (сумма, компенсация)
+    y = x - comp
+    z = total + y
+    return z, z - total - y
+
+def indicator_arrays(h: np.ndarray, l: np.ndarray, c: np.ndarray,
+                     atr_period: int = 14, rsi_n: int = 14) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    (macd_hist, rsi_wilder, atr) за один проход: ewm(adjust=False) и rolling(period).mean()
+    с компенсацией Кахана, как в pandas, — результат равен DataFrame-версиям.
+    Ожидает бары без NaN (как decide_series).
+    """
+    hs, ls, cs = (np.asarray(v, dtype=float).tolist() for v in (h, l, c))
+    n = len(cs)
+    hist = np.empty(n); rsi = np.empty(n); atr_ = np.full(n, np.nan)
+    # ewm(adjust=False): x_t = (w*x_{t-1} + a*x) / (w + a), w = 1 - a; шаг пропускается, если x равен
+    # предыдущему значению (как в pandas), — _ewm_step(), развёрнутый в цикл ради скорости
+    a12, a26, a9, ar = _ewm_alpha(span=12), _ewm_alpha(span=26), _ewm_alpha(span=9), _ewm_alpha(alpha=1 / rsi_n)
+    w12, w26, w9, wr = 1.0 - a12, 1.0 - a26, 1.0 - a9, 1.0 - ar
+    d12, d26, d9, dr = w12 + a12, w26 + a26, w9 + a9, wr + ar
+    # rolling mean: отдельные компенсации Кахана для добавления и удаления (_kahan_step(), развёрнутый
+    # в цикл); если все значения окна подряд одинаковы, pandas отдаёт само значение без деления
+    tr = [0.0] * n
+    sum_x = comp_add = comp_rem = 0.0
+    same = 0
+    e12 = e26 = sig = up = down = prev_c = prev_tr = 0.0
+    for i in range(n):
+        x, hi, lo = cs[i], hs[i], ls[i]
+        if i == 0:
+            e12 = e26 = x
+            sig = 0.0
+            hist[0] = 0.0
+            rsi[0] = 50.0
+            t = hi - lo
+            prev_tr = t
+        else:
+            # MACD
+            if e12 != x:
+                e12 = (w12 * e12 + a12 * x) / d12
+            if e26 != x:
+                e26 = (w26 * e26 + a26 * x) / d26
+            m = e12 - e26
+            if sig != m:
+                sig = (w9 * sig + a9 * m) / d9
+            hist[i] = m - sig
+            # RSI: первая разность задаёт начальные up/down
+            delta = x - prev_c
+            u = delta if delta > 0 else 0.0
+            dn = -delta if delta < 0 else -0.0
+            if i == 1:
+                up, down = u, dn
+            else:
+                if up != u:
+                    up = (wr * up + ar * u) / dr
+                if down != dn:
+                    down = (wr * down + ar * dn) / dr
+            rsi[i] = 50.0 if down == 0 else 100 - 100 / (1 + up / down)
+            # ATR
+            t = max(hi - lo, abs(hi - prev_c), abs(lo - prev_c))
+        tr[i] = t
+        if i >= atr_period:
+            y = -tr[i - atr_period] - comp_rem
+            z = sum_x + y
+            comp_rem = z - sum_x - y
+            sum_x = z
+        y = t - comp_add
+        z = sum_x + y
+        comp_add = z - sum_x - y
+        sum_x = z
+        same = same + 1 if t == prev_tr else 1
+        prev_tr = t
+        if i >= atr_period - 1:
+            res = t if same >= atr_period else sum_x / atr_period
+            atr_[i] = 0.0 if res < 0 else res
+        prev_c = x
+    return hist, rsi, atr_
+
+def features_from_arrays(ts: np.ndarray, ohlc: np.ndarray, horizon: str, ticker: str = "") -> dict:
+    """series_features() по буферам: ts — int64 нс (или datetime64[ns]), ohlc — (n, 4) Open/High/Low/Close."""
+    ts = np.asarray(ts).view("datetime64[ns]")
+    ohlc = np.asarray(ohlc, dtype=float)
+    o, h, l, c = ohlc[:, 0], ohlc[:, 1], ohlc[:, 2], ohlc[:, 3]
+    with stage("pivots"):
+        piv = fib_pivots(*prev_HLC_arrays(ts, h, l, c, horizon))
+    with stage("indicators"):
+        hist, rsi, atr_s = indicator_arrays(h, l, c)
+    with stage("overheat"):
+        ha_streak = streak_series(np.diff((o + h + l + c) / 4.0, prepend=np.nan), positive=True)
+        hist_streak = np.where(hist > 0, streak_series(hist, True),
+                               np.where(hist < 0, streak_series(hist, False), 0))
+    with stage("regime"):
+        slope, vol = regime_stats_arrays(ts, c, {"ST":"W","MID":"M","LT":"Y"}[horizon])
+    with stage("confirmation"):
+        zone_ok = candle_confirmation_series(o, h, l, c) & default_calendar().allowed_mask(ts, ticker)
+    return {
+        "price": np.array(c),
+        "piv": piv,
+        "ha_streak": ha_streak,
+        "hist_streak": hist_streak,
+        "atr": atr_s,
+        "rsi": rsi,
+        "slope": slope,
+        "vol": vol,
+        "zone_ok": zone_ok,
+    }
+
+def decide_arrays(ts: np.ndarray, ohlc: np.ndarray, horizon: str, params: dict | None = None,
+                  features: dict | None = None, ticker: str = "") -> dict:
+    """
+    decide_series() без pandas: ts — int64 нс по возрастанию, ohlc — (n, 4) float64
+    (float32 приводится копией). Возвращает signal_arrays() + "ts"; action — int8 WAIT/LONG/SHORT
+    = 0/1/-1, regime — int8 индекс в REGIMES. features — готовый features_from_arrays().
+    """
+    f = features if features is not None else features_from_arrays(ts, ohlc, horizon, ticker)
+    out = signal_arrays(f, horizon, params)
+    out["ts"] = np.asarray(ts)
+    return out
@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+"""
+Индикаторы по панели (бар × тикер) и срез решений по всей вселенной за один проход.
+
+    pan = panel({t: load_history(t, "3y") for t in tickers})
+    hist = macd_hist_panel(pan["close"])        # (T, K), NaN там, где у тикера нет бара
+    table = decide_panel(pan, "MID")            # строка на тикер: решение его последнего бара
+
+macd_hist_panel / rsi_wilder_panel / atr_panel / heikin_ashi_panel принимают ndarray формы
+(T, K) или широкий DataFrame (колонки — тикеры) и возвращают то же. Рекурсии (EMA, Wilder,
+rolling mean, HA) идут циклом по барам, векторно по всем тикерам сразу.
+Разная длина истории и пропуски — NaN: бары каждого тикера упаковываются подряд
+(«своя» история без дыр), считаются и раскладываются обратно, поэтому колонка бит в бит
+равна macd_hist/rsi_wilder/atr/heikin_ashi на истории этого тикера, а decide_panel —
+последней строке decide_series().
+"""
+from __future__ import annotations
+import numpy as np
+import pandas as pd
+from core_strategy import (_ewm_alpha, candle_confirmation_series, fib_pivots, period_keys,
+                           signal_arrays, signals_frame)
+from events import default_calendar
+from market_data import OHLC
+from profiling import stage
+
+FIELDS = ("open", "high", "low", "close")
+
+def panel(data: dict[str, pd.DataFrame]) -> dict:
+    """{тикер: OHLC} -> матрицы open/high/low/close (бар общего календаря × тикер), NaN — нет бара."""
+    tickers = list(data)
+    cal = np.unique(np.concatenate([data[t].index.values for t in tickers])) if tickers else np.array([], "M8[ns]")
+    T, K = len(cal), len(tickers)
+    out = {k: np.full((T, K), np.nan) for k in FIELDS}
+    for j, t in enumerate(tickers):
+        df = data[t]
+        rows = np.searchsorted(cal, df.index.values)
+        for k, col in zip(FIELDS, OHLC):
+            out[k][rows, j] = df[col].to_numpy(dtype=float)
+    return {"tickers": tickers, "calendar": cal, **out}
+
+# ---------- Packing ----------
+# Упакованная матрица: бары тикера j — строки 0..n[j]-1 его колонки, ниже — NaN.
+
+def _pack(valid: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Порядок строк, ставящий бары каждой колонки подряд с начала, и число баров по колонкам."""
+    return np.argsort(~valid, axis=0, kind="stable"), valid.sum(axis=0)
+
+def _take(X: np.ndarray, order: np.ndarray, n: np.ndarray) -> np.ndarray:
+    P = np.take_along_axis(X, order, axis=0)
+    P[np.arange(len(X))[:, None] >= n] = np.nan
+    return P
+
+def _put(P: np.ndarray, order: np.ndarray, valid: np.ndarray) -> np.ndarray:
+    out = np.empty_like(P)
+    np.put_along_axis(out, order, P, axis=0)
+    out[~valid] = np.nan
+    return out
+
+def _apply(fn, *cols):
+    """fn по упакованным колонкам; бар есть, где все входы не NaN. DataFrame на входе — DataFrame на выходе."""
+    X = [np.asarray(c, dtype=float) for c in cols]
+    valid = np.logical_and.reduce([~np.isnan(x) for x in X])
+    order, n = _pack(valid)
+    res = fn(*(_take(x, order, n) for x in X))
+    res = [_put(r, order, valid) for r in (res if isinstance(res, tuple) else (res,))]
+    if isinstance(cols[0], pd.DataFrame):
+        res = [pd.DataFrame(r, index=cols[0].index, columns=cols[0].columns) for r in res]
+    return tuple(res) if len(res) > 1 else res[0]
+
+# ---------- Recurrences (упакованные матрицы) ----------
+def _ewm_rows(X: np.ndarray, alpha: float) -> np.ndarray:
+    """ewm(adjust=False).mean() каждой колонки: шаг как core_strategy._ewm_step()."""
+    out = np.empty_like(X)
+    w = 1.0 - alpha
+    d = w + alpha
+    prev = np.full(X.shape[1], np.nan)
+    with np.errstate(invalid="ignore"):
+        for i in range(len(X)):
+            x = X[i]
+            step = (w * prev + alpha * x) / d
+            prev = np.where(np.isnan(prev), x, np.where(np.isnan(x) | (prev == x), prev, step))
+            out[i] = prev
+    return out
+
+def _rolling_mean_rows(X: np.ndarray, period: int) -> np.ndarray:
+    """
+    rolling(period).mean() каждой колонки как в pandas: сумма с компенсацией Кахана (отдельной
+    для входящих и уходящих значений), окно из одинаковых значений отдаётся как есть.
+    """
+    T, K = X.shape
+    out = np.full((T, K), np.nan)
+    sum_x = np.zeros(K); comp_add = np.zeros(K); comp_rem = np.zeros(K)
+    neg = np.zeros(K, dtype=np.int64); same = np.zeros(K, dtype=np.int64)
+    prev = X[0] if T else None
+    with np.errstate(invalid="ignore"):
+        for i in range(T):
+            if i >= period:
+                old = X[i - period]
+                y = -old - comp_rem
+                t = sum_x + y
+                comp_rem = t - sum_x - y
+                sum_x = t
+                neg -= np.signbit(old)
+            x = X[i]
+            y = x - comp_add
+            t = sum_x + y
+            comp_add = t - sum_x - y
+            sum_x = t
+            neg += np.signbit(x)
+            same = np.where(x == prev, same + 1, 1)
+            prev = x
+            if i >= period - 1:
+                res = sum_x / period
+                res = np.where(((neg == 0) & (res < 0)) | ((neg == period) & (res > 0)), 0.0, res)
+                out[i] = np.where(same >= period, x, res)
+    return out
+
+def _macd_rows(C: np.ndarray) -> np.ndarray:
+    macd = _ewm_rows(C, _ewm_alpha(span=12)) - _ewm_rows(C, _ewm_alpha(span=26))
+    return macd - _ewm_rows(macd, _ewm_alpha(span=9))
+
+def _rsi_rows(C: np.ndarray, n: int = 14) -> np.ndarray:
+    delta = np.full_like(C, np.nan)
+    delta[1:] = C[1:] - C[:-1]
+    a = _ewm_alpha(alpha=1 / n)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        roll_up = _ewm_rows(np.maximum(delta, 0.0), a)
+        roll_down = _ewm_rows(-np.minimum(delta, 0.0), a)
+        rs = roll_up / np.where(roll_down == 0, np.nan, roll_down)
+        rsi = 100 - 100 / (1 + rs)
+    rsi[np.isnan(rsi)] = 50.0
+    return rsi
+
+def _atr_rows(H: np.ndarray, L: np.ndarray, C: np.ndarray, period: int = 14) -> np.ndarray:
+    pc = np.full_like(C, np.nan)
+    pc[1:] = C[:-1]
+    tr = np.fmax.reduce([H - L, np.abs(H - pc), np.abs(L - pc)])
+    return _rolling_mean_rows(tr, period)
+
+def _ha_rows(O: np.ndarray, H: np.ndarray, L: np.ndarray, C: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    ha_close = (O + H + L + C) / 4.0
+    ha_open = np.empty_like(ha_close)
+    ha_open[:1] = ha_close[:1]
+    ha_open[1:] = _ewm_rows(ha_close, _ewm_alpha(alpha=0.5))[:-1]
+    return ha_open, ha_close
+
+# ---------- Batched indicators ----------
+def macd_hist_panel(close):
+    return _apply(_macd_rows, close)
+
+def rsi_wilder_panel(close, n: int = 14):
+    return _apply(lambda C: _rsi_rows(C, n), close)
+
+def atr_panel(high, low, close, period: int = 14):
+    return _apply(lambda H, L, C: _atr_rows(H, L, C, period), high, low, close)
+
+def heikin_ashi_panel(open, high, low, close):
+    """(HA_Open, HA_Close)."""
+    return _apply(_ha_rows, open, high, low, close)
+
+# ---------- Cross-sectional decide ----------
+def _last(P: np.ndarray, n: np.ndarray) -> np.ndarray:
+    return P[n - 1, np.arange(P.shape[1])]
+
+def _streak_last(V: np.ndarray, n: np.ndarray, positive=True) -> np.ndarray:
+    """streak_series() на последнем баре каждой колонки."""
+    rows = np.arange(len(V))[:, None]
+    live = rows < n
+    with np.errstate(invalid="ignore"):
+        hit = (V > 0 if positive else V < 0) & live
+        brk = (V < 0 if positive else V > 0) & live
+    last_brk = np.where(brk, rows, -1).max(axis=0)
+    return (hit & (rows > last_brk)).sum(axis=0)
+
+def _prev_HLC_last(keys: dict, H: np.ndarray, L: np.ndarray, C: np.ndarray, n: np.ndarray,
+                   horizon: str) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """prev_HLC_arrays() на последнем баре; keys — {ТФ: упакованные номера периодов}."""
+    K = H.shape[1]
+    cols = np.arange(K)
+    live = np.arange(len(H))[:, None] < n
+    ok = n >= 2
+    PH = np.full(K, np.nan); PL = np.full(K, np.nan); PC = np.full(K, np.nan)
+    PH[ok], PL[ok], PC[ok] = H[n[ok] - 2, cols[ok]], L[n[ok] - 2, cols[ok]], C[n[ok] - 2, cols[ok]]
+    for tf in {"ST": ["W"], "MID": ["W", "M"], "LT": ["M", "Y"]}[horizon]:
+        kp = keys[tf]
+        cnt = (live & (kp < _last(kp, n))).sum(axis=0)  # баров до текущего периода
+        ok = cnt > 0
+        prev = np.maximum(cnt - 1, 0)
+        m = live & (kp == kp[prev, cols])
+        ph = np.where(m, H, -np.inf).max(axis=0)
+        pl = np.where(m, L, np.inf).min(axis=0)
+        PH[ok], PL[ok], PC[ok] = ph[ok], pl[ok], C[prev, cols][ok]
+    return PH, PL, PC
+
+def _regime_last(kp: np.ndarray, C: np.ndarray, n: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """regime_stats_arrays() на последнем баре: те же кумулятивные суммы по закрытиям периодов."""
+    K = C.shape[1]
+    slope = np.full(K, np.nan); vol = np.full(K, np.nan)
+    live = np.arange(len(C))[:, None] < n
+    end = live.copy()
+    end[:-1] &= (kp[1:] != kp[:-1]) | ~live[1:]
+    order, m = _pack(end)
+    pc = _take(C, order, m)  # закрытия периодов, последний — текущий бар
+    ok = np.flatnonzero(m - 1 >= 59)
+    if len(ok) == 0:
+        return slope, vol
+    k = m[ok] - 1
+    last = _last(C, n)[ok]
+    cs = np.concatenate((np.zeros((1, K)), np.cumsum(pc, axis=0)))[:, ok]
+    j = np.arange(len(ok))
+    ma_last = (cs[k, j] - cs[k - 49, j] + last) / 50.0
+    ma_10 = (cs[k - 8, j] - cs[k - 58, j]) / 50.0
+    slope[ok] = (ma_last - ma_10) / np.maximum(1e-9, ma_10)
+    w = pc[k[:, None] - 13 + np.arange(13), ok[:, None]]
+    s1 = w.sum(axis=1) + last
+    s2 = (w * w).sum(axis=1) + last * last
+    var = np.maximum(0.0, (s2 - s1 * s1 / 14.0) / 13.0)
+    vol[ok] = np.sqrt(var) / last
+    return slope, vol
+
+def panel_features(pan: dict, horizon: str) -> dict:
+    """series_features() на последнем баре каждого тикера панели (тикеры без баров — пропускаются)."""
+    valid = np.logical_and.reduce([~np.isnan(pan[k]) for k in FIELDS])
+    keep = np.flatnonzero(valid.any(axis=0))
+    valid = valid[:, keep]
+    order, n = _pack(valid)
+    O, H, L, C = (_take(pan[k][:, keep], order, n) for k in FIELDS)
+    cal = pan["calendar"]
+    base_tf = {"ST":"W","MID":"M","LT":"Y"}[horizon]
+    keys = {tf: period_keys(cal, tf)[order] for tf in ("W", "M", "Y")}
+    with stage("pivots"):
+        piv = fib_pivots(*_prev_HLC_last(keys, H, L, C, n, horizon))
+    with stage("indicators"):
+        hist_rows = _macd_rows(C)
+        hist = _last(hist_rows, n)
+        rsi = _last(_rsi_rows(C), n)
+        atr_s = _last(_atr_rows(H, L, C), n)
+    with stage("overheat"):
+        ha_close = (O + H + L + C) / 4.0
+        d = np.full_like(ha_close, np.nan)
+        d[1:] = ha_close[1:] - ha_close[:-1]
+        ha_streak = _streak_last(d, n, True)
+        hist_streak = np.where(hist > 0, _streak_last(hist_rows, n, True),
+                               np.where(hist < 0, _streak_last(hist_rows, n, False), 0))
+    with stage("regime"):
+        slope, vol = _regime_last(keys[base_tf], C, n)
+    tickers = [pan["tickers"][j] for j in keep]
+    date = cal[order[n - 1, np.arange(len(keep))]]
+    with stage("confirmation"):
+        zone_ok = candle_confirmation_series(_last(O, n), _last(H, n), _last(L, n), _last(C, n))
+        events = default_calendar()
+        zone_ok &= np.array([events.allowed(d, t) for d, t in zip(date, tickers)], dtype=bool)
+    return {
+        "tickers": tickers,
+        "date": date,
+        "price": _last(C, n),
+        "piv": piv,
+        "ha_streak": ha_streak,
+        "hist_streak": hist_streak,
+        "atr": atr_s,
+        "rsi": rsi,
+        "slope": slope,
+        "vol": vol,
+        "zone_ok": zone_ok,
+    }
+
+def decide_panel(data, horizon: str, params: dict | None = None, features: dict | None = None) -> pd.DataFrame:
+    """
+    Решение последнего бара каждого тикера — строка на тикер, колонки как у decide_series() + date.
+    data — {тикер: OHLC} или готовый panel(); features — готовый panel_features(pan, horizon).
+    """
+    if features is None:
+        pan = data if "calendar" in data else panel(data)
+        features = panel_features(pan, horizon)
+    out = signals_frame(signal_arrays(features, horizon, params), pd.Index(features["tickers"], name="ticker"))
+    out.insert(0, "date", features["date"])
+    return out
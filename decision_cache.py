@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""
+Кэш решений decide() и текста narrator.humanize().
+
+    cache = default_cache()
+    dec, txt = cache.analyze("QQQ", df, "MID")   # повторный вызов на тех же данных — из кэша
+    cache.stats()                                 # {"hits": .., "disk_hits": .., "misses": .., ...}
+
+Ключ — отпечаток df (длина, первая и последняя дата, OHLC последнего бара) + горизонт +
+итоговые пороги horizon_params(horizon, params) + тикер + версия календаря событий +
+SCHEMA (версия правил): история с дописанным или обновлённым баром даёт новый ключ,
+сами данные целиком не хэшируются. Память — LRU на maxsize записей; диск (directory, опционально) —
+pickle-файл на ключ, общий для процессов Streamlit, старые файлы вычищаются сверх disk_max.
+Возвращаемые dict общие для всех вызовов — не изменять.
+"""
+from __future__ import annotations
+import hashlib
+import json
+import os
+import pickle
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from core_strategy import decide, horizon_params
+from events import default_calendar
+from narrator import humanize
+
+def frame_fingerprint(df: pd.DataFrame) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    h.update(np.int64(len(df)).tobytes())
+    if len(df):
+        h.update(np.array([df.index[0].value, df.index[-1].value], dtype=np.int64).tobytes())
+        h.update(df[["Open", "High", "Low", "Close"]].iloc[-1].to_numpy(dtype=np.float64).tobytes())
+    return h.hexdigest()
+
+# поднимать при любом изменении правил decide()/decision_from() или формата записи:
+# дисковый кэш общий для процессов и переживает деплой
+SCHEMA = 1
+
+def decision_key(df: pd.DataFrame, horizon: str, params: dict | None = None, ticker: str = "") -> str:
+    # пороги целиком (DEFAULT_PARAMS + params), а не только переопределения; версия календаря
+    # событий: новый календарь — новые решения
+    extra = json.dumps([SCHEMA, ticker.upper(), horizon, horizon_params(horizon, params),
+                        default_calendar().version], sort_keys=True, default=str)
+    return f"{frame_fingerprint(df)}-{hashlib.blake2b(extra.encode(), digest_size=8).hexdigest()}"
+
+class DecisionCache:
+    def __init__(self, maxsize: int = 512, directory: str | None = None, disk_max: int = 20_000):
+        self.maxsize = maxsize
+        self.directory = directory
+        self.disk_max = disk_max
+        self._mem: OrderedDict[str, dict] = OrderedDict()
+        self._lock = threading.Lock()
+        self._puts = 0
+        self.hits = self.disk_hits = self.misses = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    # ---------- storage ----------
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.pkl")
+
+    def _get(self, key: str) -> dict | None:
+        with self._lock:
+            entry = self._mem.get(key)
+            if entry is not None:
+                self._mem.move_to_end(key)
+                self.hits += 1
+                return entry
+        if self.directory:
+            try:
+                with open(self._path(key), "rb") as f:
+                    entry = pickle.load(f)
+            except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+                entry = None
+            if entry is not None:
+                with self._lock:
+                    self.disk_hits += 1
+                self._remember(key, entry)
+                return entry
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def _remember(self, key: str, entry: dict):
+        with self._lock:
+            self._mem[key] = entry
+            self._mem.move_to_end(key)
+            while len(self._mem) > self.maxsize:
+                self._mem.popitem(last=False)
+
+    def _put(self, key: str, entry: dict):
+        self._remember(key, entry)
+        if not self.directory:
+            return
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+        self._puts += 1
+        if self._puts % 256 == 0:
+            self._prune()
+
+    def _prune(self):
+        files = [e for e in os.scandir(self.directory) if e.name.endswith(".pkl")]
+        if len(files) <= self.disk_max:
+            return
+        files.sort(key=lambda e: e.stat().st_mtime)
+        for e in files[:len(files) - self.disk_max]:
+            try:
+                os.remove(e.path)
+            except FileNotFoundError:
+                pass
+
+    # ---------- API ----------
+    def decide(self, df: pd.DataFrame, horizon: str, params: dict | None = None, ticker: str = "") -> dict:
+        key = decision_key(df, horizon, params, ticker)
+        entry = self._get(key)
+        if entry is None:
+            entry = {"decision": decide(df, horizon, params=params, ticker=ticker), "text": None}
+            self._put(key, entry)
+        return entry["decision"]
+
+    def analyze(self, ticker: str, df: pd.DataFrame, horizon: str, params: dict | None = None) -> tuple[dict, str]:
+        """(decide(), humanize()) — оба из кэша, если данные, горизонт и params те же."""
+        key = decision_key(df, horizon, params, ticker)
+        entry = self._get(key)
+        if entry is None:
+            dec = decide(df, horizon, params=params, ticker=ticker)
+            entry = {"decision": dec, "text": humanize(ticker, horizon, dec)}
+            self._put(key, entry)
+        elif entry["text"] is None:
+            entry = {**entry, "text": humanize(ticker, horizon, entry["decision"])}
+            self._put(key, entry)
+        return entry["decision"], entry["text"]
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.disk_hits + self.misses
+            return {"hits": self.hits, "disk_hits": self.disk_hits, "misses": self.misses,
+                    "hit_rate": (self.hits + self.disk_hits) / total if total else 0.0,
+                    "size": len(self._mem)}
+
+    def clear(self):
+        with self._lock:
+            self._mem.clear()
+            self.hits = self.disk_hits = self.misses = 0
+
+_default: DecisionCache | None = None
+
+def default_cache() -> DecisionCache:
+    """Общий для процесса кэш; диск — CAPINTEL_CACHE_DIR (пустая строка — только память)."""
+    global _default
+    if _default is None:
+        directory = os.environ.get("CAPINTEL_CACHE_DIR",
+                                   os.path.join(os.path.expanduser("~"), ".cache", "capintel", "decisions"))
+        _default = DecisionCache(directory=directory or None)
+    return _default
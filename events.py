@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+Календарь событий (отчётности, дивиденды, макро) для events_guard.
+
+    cal = load_calendar("events.csv")          # или .parquet
+    cal.allowed(pd.Timestamp("2024-05-02"), "AAPL")   # False — окно вокруг отчёта
+    cal.allowed_mask(df.index, "AAPL")         # bool по каждому бару — для бэктеста
+
+Файл: колонки ticker, date, kind (необязательна), before/after (необязательны, дни).
+ticker "*" или пустой — событие для всех тикеров (макро). Вокруг события — запретное
+окно [date - before, date + after] в календарных днях; по умолчанию ширина берётся из
+BLACKOUT по kind. Окна тикера (вместе с общими) сливаются в непересекающиеся отрезки и
+хранятся отсортированными массивами дней: запрос — один searchsorted, O(log n).
+Без календаря (CAPINTEL_EVENTS не задан) запретов нет — поведение как у прежней заглушки.
+"""
+from __future__ import annotations
+import hashlib
+import os
+from typing import TYPE_CHECKING
+import numpy as np
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# kind -> (дней до, дней после)
+BLACKOUT = {"earnings": (1, 1), "dividend": (0, 0), "macro": (0, 0)}
+ALL = "*"
+
+def _days(dates) -> np.ndarray:
+    """Timestamp / DatetimeIndex / datetime64 / int64 нс -> int64 номера дней (наивное время)."""
+    if getattr(dates, "tz", None) is not None:
+        dates = dates.tz_localize(None)
+    a = np.asarray(dates)
+    if a.dtype.kind in "iu":
+        a = a.view("datetime64[ns]")
+    return a.astype("datetime64[D]").astype(np.int64)
+
+_DAY_NS = 86_400_000_000_000
+
+def _day(date) -> int:
+    # скаляр: у pd.Timestamp — напрямую из .value, без массива
+    if getattr(date, "tz", None) is not None:
+        date = date.tz_localize(None)
+    value = getattr(date, "value", None)
+    return value // _DAY_NS if isinstance(value, int) else int(_days(date))
+
+def _merge(starts: np.ndarray, ends: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    # пересекающиеся и смежные окна -> непересекающиеся отрезки по возрастанию
+    if not len(starts):
+        return starts, ends
+    order = np.argsort(starts, kind="stable")
+    s, e = starts[order], np.maximum.accumulate(ends[order])
+    new = np.ones(len(s), dtype=bool)
+    new[1:] = s[1:] > e[:-1] + 1
+    last = np.r_[np.flatnonzero(new)[1:] - 1, len(s) - 1]
+    return s[new], e[last]
+
+class EventCalendar:
+    def __init__(self, tickers, dates, before, after):
+        """Массивы одной длины: тикер (ALL — для всех), дата события, дни до/после."""
+        tickers = np.asarray(tickers, dtype=object)
+        day = _days(dates)
+        starts = day - np.asarray(before, dtype=np.int64)
+        ends = day + np.asarray(after, dtype=np.int64)
+        common = tickers == ALL
+        self.events = len(day)
+        self._all = _merge(starts[common], ends[common])
+        self._index: dict[str, tuple[np.ndarray, np.ndarray]] = {}
+        for t in np.unique(tickers[~common]):
+            m = (tickers == t) | common
+            self._index[t] = _merge(starts[m], ends[m])
+        h = hashlib.blake2b(digest_size=8)
+        for t in sorted(self._index):
+            h.update(t.encode())
+            for a in self._index[t]:
+                h.update(a.tobytes())
+        for a in self._all:
+            h.update(a.tobytes())
+        self.version = h.hexdigest() if self.events else ""
+
+    def windows(self, ticker: str) -> tuple[np.ndarray, np.ndarray]:
+        """(начала, концы) запретных окон тикера в днях от эпохи, включительно."""
+        return self._index.get(ticker.upper().strip(), self._all)
+
+    def allowed(self, date, ticker: str = "") -> bool:
+        """Нет ли события тикера (или общего) в окне вокруг date."""
+        starts, ends = self.windows(ticker)
+        if not len(starts):
+            return True
+        d = _day(date)
+        i = int(np.searchsorted(starts, d, side="right")) - 1
+        return i < 0 or d > ends[i]
+
+    def allowed_mask(self, dates, ticker: str = "") -> np.ndarray:
+        """allowed() для каждой даты сразу: DatetimeIndex, datetime64 или int64 нс."""
+        starts, ends = self.windows(ticker)
+        d = _days(dates)
+        if not len(starts):
+            return np.ones(len(d), dtype=bool)
+        i = np.searchsorted(starts, d, side="right") - 1
+        return (i < 0) | (d > ends[np.maximum(i, 0)])
+
+def from_frame(df: pd.DataFrame, kinds=None) -> EventCalendar:
+    """DataFrame с колонками ticker, date[, kind, before, after] -> EventCalendar."""
+    import pandas as pd
+    if kinds is not None and "kind" in df:
+        df = df[df["kind"].isin(list(kinds))]
+    kind = df["kind"].astype(str).str.lower() if "kind" in df else [""] * len(df)
+    width = np.array([BLACKOUT.get(k, (0, 0)) for k in kind], dtype=float).reshape(-1, 2)
+    for j, col in enumerate(("before", "after")):
+        if col in df:  # пропуск в колонке — ширина по kind
+            v = df[col].to_numpy(dtype=float)
+            width[:, j] = np.where(np.isnan(v), width[:, j], v)
+    tickers = df["ticker"].fillna("").astype(str).str.upper().str.strip().replace("", ALL)
+    return EventCalendar(tickers.to_numpy(), pd.to_datetime(df["date"]).to_numpy(), width[:, 0], width[:, 1])
+
+def load_calendar(path: str, kinds=None) -> EventCalendar:
+    """CSV или Parquet (по расширению); kinds — оставить только эти виды событий."""
+    import pandas as pd
+    df = pd.read_parquet(path) if path.endswith((".parquet", ".pq")) else pd.read_csv(path)
+    return from_frame(df, kinds)
+
+EMPTY = EventCalendar([], np.array([], dtype="datetime64[ns]"), [], [])
+_default: EventCalendar | None = None
+
+def default_calendar() -> EventCalendar:
+    """Общий для процесса календарь из файла CAPINTEL_EVENTS (нет файла — пустой)."""
+    global _default
+    if _default is None:
+        path = os.environ.get("CAPINTEL_EVENTS", "")
+        _default = load_calendar(path) if path and os.path.exists(path) else EMPTY
+    return _default
+
+def set_default_calendar(cal: EventCalendar | None):
+    """Подменить общий календарь (None — перечитать CAPINTEL_EVENTS при следующем запросе)."""
+    global _default
+    _default = cal
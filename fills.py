@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+"""
+Движок исполнения сделок по сигналам decide_series(): порядок событий внутри бара,
+гэпы, проскальзывание, комиссии, частичный выход TP1/TP2, MAE/MFE по сделке.
+
+    eq, tr = run_fill_backtest(df, "MID", entry="next_open", path="ohlc",
+                               slippage_bps=5, commission_bps=1)
+    fill_metrics(eq, tr)          # expectancy, profit factor, MAE/MFE в R, ...
+
+Правила:
+- вход: entry="next_open" — рыночный на открытии следующего бара (сделка пропускается,
+  если открытие уже за SL или за TP1); entry="signal" — как в simulate(): по уровню entry
+  на баре сигнала. Уровни SL/TP1/TP2 — из сигнала, размер — от риска |вход - SL|.
+- позиция ведётся с бара после сигнала; половина закрывается на TP1, половина — на TP2
+  или по стопу (breakeven=True — стоп остатка переносится на цену входа после TP1).
+- гэп (gaps=True): открытие за стопом — стоп исполняется по открытию, открытие за целью —
+  цель по открытию (лимитный ордер, не хуже уровня).
+- если на одном баре задеты и стоп, и цель: path="worst" — сначала стоп (как в simulate()),
+  "best" — сначала цели, "ohlc" — путь O-L-H-C для белой свечи и O-H-L-C для чёрной.
+  То же для остатка на баре TP1, если этот бар задел и стоп остатка (вместе со стопом
+  или гэпом через TP1): TP2 на нём — только если цель по правилу path раньше стопа.
+- проскальзывание slippage_bps — против позиции на рыночных исполнениях (вход next_open,
+  стоп); комиссия — commission_bps от оборота и commission_per_share за акцию на каждом
+  исполнении.
+
+Исходы всех потенциальных сделок (бары и цены TP1/TP2/SL, MAE/MFE) считаются сразу
+массивами: первое касание уровня — бинарный подъём по sparse table min(Low)/max(High),
+O(log N) на сделку. Циклом по сделкам (не по барам) остаётся только выбор следующей
+сделки после закрытия предыдущей и размер позиции от текущего капитала.
+Сделка, не закрытая к концу истории, — reason OPEN: в equity — только исполненные части
+(вход, TP1), в метрики не входит.
+"""
+from __future__ import annotations
+import numpy as np
+import pandas as pd
+from backtest import backtest_metrics
+from core_strategy import decide_series
+from profiling import stage
+
+PATHS = ("worst", "best", "ohlc")
+ENTRIES = ("next_open", "signal")
+REASONS = ["SL", "TP1+SL", "TP2", "OPEN"]
+
+# ---------- Range queries ----------
+def _sparse(x: np.ndarray, fn) -> list[np.ndarray]:
+    """Sparse table: уровень j, элемент i — fn по x[i : i + 2**j]."""
+    levels = [x]
+    w = 1
+    while 2 * w <= len(x):
+        prev = levels[-1]
+        levels.append(fn(prev[:-w], prev[w:]))
+        w *= 2
+    return levels
+
+def _first_hit(levels: list[np.ndarray], start: np.ndarray, level: np.ndarray, hit, end: int) -> np.ndarray:
+    """Первый индекс j в [start, end), где hit(x[j], level); end, если касания нет."""
+    pos = start.copy()
+    for j in range(len(levels) - 1, -1, -1):
+        w = 1 << j
+        ok = pos + w <= end
+        blk = levels[j][np.minimum(pos, len(levels[j]) - 1)]
+        pos += w * (ok & ~hit(blk, level))
+    return pos
+
+def _range(levels: list[np.ndarray], fn, s: np.ndarray, e: np.ndarray) -> np.ndarray:
+    """fn по x[s..e] включительно."""
+    j = np.floor(np.log2(e - s + 1)).astype(np.int64)
+    out = np.empty(len(s))
+    for k in np.unique(j):
+        m = j == k
+        out[m] = fn(levels[k][s[m]], levels[k][e[m] - (1 << k) + 1])
+    return out
+
+# ---------- Engine ----------
+def _codes(action) -> np.ndarray:
+    a = np.asarray(action)
+    return np.where(a == "LONG", 1, np.where(a == "SHORT", -1, 0)).astype(np.int8)
+
+def simulate_fills(df: pd.DataFrame, sig: pd.DataFrame, initial_capital=100000, risk_per_trade=0.01,
+                   start: int = 59, entry: str = "next_open", path: str = "worst", gaps: bool = True,
+                   slippage_bps: float = 0.0, commission_bps: float = 0.0, commission_per_share: float = 0.0,
+                   breakeven: bool = False):
+    """
+    (eq, tr) как у simulate(): eq — реализованный капитал по барам, tr — сделки с колонками
+    side, entry_date, entry, tp1, tp2, sl, size, tp1_hit, exit_tp1, exit_date, exit, reason,
+    commission, pnl (за вычетом комиссий), r (pnl в долях начального риска), mae/mfe (цена)
+    и mae_r/mfe_r (в R) по High/Low баров удержания, включая бар выхода.
+    """
+    if entry not in ENTRIES:
+        raise ValueError(f"entry: {' | '.join(ENTRIES)}, не {entry}")
+    if path not in PATHS:
+        raise ValueError(f"path: {' | '.join(PATHS)}, не {path}")
+    o, h, l, c = (df[k].to_numpy(dtype=float) for k in ("Open", "High", "Low", "Close"))
+    days = df.index.normalize().values
+    first, end = max(59, start), len(df) - 1  # бары ведения позиции — до end, как в simulate()
+    slip, fee_bps = slippage_bps / 1e4, commission_bps / 1e4
+
+    # ---- потенциальные сделки: каждый бар с сигналом ----
+    act = _codes(sig["base_action"])
+    t = np.flatnonzero(act[first:end] != 0) + first if end > first else np.array([], dtype=np.int64)
+    t = t[t + 1 < end]  # сигнал последнего бара ведения позицию уже не ведёт
+    if entry == "next_open":
+        base = o[t + 1]
+    else:
+        base = sig["base_entry"].to_numpy(dtype=float)[t]
+    side = act[t].astype(np.int64)
+    sl, tp1, tp2 = (sig[f"base_{k}"].to_numpy(dtype=float)[t] for k in ("sl", "tp1", "tp2"))
+    fill = base * (1 + side * slip)
+    risk = (fill - sl) * side
+    ok = risk > 0
+    if entry == "next_open":
+        ok &= (tp1 - base) * side > 0
+    t, side, fill, risk, sl, tp1, tp2 = (x[ok] for x in (t, side, fill, risk, sl, tp1, tp2))
+    s = t + 1  # первый бар ведения
+    entry_bar = s if entry == "next_open" else t
+    longs = side == 1
+
+    with stage("fills"):
+        lo = _sparse(l[:end], np.minimum)
+        hi = _sparse(h[:end], np.maximum)
+
+        def touch(start, level, stop):
+            # стоп лонга и цель шорта — по Low, остальное — по High
+            out = np.empty(len(start), dtype=np.int64)
+            by_low = longs == stop
+            out[by_low] = _first_hit(lo, start[by_low], level[by_low], np.less_equal, end)
+            out[~by_low] = _first_hit(hi, start[~by_low], level[~by_low], np.greater_equal, end)
+            return out
+
+        def at(x, j):
+            return x[np.minimum(j, end - 1)]
+
+        def gapped(j, level):
+            # открытие бара j уже за уровнем: для стопа — против позиции, для цели — в её пользу
+            return gaps & ((at(o, j) - level) * side <= 0), gaps & ((at(o, j) - level) * side >= 0)
+
+        def targets_first(j, stop, target, stop_gaps=True):
+            # stop_gaps=False — стоп выставлен внутри бара (после TP1), гэп открытия его не касается
+            gap_stop = gapped(j, stop)[0] & stop_gaps
+            _, gap_tp = gapped(j, target)
+            if path == "worst":
+                tf = np.zeros(len(j), dtype=bool)
+            elif path == "best":
+                tf = np.ones(len(j), dtype=bool)
+            else:  # ohlc: белая свеча сначала идёт к Low, чёрная — к High
+                tf = (at(c, j) >= at(o, j)) != longs
+            return ~gap_stop & (gap_tp | tf)
+
+        def stop_px(j, level):
+            gap_stop, _ = gapped(j, level)
+            return np.where(gap_stop, at(o, j), level) * (1 - side * slip)
+
+        def target_px(j, level):
+            _, gap_tp = gapped(j, level)
+            return np.where(gap_tp, at(o, j), level)
+
+        # ---- фаза 1: стоп против TP1 ----
+        j_sl = touch(s, sl, True)
+        j_t1 = touch(s, tp1, False)
+        j_t2 = np.maximum(touch(s, tp2, False), j_t1)
+        tie1 = (j_sl == j_t1) & (j_sl < end)
+        tp1_hit = (j_t1 < j_sl) | (tie1 & targets_first(j_t1, sl, tp1))
+        stopped = (j_sl < end) & ~tp1_hit
+
+        # ---- фаза 2: остаток после TP1 ----
+        stop2 = fill if breakeven else sl
+        # бар TP1 задел и стоп остатка (тот же бар со стопом или гэп через TP1): остаток решается
+        # на нём же, TP2 против стопа — по правилу path
+        _, gap1 = gapped(j_t1, tp1)
+        same = tp1_hit & (tie1 | gap1) & ((np.where(longs, at(l, j_t1), at(h, j_t1)) - stop2) * side <= 0)
+        j2_sl = np.where(same, j_t1, touch(np.minimum(j_t1 + 1, end), stop2, True))
+        tie2 = (j2_sl == j_t2) & (j_t2 < end)
+        first2 = np.where(same, targets_first(j_t1, stop2, tp2, stop_gaps=False), targets_first(j_t2, stop2, tp2))
+        tp2_hit = tp1_hit & (((j_t2 < j2_sl) & (j_t2 < end)) | (tie2 & first2))
+        stop2_hit = tp1_hit & ~tp2_hit & (j2_sl < end)
+
+        reason = np.full(len(t), 3, dtype=np.int8)
+        reason[stopped] = 0
+        reason[stop2_hit] = 1
+        reason[tp2_hit] = 2
+        exit_bar = np.select([stopped, stop2_hit, tp2_hit], [j_sl, j2_sl, j_t2], end - 1)
+        px1 = np.where(tp1_hit, target_px(j_t1, tp1), np.nan)
+        tie_px = np.where(same, stop2 * (1 - side * slip), stop_px(j2_sl, stop2))
+        px2 = np.select([stopped, stop2_hit, tp2_hit], [stop_px(j_sl, sl), tie_px, target_px(j_t2, tp2)], np.nan)
+
+        # на акцию: P/L половин, комиссии входа и выходов
+        half1 = np.where(stopped, px2, px1)  # полный стоп — обе половины по цене стопа
+        gross1 = np.where(stopped | tp1_hit, (half1 - fill) * side * 0.5, 0.0)
+        gross2 = np.where(reason < 3, (px2 - fill) * side * 0.5, 0.0)
+        fee_in = fill * fee_bps + commission_per_share
+        fee1 = np.where(stopped | tp1_hit, 0.5 * (np.nan_to_num(half1) * fee_bps + commission_per_share), 0.0)
+        fee2 = np.where(reason < 3, 0.5 * (np.nan_to_num(px2) * fee_bps + commission_per_share), 0.0)
+        bar1 = np.where(stopped, j_sl, j_t1)
+
+        # MAE/MFE по барам удержания
+        lows = _range(lo, np.minimum, s, exit_bar) if len(s) else np.empty(0)
+        highs = _range(hi, np.maximum, s, exit_bar) if len(s) else np.empty(0)
+        mae = np.maximum(0.0, np.where(longs, fill - lows, highs - fill))
+        mfe = np.maximum(0.0, np.where(longs, highs - fill, fill - lows))
+
+    # ---- последовательный выбор сделок и размер от капитала ----
+    cap = float(initial_capital)
+    chosen, sizes = [], []
+    k = 0
+    while k < len(t):
+        size = max(1, int(cap * risk_per_trade / risk[k]))
+        chosen.append(k); sizes.append(size)
+        if reason[k] == 3:
+            break  # позиция открыта до конца истории
+        cap += size * (gross1[k] + gross2[k] - fee_in[k] - fee1[k] - fee2[k])
+        k = int(np.searchsorted(t, exit_bar[k]))  # новый вход — не раньше бара выхода
+    idx = np.array(chosen, dtype=np.int64)
+    size = np.array(sizes, dtype=np.int64)
+
+    # ---- equity: реализованный капитал по барам first..end-1 ----
+    n_eq = max(0, end - first)
+    delta = np.zeros(n_eq + 1)
+    closed = reason[idx] < 3
+    events = ((entry_bar[idx], -size * fee_in[idx], np.ones(len(idx), dtype=bool)),
+              (bar1[idx], size * (gross1[idx] - fee1[idx]), closed | tp1_hit[idx]),
+              (exit_bar[idx], size * (gross2[idx] - fee2[idx]), closed))
+    for bar, amount, m in events:
+        np.add.at(delta, np.clip(bar[m] - first, 0, n_eq), amount[m])
+    eq = pd.DataFrame({"equity": initial_capital + np.cumsum(delta[:n_eq])},
+                      index=pd.DatetimeIndex(days[first:first + n_eq], name="date"))
+
+    commission = size * (fee_in[idx] + fee1[idx] + fee2[idx])
+    pnl = size * (gross1[idx] + gross2[idx]) - commission
+    tr = pd.DataFrame({
+        "side": pd.Categorical.from_codes((side[idx] == -1).astype(np.int8), ["LONG", "SHORT"]),
+        "entry_date": days[entry_bar[idx]],
+        "entry": fill[idx], "tp1": tp1[idx], "tp2": tp2[idx], "sl": sl[idx],
+        "size": size,
+        "tp1_hit": tp1_hit[idx],
+        "exit_tp1": px1[idx],
+        "exit_date": np.where(closed, days[exit_bar[idx]], np.datetime64("NaT")).astype("M8[ns]"),
+        "exit": px2[idx],
+        "reason": pd.Categorical.from_codes(reason[idx], REASONS),
+        "commission": commission,
+        "pnl": np.where(closed, pnl, np.nan),
+        "r": np.where(closed, pnl / (size * risk[idx]), np.nan),
+        "mae": mae[idx], "mfe": mfe[idx],
+        "mae_r": mae[idx] / risk[idx], "mfe_r": mfe[idx] / risk[idx],
+    })
+    return eq, tr
+
+def run_fill_backtest(df: pd.DataFrame, horizon: str, initial_capital=100000, risk_per_trade=0.01,
+                      params: dict | None = None, features: dict | None = None, ticker: str = "",
+                      **fill_kw):
+    """run_backtest() с движком simulate_fills(); fill_kw — его параметры исполнения."""
+    sig = decide_series(df, horizon, params, features, ticker)
+    with stage("simulate"):
+        return simulate_fills(df, sig, initial_capital, risk_per_trade, **fill_kw)
+
+def fill_metrics(eq: pd.DataFrame, tr: pd.DataFrame, initial_capital=100000) -> dict:
+    """
+    backtest_metrics() по закрытым сделкам + win_rate (pnl > 0), expectancy ($ и R на сделку),
+    profit_factor (прибыль / убыток), средние выигрыш/проигрыш, средние MAE/MFE в R, комиссии.
+    """
+    closed = tr[tr["reason"] != "OPEN"] if len(tr) else tr
+    m = backtest_metrics(eq, closed, initial_capital)
+    pnl = closed["pnl"].to_numpy(dtype=float) if len(closed) else np.empty(0)
+    wins, losses = pnl[pnl > 0], pnl[pnl < 0]
+    loss = -losses.sum()
+    m.update({
+        "win_rate": 100.0 * len(wins) / max(1, len(pnl)),
+        "expectancy": float(pnl.mean()) if len(pnl) else 0.0,
+        "expectancy_r": float(closed["r"].mean()) if len(pnl) else 0.0,
+        "profit_factor": float(wins.sum() / loss) if loss > 0 else (float("inf") if len(wins) else 0.0),
+        "avg_win": float(wins.mean()) if len(wins) else 0.0,
+        "avg_loss": float(losses.mean()) if len(losses) else 0.0,
+        "avg_mae_r": float(closed["mae_r"].mean()) if len(pnl) else 0.0,
+        "avg_mfe_r": float(closed["mfe_r"].mean()) if len(pnl) else 0.0,
+        "commission": float(closed["commission"].sum()) if len(pnl) else 0.0,
+        "open_trades": int(len(tr) - len(closed)),
+    })
+    return m
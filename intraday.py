@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""
+Внутридневной слой: минутные бары -> бары рабочего ТФ по сессиям -> решения стратегии.
+
+    store = PriceStore(root_1m, YahooSource("1m"), dtype="f4")
+    minutes = store.load("AAPL", "7d")
+    for ts, dec in iter_decisions(iter_chunks(minutes), rule="5min"):
+        ...
+
+Корзины рабочего ТФ привязаны к открытию сессии и не пересекают её границу,
+бары вне сессии отбрасываются. Всё считается потоково: из минутных чанков
+(срезы memmap из PriceStore или pd.read_csv(..., chunksize=...)) держится только
+неполная последняя корзина, а состояние индикаторов — IntradayState (O(1) на бар).
+Пивоты для ST — по прошлой сессии (pivots="session", фолбэк — прошлый календарный день)
+или по прошлому дню (pivots="day"); режим — по закрытиям сессий.
+Метки времени — tz-naive, местное время биржи (как после market_data._normalize).
+"""
+from __future__ import annotations
+import numpy as np
+import pandas as pd
+from core_strategy import periods
+from market_data import OHLC
+from streaming import IndicatorState, PeriodAgg
+
+_DAY_NS = 86_400_000_000_000
+
+class Session:
+    """Торговая сессия в местном времени биржи; close <= open — сессия через полночь."""
+
+    def __init__(self, open: str = "09:30", close: str = "16:00"):
+        self.open_ns = pd.Timedelta(open + ":00").value
+        close_ns = pd.Timedelta(close + ":00").value
+        self.length_ns = (close_ns - self.open_ns) % _DAY_NS or _DAY_NS
+
+    def keys(self, ns: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """(номер сессии, смещение от её открытия) для меток в нс; вне сессии смещение >= length_ns."""
+        rel = ns - self.open_ns
+        day = rel // _DAY_NS
+        return day, rel - day * _DAY_NS
+
+    def key(self, ts: pd.Timestamp) -> int:
+        return (ts.value - self.open_ns) // _DAY_NS
+
+SESSIONS = {
+    "US": Session("09:30", "16:00"),       # основная сессия NYSE/Nasdaq
+    "US_EXT": Session("04:00", "20:00"),   # с пре- и постмаркетом
+    "24H": Session("00:00", "00:00"),      # крипто/форекс: сессия = календарный день
+    "CME": Session("18:00", "17:00"),      # фьючерсы CME: с 18:00 предыдущего дня
+}
+
+# рабочие ТФ: имя -> правило корзины
+TIMEFRAMES = {"1m": "1min", "5m": "5min", "15m": "15min", "30m": "30min", "1h": "60min"}
+
+def _session(session) -> Session:
+    return SESSIONS[session] if isinstance(session, str) else session
+
+def session_bars(df: pd.DataFrame, rule: str = "5min", session: Session | str = "US",
+                 dtype=np.float32) -> pd.DataFrame:
+    """
+    OHLC рабочего ТФ из минутных баров: корзины от открытия сессии, метка — начало корзины.
+    Бары вне сессии отбрасываются; float32 по умолчанию.
+    """
+    s = _session(session)
+    step = pd.Timedelta(TIMEFRAMES.get(rule, rule)).value
+    ns = df.index.asi8
+    day, off = s.keys(ns)
+    keep = off < s.length_ns
+    if not keep.all():
+        df, day, off = df[keep], day[keep], off[keep]
+    if len(df) == 0:
+        return pd.DataFrame(columns=OHLC, index=pd.DatetimeIndex([]), dtype=dtype)
+    bucket = off // step
+    key = day * (s.length_ns // step + 1) + bucket
+    _, starts, ends = periods(key)
+    o, h, l, c = (df[k].to_numpy() for k in OHLC)
+    out = pd.DataFrame({
+        "Open": o[starts], "High": np.fmax.reduceat(h, starts),
+        "Low": np.fmin.reduceat(l, starts), "Close": c[ends],
+    }, index=pd.DatetimeIndex(day[starts] * _DAY_NS + s.open_ns + bucket[starts] * step))
+    return out.astype(dtype, copy=False)
+
+def iter_chunks(df: pd.DataFrame, size: int = 100_000):
+    """Срезы df по size строк (для memmap из PriceStore — без копирования)."""
+    for i in range(0, len(df), size):
+        yield df.iloc[i:i + size]
+
+def iter_session_bars(chunks, rule: str = "5min", session: Session | str = "US", dtype=np.float32):
+    """
+    Потоковый session_bars() по минутным чанкам в порядке времени: отдаёт готовые бары
+    рабочего ТФ; минутки последней (возможно неполной) корзины ждут следующий чанк.
+    """
+    s = _session(session)
+    carry = None
+    for chunk in chunks:
+        if len(chunk) == 0:
+            continue
+        chunk = chunk[OHLC]
+        if carry is not None:
+            chunk = pd.concat([carry, chunk])
+        bars = session_bars(chunk, rule, s, dtype)
+        if len(bars) == 0:
+            carry = None
+            continue
+        last = bars.index[-1].value
+        carry = chunk[chunk.index.asi8 >= last]
+        if len(bars) > 1:
+            yield bars.iloc[:-1]
+    if carry is not None and len(carry):
+        yield session_bars(carry, rule, s, dtype)
+
+class IntradayState(IndicatorState):
+    """
+    IndicatorState для внутридневных баров: пивоты прошлой сессии/дня вместо W/M/Y,
+    режим — по закрытиям сессий. Бары подаются уже собранными (session_bars).
+    """
+
+    def __init__(self, horizon: str = "ST", params: dict | None = None,
+                 session: Session | str = "US", pivots: str = "session", ticker: str = ""):
+        super().__init__(horizon, params, ticker)
+        s = _session(session)
+        if pivots not in ("session", "day"):
+            raise ValueError(f"pivots: session | day, не {pivots}")
+        self.pivot_chain = ["S", "D"] if pivots == "session" else ["D"]
+        self.regime_tf = "S"
+        self.periods = {"S": PeriodAgg("S", keyfunc=s.key), "D": PeriodAgg("D")}
+
+    def push(self, ts: pd.Timestamp, o: float, h: float, l: float, c: float) -> dict | None:
+        """Добавить готовый бар без снимка для замены (быстрее update()) и вернуть решение."""
+        if self.last_ts is not None and ts <= self.last_ts:
+            raise ValueError(f"бар {ts} не новее последнего {self.last_ts}")
+        self._push(ts, o, h, l, c)
+        return self.decision()
+
+def iter_decisions(chunks, horizon: str = "ST", rule: str = "5min", session: Session | str = "US",
+                   pivots: str = "session", params: dict | None = None, state: IntradayState | None = None,
+                   ticker: str = ""):
+    """
+    (метка бара, решение как у decide()) по каждому бару рабочего ТФ; память не растёт с историей.
+    ticker — для календаря событий (у готового state — его собственный).
+    """
+    st = state if state is not None else IntradayState(horizon, params, session, pivots, ticker)
+    for bars in iter_session_bars(chunks, rule, session):
+        cols = [bars[k].to_numpy(dtype=float).tolist() for k in OHLC]  # float, не np.float64: round() быстрее
+        for ts, o, h, l, c in zip(bars.index, *cols):
+            dec = st.push(ts, o, h, l, c)
+            if dec is not None:
+                yield ts, dec
+
+def intraday_signals(chunks, horizon: str = "ST", rule: str = "5min", session: Session | str = "US",
+                     pivots: str = "session", params: dict | None = None, ticker: str = "") -> pd.DataFrame:
+    """Компактная таблица base-сигналов: action (int8: 1 LONG, -1 SHORT, 0 WAIT), уровни float32."""
+    codes = {"LONG": 1, "SHORT": -1}
+    ts, act, lv = [], [], []
+    for t, dec in iter_decisions(chunks, horizon, rule, session, pivots, params, ticker=ticker):
+        b = dec["base"]
+        ts.append(t.value)
+        act.append(codes.get(b["action"], 0))
+        lv.append((dec["pivots"]["P"], b["entry"], b["tp1"], b["tp2"], b["sl"]))
+    lv = np.array(lv, dtype=np.float32).reshape(-1, 5)  # None -> nan
+    out = pd.DataFrame(lv, columns=["P", "entry", "tp1", "tp2", "sl"],
+                       index=pd.DatetimeIndex(np.array(ts, dtype="datetime64[ns]")))
+    out.insert(0, "action", np.array(act, dtype=np.int8))
+    return out
@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+"""
+Фоновые задачи: бэктест и перебор порогов в пуле процессов, прогресс и результаты — на диске.
+
+    sched = default_scheduler()
+    job = sched.submit("backtest", ticker="QQQ", period="3y", horizon="MID")
+    sched.status(job)     # {"status": "running", "progress": 0.4, "message": ..., ...}
+    sched.result(job)     # {"equity": DataFrame, "trades": DataFrame, "metrics": dict, ...}
+
+Виды задач: backtest, sweep (перебор порогов), robustness (walk-forward + Monte Carlo).
+
+<directory>/<id>/job.json  — спецификация, статус (queued/running/done/failed), прогресс, ошибка
+<directory>/<id>/result.pkl — результат (пишется один раз, атомарно)
+
+id — хэш спецификации вместе с датой (asof): одинаковая задача за тот же день не
+запускается повторно, а возвращает уже идущую или готовую; упавшая — перезапускается.
+Параллелизм ограничен max_workers процессов на планировщик, очередь — max_pending задач.
+Процессы стартуют через spawn (Streamlit многопоточный, fork небезопасен). Статус читается
+с диска, поэтому переживает перезапуск скрипта Streamlit; задача, чей процесс умер, считается
+упавшей.
+"""
+from __future__ import annotations
+import datetime as dt
+import hashlib
+import json
+import os
+import pickle
+import threading
+import time
+
+KINDS = ("backtest", "sweep", "robustness")
+ACTIVE = ("queued", "running")
+
+def job_id(kind: str, spec: dict) -> str:
+    raw = json.dumps([kind, spec], sort_keys=True, default=str)
+    return f"{kind}-{hashlib.blake2b(raw.encode(), digest_size=10).hexdigest()}"
+
+def _alive(pid: int | None) -> bool:
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:  # процесс есть, но чужой
+        return True
+    return True
+
+# ---------- storage ----------
+def _path(directory: str, jid: str, name: str = "job.json") -> str:
+    return os.path.join(directory, jid, name)
+
+def _atomic(path: str, data: bytes):
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+def read_job(directory: str, jid: str) -> dict | None:
+    try:
+        with open(_path(directory, jid), encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+def write_job(directory: str, jid: str, meta: dict):
+    os.makedirs(os.path.join(directory, jid), exist_ok=True)
+    _atomic(_path(directory, jid), json.dumps(meta, ensure_ascii=False, default=str).encode("utf-8"))
+
+def _update(directory: str, jid: str, **kw):
+    meta = read_job(directory, jid) or {}
+    meta.update(kw, updated=time.time())
+    write_job(directory, jid, meta)
+
+# ---------- worker ----------
+class _Progress:
+    """progress(доля, сообщение) в job.json — не чаще раза в interval секунд (кроме 1.0)."""
+
+    def __init__(self, directory: str, jid: str, interval: float = 0.5):
+        self.directory, self.jid, self.interval = directory, jid, interval
+        self.last = 0.0
+
+    def __call__(self, frac: float, message: str = ""):
+        now = time.time()
+        if frac < 1.0 and now - self.last < self.interval:
+            return
+        self.last = now
+        _update(self.directory, self.jid, progress=round(float(frac), 4), message=message)
+
+def _run_backtest(df, spec: dict, progress) -> dict:
+    from profiling import profile
+    fills = spec.get("fills")
+    with profile(track_memory=spec.get("profile", False)) as prof:
+        if fills is not None:
+            from fills import fill_metrics, run_fill_backtest
+            eq, tr = run_fill_backtest(df, spec["horizon"], spec["capital"], spec["risk"], spec.get("params"),
+                                       ticker=spec["ticker"], **fills)
+            metrics = fill_metrics(eq, tr, spec["capital"])
+        else:
+            from backtest import backtest_metrics, run_backtest
+            eq, tr = run_backtest(df, spec["horizon"], spec["capital"], spec["risk"], spec.get("params"),
+                                  ticker=spec["ticker"])
+            metrics = backtest_metrics(eq, tr, spec["capital"])
+    progress(0.95, "расчёт завершён")
+    return {"equity": eq, "trades": tr, "metrics": metrics,
+            "profile": prof.to_frame() if spec.get("profile") else None}
+
+def _run_sweep(df, spec: dict, progress) -> dict:
+    from sweep import run_sweep
+    configs = spec["configs"]
+    res = run_sweep(df, spec["horizon"], configs, spec["capital"], spec["risk"], max_workers=1,
+                    rank_by=spec.get("rank_by", "return_pct"), ticker=spec["ticker"],
+                    progress=lambda done, total: progress(0.1 + 0.85 * done / max(1, total),
+                                                          f"конфигураций: {done}/{total}"))
+    return {"table": res}
+
+def _run_robustness(df, spec: dict, progress) -> dict:
+    # в процессе пула — без вложенных пулов: окна и чанки Monte Carlo идут подряд
+    import pandas as pd
+    from backtest import run_backtest
+    from robustness import distribution, iter_walk_forward, monte_carlo, trade_returns
+    rows = []
+    for done, total, row in iter_walk_forward(df, spec["horizon"], spec.get("train_bars", 252),
+                                              spec.get("test_bars", 63), configs=spec.get("configs"),
+                                              initial_capital=spec["capital"], risk_per_trade=spec["risk"],
+                                              max_workers=1, ticker=spec["ticker"]):
+        rows.append(row)
+        progress(0.1 + 0.6 * done / total, f"walk-forward: окно {done}/{total}")
+    wf = pd.DataFrame(rows).sort_values("window").reset_index(drop=True) if rows else pd.DataFrame()
+    eq, tr = run_backtest(df, spec["horizon"], spec["capital"], spec["risk"], ticker=spec["ticker"])
+    progress(0.75, "Monte Carlo")
+    mc = monte_carlo(trade_returns(eq, tr), spec.get("n_paths", 5000), spec.get("seed", 0), max_workers=1)
+    return {"walk_forward": wf, "distribution": distribution(mc) if len(mc) else None}
+
+_RUNNERS = {"backtest": _run_backtest, "sweep": _run_sweep, "robustness": _run_robustness}
+
+def _run_job(directory: str, jid: str):
+    """Точка входа процесса пула: читает спецификацию, считает, пишет результат и статус."""
+    meta = read_job(directory, jid)
+    if meta is None:
+        return
+    _update(directory, jid, status="running", pid=os.getpid(), started=time.time(), progress=0.0,
+            message="загрузка данных")
+    progress = _Progress(directory, jid)
+    try:
+        spec = meta["spec"]
+        from price_store import load_history
+        df = load_history(spec["ticker"], spec["period"])
+        progress(0.1, f"баров: {len(df)}")
+        result = _RUNNERS[meta["kind"]](df, spec, progress)
+        _atomic(_path(directory, jid, "result.pkl"), pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL))
+        _update(directory, jid, status="done", progress=1.0, message="готово", finished=time.time())
+    except Exception as e:
+        _update(directory, jid, status="failed", error=f"{type(e).__name__}: {e}", finished=time.time())
+
+# ---------- scheduler ----------
+class JobScheduler:
+    def __init__(self, directory: str, max_workers: int = 2, max_pending: int = 32, keep: int = 200):
+        self.directory = directory
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.keep = keep
+        self._pool = None
+        self._futures: dict = {}
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _executor(self):
+        if self._pool is None:  # пул поднимается по первой задаче: импорт модуля остаётся лёгким
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            self._pool = ProcessPoolExecutor(self.max_workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    def _done(self, jid: str, fut):
+        with self._lock:
+            self._futures.pop(jid, None)
+        if fut.cancelled():
+            _update(self.directory, jid, status="failed", error="задача отменена", finished=time.time())
+            return
+        exc = fut.exception()
+        if exc is not None:  # процесс пула умер (BrokenProcessPool и т.п.) — сам статус не записал
+            _update(self.directory, jid, status="failed", error=f"{type(exc).__name__}: {exc}",
+                    finished=time.time())
+            with self._lock:
+                self._pool = None
+
+    def _orphaned(self, jid: str, meta: dict) -> bool:
+        # queued/running, но ни этот планировщик, ни живой процесс задачу не ведут
+        if jid in self._futures:
+            return False
+        if meta["status"] == "running":
+            return not _alive(meta.get("pid"))
+        return meta.get("owner") == os.getpid() or not _alive(meta.get("owner"))
+
+    def submit(self, kind: str, *, ticker: str, period: str = "3y", horizon: str = "MID",
+               capital: float = 100000, risk: float = 0.01, asof: str | None = None, **spec) -> str:
+        """
+        Поставить задачу; возвращает id. kind="backtest": params, fills (dict для
+        fills.simulate_fills или None — simulate()), profile. kind="sweep": configs
+        (sweep.grid / sweep.random_sample), rank_by. kind="robustness": train_bars, test_bars,
+        configs (выбор на train), n_paths, seed.
+        """
+        if kind not in KINDS:
+            raise ValueError(f"kind: {' | '.join(KINDS)}, не {kind}")
+        spec = {"ticker": ticker.upper().strip(), "period": period, "horizon": horizon,
+                "capital": capital, "risk": risk, **spec}
+        jid = job_id(kind, {**spec, "asof": asof or dt.date.today().isoformat()})
+        with self._lock:
+            meta = read_job(self.directory, jid)
+            if meta is not None:
+                if meta["status"] == "done" and os.path.exists(_path(self.directory, jid, "result.pkl")):
+                    return jid
+                if meta["status"] in ACTIVE and not self._orphaned(jid, meta):
+                    return jid
+            if len(self._futures) >= self.max_pending:
+                raise RuntimeError(f"очередь заполнена: {len(self._futures)} задач")
+            write_job(self.directory, jid, {"id": jid, "kind": kind, "spec": spec, "status": "queued",
+                                            "progress": 0.0, "message": "в очереди", "owner": os.getpid(),
+                                            "submitted": time.time(), "updated": time.time()})
+            fut = self._executor().submit(_run_job, self.directory, jid)
+            self._futures[jid] = fut
+        fut.add_done_callback(lambda f: self._done(jid, f))
+        self._prune()
+        return jid
+
+    def status(self, jid: str) -> dict | None:
+        meta = read_job(self.directory, jid)
+        if meta is not None and meta["status"] in ACTIVE and self._orphaned(jid, meta):
+            meta.update(status="failed", error="процесс задачи завершился без результата")
+        return meta
+
+    def result(self, jid: str) -> dict | None:
+        try:
+            with open(_path(self.directory, jid, "result.pkl"), "rb") as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+
+    def jobs(self, limit: int = 20) -> list[dict]:
+        """Последние задачи, новые первыми."""
+        out = [m for e in os.scandir(self.directory) if e.is_dir() and (m := self.status(e.name))]
+        return sorted(out, key=lambda m: m.get("submitted", 0), reverse=True)[:limit]
+
+    def _prune(self):
+        dirs = [e for e in os.scandir(self.directory) if e.is_dir()]
+        if len(dirs) <= self.keep:
+            return
+        dirs.sort(key=lambda e: e.stat().st_mtime)
+        for e in dirs[:len(dirs) - self.keep]:
+            if e.name in self._futures:
+                continue
+            for name in os.listdir(e.path):
+                try:
+                    os.remove(os.path.join(e.path, name))
+                except FileNotFoundError:
+                    pass
+            try:
+                os.rmdir(e.path)
+            except OSError:
+                pass
+
+    def shutdown(self, wait: bool = False):
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait, cancel_futures=not wait)
+            self._pool = None
+
+_default: JobScheduler | None = None
+
+def default_scheduler() -> JobScheduler:
+    """
+    Общий для процесса планировщик: каталог CAPINTEL_JOBS_DIR, процессов — CAPINTEL_JOB_WORKERS
+    (по умолчанию половина ядер).
+    """
+    global _default
+    if _default is None:
+        directory = os.environ.get("CAPINTEL_JOBS_DIR",
+                                   os.path.join(os.path.expanduser("~"), ".cache", "capintel", "jobs"))
+        workers = int(os.environ.get("CAPINTEL_JOB_WORKERS", 0)) or max(1, (os.cpu_count() or 2) // 2)
+        _default = JobScheduler(directory, max_workers=workers)
+    return _default
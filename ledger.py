@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+Журнал сделок и кривая капитала бэктеста на массивах NumPy — вместо dict на сделку/бар.
+
+TradeLedger — структурированный массив с фиксированными колонками (TRADE_DTYPE),
+добавление O(1) амортизированно (ёмкость удваивается), открытая позиция — последняя строка.
+EquityCurve — заранее выделенный float64 на все бары прогона.
+to_frame() отдают DataFrame поверх тех же массивов без копирования числовых колонок.
+"""
+from __future__ import annotations
+import numpy as np
+import pandas as pd
+
+LONG, SHORT = 1, -1
+SIDES = {"LONG": LONG, "SHORT": SHORT}
+
+TRADE_DTYPE = np.dtype([
+    ("side", "i1"),
+    ("entry", "f8"), ("tp1", "f8"), ("tp2", "f8"), ("sl", "f8"),
+    ("size", "i8"),
+    ("entry_date", "M8[ns]"), ("exit_date", "M8[ns]"),
+    ("tp1_hit", "?"),
+    ("exit", "f8"), ("pnl", "f8"),
+])
+
+class TradeLedger:
+    __slots__ = ("rows", "n", "open_row")
+
+    def __init__(self, capacity: int = 64):
+        self.rows = np.zeros(max(1, capacity), dtype=TRADE_DTYPE)
+        self.n = 0
+        self.open_row = -1   # индекс открытой сделки, -1 — позиции нет
+
+    def __len__(self) -> int:
+        """Число закрытых сделок."""
+        return self.n - (self.open_row >= 0)
+
+    def open(self, side: int, entry: float, tp1: float, tp2: float, sl: float, size: int, date) -> int:
+        if self.open_row >= 0:
+            raise RuntimeError("позиция уже открыта")
+        if self.n == len(self.rows):
+            grown = np.zeros(2 * len(self.rows), dtype=TRADE_DTYPE)
+            grown[:self.n] = self.rows
+            self.rows = grown
+        i = self.n
+        self.rows[i] = (side, entry, tp1, tp2, sl, size, date, np.datetime64("NaT"), False, np.nan, np.nan)
+        self.n += 1
+        self.open_row = i
+        return i
+
+    def close(self, exit_price: float, pnl: float, date):
+        row = self.rows[self.open_row]
+        row["exit"], row["pnl"], row["exit_date"] = exit_price, pnl, date
+        self.open_row = -1
+
+    def to_frame(self) -> pd.DataFrame:
+        """Закрытые сделки; side — Categorical LONG/SHORT, остальные колонки — вид на массив."""
+        a = self.rows[:len(self)]
+        cols = {k: a[k] for k in TRADE_DTYPE.names}
+        cols["side"] = pd.Categorical.from_codes((a["side"] < 0).astype("i1"), ["LONG", "SHORT"])
+        return pd.DataFrame(cols, copy=False)
+
+class EquityCurve:
+    __slots__ = ("dates", "values", "n")
+
+    def __init__(self, dates: np.ndarray):
+        """dates — datetime64[ns] баров прогона; значения пишутся по одному на бар."""
+        self.dates = dates
+        self.values = np.empty(len(dates), dtype=float)
+        self.n = 0
+
+    def append(self, value: float):
+        self.values[self.n] = value
+        self.n += 1
+
+    def to_frame(self) -> pd.DataFrame:
+        idx = pd.DatetimeIndex(self.dates[:self.n], name="date")
+        return pd.DataFrame({"equity": self.values[:self.n]}, index=idx, copy=False)
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+import os
+import time
+import pandas as pd
+
+OHLC = ["Open", "High", "Low", "Close"]
+
+def _normalize(df: pd.DataFrame) -> pd.DataFrame:
+    # колонки Open/High/Low/Close, tz-naive DatetimeIndex по возрастанию, без NaN
+    # (внутридневные метки — местное время биржи)
+    if isinstance(df.columns, pd.MultiIndex):  # новые yfinance: (Price, Ticker)
+        df = df.droplevel(-1, axis=1)
+    df = df.rename(columns=str.title)[OHLC].dropna()
+    idx = pd.DatetimeIndex(df.index)
+    if idx.tz is not None:
+        idx = idx.tz_localize(None)
+    df.index = idx
+    return df[~df.index.duplicated(keep="last")].sort_index().astype(float)
+
+# ---------- Sources ----------
+# Источник для PriceStore: fetch(ticker, start) -> OHLC с датами >= start (start=None — вся история).
+
+class YahooSource:
+    """interval — "1d" или внутридневной ("1m", "5m", ...: Yahoo отдаёт только последние 7/60 дней)."""
+
+    def __init__(self, interval: str = "1d"):
+        self.interval = interval
+
+    def fetch(self, ticker: str, start: pd.Timestamp | None) -> pd.DataFrame:
+        import yfinance as yf
+        if start is not None:
+            kw = {"start": start.strftime("%Y-%m-%d")}
+        else:
+            kw = {"period": "max" if self.interval == "1d" else ("7d" if self.interval == "1m" else "60d")}
+        df = yf.download(ticker, interval=self.interval, auto_adjust=False, progress=False, **kw)
+        return _normalize(df) if len(df) else pd.DataFrame(columns=OHLC, dtype=float)
+
+class CSVSource:
+    """Локальные фикстуры: <directory>/<TICKER>.csv с колонками Date, Open, High, Low, Close."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def fetch(self, ticker: str, start: pd.Timestamp | None) -> pd.DataFrame:
+        path = os.path.join(self.directory, f"{ticker}.csv")
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"нет данных для {ticker}: {path}")
+        df = _normalize(pd.read_csv(path, index_col=0, parse_dates=True))
+        return df if start is None else df[df.index >= start]
+
+class FrameSource:
+    """Фикстуры в памяти: {тикер: DataFrame}; delay — имитация сетевой задержки, с."""
+
+    def __init__(self, frames: dict[str, pd.DataFrame], delay: float = 0.0):
+        self.frames = {t.upper(): _normalize(df) for t, df in frames.items()}
+        self.delay = delay
+
+    def fetch(self, ticker: str, start: pd.Timestamp | None) -> pd.DataFrame:
+        if self.delay:
+            time.sleep(self.delay)
+        if ticker.upper() not in self.frames:
+            raise FileNotFoundError(f"нет данных для {ticker}")
+        df = self.frames[ticker.upper()]
+        return df if start is None else df[df.index >= start]
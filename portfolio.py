@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""
+Портфельный бэктест: много тикеров, общий капитал, общий календарь.
+
+    data = {t: load_history(t, "5y") for t in tickers}
+    eq, tr = run_portfolio(data, "MID", max_positions=10, max_exposure=1.0)
+    backtest_metrics(eq, tr)
+
+Сигналы decide_series() считаются по каждому тикеру один раз и раскладываются в матрицы
+(бар календаря × тикер); цикл идёт по барам календаря, а не по тикерам. Правила ведения
+позиции те же, что в simulate(): вход по сигналу бара t, SL/TP1/TP2 — с бара t+1,
+торговля с 60-го бара истории тикера и без его последнего бара.
+
+Размер — от общего (реализованного) капитала: cap * risk_per_trade / |entry - sl|.
+Ограничения: не больше max_positions открытых позиций, валовая экспозиция
+(entry * size открытых, после TP1 — половина) не больше max_exposure * cap,
+одна позиция — не больше max_weight * cap. Если кандидатов больше, чем мест,
+берутся лучшие по отношению |tp1 - entry| / |entry - sl|.
+С одним тикером и без ограничений результат совпадает с run_backtest().
+"""
+from __future__ import annotations
+import numpy as np
+import pandas as pd
+from core_strategy import decide_series
+from backtest import _manage_position
+from ledger import TradeLedger
+
+def align_signals(data: dict[str, pd.DataFrame], horizon: str, params: dict | None = None) -> dict:
+    """
+    Сигналы base_* всех тикеров на общем календаре (объединение дат баров).
+    Матрицы формы (бары, тикеры); где у тикера нет бара — High/Low NaN, сигнал WAIT.
+    """
+    tickers = list(data)
+    days = {t: data[t].index.normalize().values for t in tickers}
+    cal = np.unique(np.concatenate([days[t] for t in tickers])) if tickers else np.array([], "M8[ns]")
+    T, K = len(cal), len(tickers)
+    high = np.full((T, K), np.nan); low = np.full((T, K), np.nan)
+    act = np.zeros((T, K), dtype=np.int8)
+    lv = {k: np.full((T, K), np.nan) for k in ("entry", "tp1", "tp2", "sl")}
+    first = np.full(K, T, dtype=np.int64)
+
+    for j, t in enumerate(tickers):
+        df = data[t]
+        if len(df) < 61:
+            continue
+        rows = np.searchsorted(cal, days[t])
+        sig = decide_series(df, horizon, params, ticker=t)
+        # последний бар тикера позицию не ведёт (как в simulate())
+        high[rows[:-1], j] = df["High"].to_numpy(dtype=float)[:-1]
+        low[rows[:-1], j] = df["Low"].to_numpy(dtype=float)[:-1]
+        # торговые бары как в simulate(): с 60-го по предпоследний
+        code = np.where(sig["base_action"] == "LONG", 1, np.where(sig["base_action"] == "SHORT", -1, 0))
+        code[:59] = 0
+        code[-1] = 0
+        act[rows, j] = code
+        for k, m in lv.items():
+            m[rows, j] = sig[f"base_{k}"].to_numpy(dtype=float)
+        first[j] = rows[59]
+    # последний торговый бар тикера = его предпоследний бар
+    last = np.array([np.searchsorted(cal, days[t][-2]) if len(data[t]) >= 61 else -1 for t in tickers],
+                    dtype=np.int64)
+    return {"tickers": tickers, "calendar": cal, "high": high, "low": low, "act": act,
+            "first": first, "last": last, **lv}
+
+def run_portfolio(data: dict[str, pd.DataFrame], horizon: str, initial_capital=100000, risk_per_trade=0.01,
+                  max_positions: int | None = 10, max_exposure: float | None = 1.0,
+                  max_weight: float | None = None, params: dict | None = None,
+                  signals: dict | None = None):
+    """
+    (eq, tr): eq — equity (реализованный капитал), positions, exposure (доля капитала) по бару
+    календаря; tr — сделки всех тикеров (колонка ticker), по дате входа.
+    signals — готовый align_signals(data, horizon, params).
+    """
+    s = signals if signals is not None else align_signals(data, horizon, params)
+    tickers, cal = s["tickers"], s["calendar"]
+    high, low, act = s["high"], s["low"], s["act"]
+    entries, tp1s, tp2s, sls = s["entry"], s["tp1"], s["tp2"], s["sl"]
+    valid = s["last"] >= 0
+    if not valid.any():
+        empty = pd.DataFrame({"equity": [], "positions": [], "exposure": []},
+                             index=pd.DatetimeIndex([], name="date"))
+        return empty, _trades_frame(tickers, [])
+    t0, t1 = int(s["first"][valid].min()), int(s["last"][valid].max()) + 1
+
+    cap = float(initial_capital)
+    ledgers = [TradeLedger(8) for _ in tickers]
+    held: list[int] = []
+    n = t1 - t0
+    equity = np.empty(n); positions = np.empty(n, dtype=np.int32); exposure = np.empty(n)
+    slots = max_positions if max_positions is not None else len(tickers)
+
+    def notional(j):
+        r = ledgers[j].rows[ledgers[j].open_row]
+        return float(r["entry"]) * int(r["size"]) * (0.5 if r["tp1_hit"] else 1.0)
+
+    for t in range(t0, t1):
+        day = cal[t]
+
+        # управление открытыми позициями (только у тикеров с баром в этот день)
+        if held:
+            hi, lo = high[t], low[t]
+            for j in held[:]:
+                if hi[j] == hi[j]:
+                    cap = _manage_position(ledgers[j], hi[j], lo[j], day, cap)
+                    if ledgers[j].open_row < 0:
+                        held.remove(j)
+
+        # новые входы: кандидаты по сигналу, лучшие по R:R на свободные места
+        cand = np.flatnonzero(act[t])
+        if len(cand) and len(held) < slots:
+            if held:
+                cand = cand[~np.isin(cand, held)]
+            entry, tp1, sl = entries[t, cand], tp1s[t, cand], sls[t, cand]
+            risk = np.abs(entry - sl)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                rr = np.where(risk > 0, np.abs(tp1 - entry) / risk, -np.inf)
+            order = np.argsort(-rr, kind="stable")
+            gross = sum(notional(j) for j in held) if max_exposure is not None else 0.0
+            for i in order:
+                if len(held) >= slots:
+                    break
+                if not risk[i] > 0:
+                    continue
+                j = int(cand[i])
+                e = float(entry[i])
+                size = max(1, int(cap * risk_per_trade / float(risk[i])))
+                room = np.inf
+                if max_weight is not None:
+                    room = max_weight * cap
+                if max_exposure is not None:
+                    room = min(room, max_exposure * cap - gross)
+                if e * size > room:
+                    size = int(room / e) if room > 0 else 0
+                    if size < 1:
+                        continue
+                ledgers[j].open(int(act[t, j]), e, float(tp1s[t, j]), float(tp2s[t, j]), float(sls[t, j]),
+                                size, day)
+                held.append(j)
+                gross += e * size
+
+        k = t - t0
+        equity[k] = cap
+        positions[k] = len(held)
+        exposure[k] = sum(notional(j) for j in held) / cap if held else 0.0
+
+    eq = pd.DataFrame({"equity": equity, "positions": positions, "exposure": exposure},
+                      index=pd.DatetimeIndex(cal[t0:t1], name="date"), copy=False)
+    return eq, _trades_frame(tickers, ledgers)
+
+def _trades_frame(tickers: list[str], ledgers: list[TradeLedger]) -> pd.DataFrame:
+    frames = [led.to_frame() for led in ledgers]
+    names = [tk for tk, f in zip(tickers, frames) if len(f)]
+    frames = [f for f in frames if len(f)] or [TradeLedger().to_frame()]
+    tr = pd.concat(frames, ignore_index=True)
+    tr.insert(0, "ticker", np.repeat(names, [len(f) for f in frames]) if names else [])
+    tr["side"] = pd.Categorical(tr["side"], ["LONG", "SHORT"])
+    return tr.sort_values(["entry_date", "ticker"], kind="stable").reset_index(drop=True)
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""
+Локальное колоночное хранилище дневной истории — вместо yf.download на каждый запрос.
+
+    <root>/<TICKER>/ts.i8     int64, нс с эпохи (tz-naive), по возрастанию
+    <root>/<TICKER>/ohlc.f8   float64, строки [Open, High, Low, Close] (ohlc.f4 — float32)
+    <root>/<TICKER>/meta.json {"start": первая запрошенная дата, "fetched_at": unix-время}
+
+Файлы только дописываются в конец (докачка хвоста), чтение — через np.memmap,
+DataFrame строится поверх памяти файла без копирования.
+Источник подключаемый: YahooSource по умолчанию, CSVSource для тестов/офлайна.
+Для минутных баров — отдельный root, YahooSource("1m") и dtype="f4": вдвое меньше места,
+точности float32 (~7 значащих цифр) хватает для цен до ~10^5 с центами.
+"""
+from __future__ import annotations
+import json
+import os
+import time
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+from market_data import OHLC, YahooSource
+
+try:
+    import fcntl
+except ImportError:  # Windows: без межпроцессной блокировки
+    fcntl = None
+
+_PERIODS = {"mo": "months", "y": "years", "d": "days"}
+
+def period_start(period: str, now: pd.Timestamp | None = None) -> pd.Timestamp | None:
+    """'1y', '3y', '6mo', '60d', 'max' -> дата начала (None для 'max')."""
+    if period == "max":
+        return None
+    now = (now or pd.Timestamp.now()).normalize()
+    for suffix, unit in _PERIODS.items():
+        if period.endswith(suffix):
+            return now - pd.DateOffset(**{unit: int(period[:-len(suffix)])})
+    raise ValueError(f"неизвестный период: {period}")
+
+class PriceStore:
+    def __init__(self, root: str, source=None, max_age: float = 900.0, dtype: str = "f8"):
+        """max_age — сколько секунд после последней докачки не ходить в источник; dtype — f8 | f4."""
+        if dtype not in ("f8", "f4"):
+            raise ValueError(f"dtype должен быть f8 или f4: {dtype}")
+        self.root = root
+        self.source = source if source is not None else YahooSource()
+        self.max_age = max_age
+        self.dtype = dtype
+        self._px = f"ohlc.{dtype}"
+        self._width = 4 * np.dtype(dtype).itemsize
+
+    # ---------- layout ----------
+    def _dir(self, ticker: str) -> str:
+        return os.path.join(self.root, ticker.upper())
+
+    def _meta(self, ticker: str) -> dict:
+        try:
+            with open(os.path.join(self._dir(ticker), "meta.json"), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _write_meta(self, ticker: str, meta: dict):
+        path = os.path.join(self._dir(ticker), "meta.json")
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(path + ".tmp", path)
+
+    @contextmanager
+    def _lock(self, ticker: str, shared: bool = False):
+        os.makedirs(self._dir(ticker), exist_ok=True)
+        with open(os.path.join(self._dir(ticker), ".lock"), "a") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _rows(self, ticker: str) -> int:
+        d = self._dir(ticker)
+        try:
+            n_ts = os.path.getsize(os.path.join(d, "ts.i8")) // 8
+            n_px = os.path.getsize(os.path.join(d, self._px)) // self._width
+        except FileNotFoundError:
+            return 0
+        return min(n_ts, n_px)  # оборванная запись — хвост без пары не читаем
+
+    # ---------- read ----------
+    def read_arrays(self, ticker: str, start: pd.Timestamp | None = None) -> tuple[np.ndarray, np.ndarray]:
+        """(ts int64 нс, ohlc (n, 4)) — read-only memmap файлов, вход для core_strategy.decide_arrays()."""
+        d = self._dir(ticker)
+        n = 0
+        if os.path.isdir(d):
+            with self._lock(ticker, shared=True):
+                n = self._rows(ticker)
+                if n:
+                    ts = np.memmap(os.path.join(d, "ts.i8"), dtype="<i8", mode="r", shape=(n,))
+                    px = np.memmap(os.path.join(d, self._px), dtype="<" + self.dtype, mode="r", shape=(n, 4))
+        if n == 0:
+            return np.empty(0, dtype="<i8"), np.empty((0, 4), dtype="<" + self.dtype)
+        i0 = 0 if start is None else int(np.searchsorted(ts, start.value))
+        return ts[i0:], px[i0:]
+
+    def read(self, ticker: str, start: pd.Timestamp | None = None) -> pd.DataFrame:
+        """История из файлов без копирования (read-only memmap)."""
+        ts, px = self.read_arrays(ticker, start)
+        idx = pd.DatetimeIndex(ts.view("datetime64[ns]"))
+        return pd.DataFrame(px, index=idx, columns=OHLC, copy=False)
+
+    # ---------- write ----------
+    def _write(self, ticker: str, new: pd.DataFrame, keep: int):
+        """
+        Оставить первые keep строк и записать new за ними. Файлы не укорачиваются
+        (замена последнего бара — перезапись на месте), поэтому чужие memmap остаются валидны;
+        полная перезапись (keep=0) идёт через временный файл и os.replace.
+        """
+        d = self._dir(ticker)
+        payload = ((self._px, self._width, np.ascontiguousarray(new[OHLC].to_numpy(dtype="<" + self.dtype)).tobytes()),
+                   ("ts.i8", 8, new.index.asi8.astype("<i8").tobytes()))
+        for name, width, data in payload:  # ohlc раньше ts: читатель видит только полные строки
+            path = os.path.join(d, name)
+            if keep == 0:
+                with open(path + ".tmp", "wb") as f:
+                    f.write(data)
+                os.replace(path + ".tmp", path)
+            else:
+                with open(path, "r+b") as f:
+                    f.seek(keep * width)
+                    f.write(data)
+
+    def top_up(self, ticker: str, start: pd.Timestamp | None = None, force: bool = False) -> int:
+        """Докачать из источника только недостающий хвост. Возвращает число записанных баров."""
+        ticker = ticker.upper()
+        with self._lock(ticker):
+            meta = self._meta(ticker)
+            n = self._rows(ticker)
+            have_from = pd.Timestamp(meta["start"]) if meta.get("start") else None
+            need_backfill = n == 0 or (meta.get("start") is not None and
+                                       (start is None or start < have_from))
+            if not force and not need_backfill and time.time() - meta.get("fetched_at", 0) < self.max_age:
+                return 0
+
+            if need_backfill:
+                new, keep = self.source.fetch(ticker, start), 0
+                meta["start"] = None if start is None else start.isoformat()
+            else:
+                ts = np.memmap(os.path.join(self._dir(ticker), "ts.i8"), dtype="<i8", mode="r", shape=(n,))
+                last = pd.Timestamp(int(ts[-1]))
+                del ts
+                new = self.source.fetch(ticker, last)
+                new = new[new.index >= last]
+                # последний сохранённый бар мог быть неполным (сегодняшним) — перезапишем его
+                keep = n - 1 if len(new) and new.index[0] == last else n
+            if len(new) or keep == 0:
+                self._write(ticker, new, keep)
+            meta["fetched_at"] = time.time()
+            self._write_meta(ticker, meta)
+            return len(new)
+
+    def load(self, ticker: str, period: str = "3y") -> pd.DataFrame:
+        """Докачка (если пора) + чтение последних period в форме decide()/run_backtest()."""
+        start = period_start(period)
+        self.top_up(ticker, start)
+        return self.read(ticker.upper(), start)
+
+_default: PriceStore | None = None
+
+def default_store() -> PriceStore:
+    global _default
+    if _default is None:
+        root = os.environ.get("CAPINTEL_DATA_DIR", os.path.join(os.path.expanduser("~"), ".cache", "capintel", "prices"))
+        _default = PriceStore(root)
+    return _default
+
+def load_history(ticker: str, period: str) -> pd.DataFrame:
+    """Дневные OHLC тикера за period в форме decide()/run_backtest() — из общего хранилища."""
+    return default_store().load(ticker, period)
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+Опциональное профилирование стадий decide()/decide_series()/бэктеста.
+
+    from profiling import profile
+    with profile(track_memory=True) as prof:
+        run_backtest_replay(df, "MID")
+    prof.to_frame()   # stage, calls, total_s, mean_s, share, alloc_bytes, peak_bytes
+
+Стадии размечены в коде через `with stage("atr"): ...`. Вне profile() stage() возвращает
+общий пустой контекст-менеджер: глобальная проверка + вызов, без замеров и аллокаций.
+Память (tracemalloc) — только при track_memory=True: трассировка заметно замедляет код.
+alloc_bytes — прирост занятой памяти за стадию (сумма по вызовам), peak_bytes — максимальный
+пик внутри одного вызова; пик вложенных стадий учитывается во внешней неточно.
+"""
+from __future__ import annotations
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+class _NullStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL = _NullStage()
+_active: "Profiler | None" = None
+
+class _Stage:
+    __slots__ = ("prof", "name", "t0", "m0")
+
+    def __init__(self, prof: "Profiler", name: str):
+        self.prof, self.name = prof, name
+
+    def __enter__(self):
+        if self.prof.track_memory:
+            import tracemalloc
+            self.m0 = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        dt = time.perf_counter() - self.t0
+        rec = self.prof.stats.setdefault(self.name, [0, 0.0, 0, 0])
+        rec[0] += 1
+        rec[1] += dt
+        if self.prof.track_memory:
+            import tracemalloc
+            cur, peak = tracemalloc.get_traced_memory()
+            rec[2] += cur - self.m0
+            rec[3] = max(rec[3], peak - self.m0)
+        return False
+
+class Profiler:
+    def __init__(self, track_memory: bool = False):
+        self.track_memory = track_memory
+        self.stats: dict[str, list] = {}   # name -> [calls, seconds, alloc_bytes, peak_bytes]
+        self.wall = 0.0
+
+    def to_frame(self) -> pd.DataFrame:
+        import pandas as pd
+        rows = [{"stage": k, "calls": v[0], "total_s": v[1], "mean_s": v[1] / max(1, v[0]),
+                 "alloc_bytes": v[2], "peak_bytes": v[3]} for k, v in self.stats.items()]
+        out = pd.DataFrame(rows, columns=["stage", "calls", "total_s", "mean_s", "alloc_bytes", "peak_bytes"])
+        out.insert(4, "share", out["total_s"] / self.wall if self.wall else float("nan"))
+        if not self.track_memory:
+            out = out.drop(columns=["alloc_bytes", "peak_bytes"])
+        return out.sort_values("total_s", ascending=False).reset_index(drop=True)
+
+def stage(name: str):
+    """Контекст стадии: замер, если внутри profile(), иначе пустышка."""
+    prof = _active
+    if prof is None:
+        return _NULL
+    return _Stage(prof, name)
+
+@contextmanager
+def profile(track_memory: bool = False):
+    """Собирать замеры stage() в этом блоке (включая все вложенные вызовы decide)."""
+    global _active
+    prev, prof = _active, Profiler(track_memory)
+    if track_memory:
+        import tracemalloc  # ~15 мс на импорт — только когда нужна память
+    started_tracing = track_memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    _active = prof
+    t0 = time.perf_counter()
+    try:
+        yield prof
+    finally:
+        prof.wall = time.perf_counter() - t0
+        _active = prev
+        if started_tracing:
+            tracemalloc.stop()
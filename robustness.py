@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+Проверка устойчивости поверх run_backtest: walk-forward и Monte Carlo по сделкам.
+
+Walk-forward: история режется на окна [train | test], сдвигаемые на step баров.
+Если задан список конфигураций (sweep.grid / sweep.random_sample), на train выбирается
+лучшая по rank_by и проверяется на следующем test; без конфигураций все окна
+считаются с порогами по умолчанию. Индикаторы причинные (бар t видит только <= t),
+поэтому series_features считается один раз по всей истории без заглядывания вперёд.
+
+Monte Carlo: бутстрэп доходностей сделок (доля капитала на входе) -> распределения
+итоговой доходности и макс. просадки. Зерно детерминированное: чанки получают
+SeedSequence(seed).spawn(...), результат не зависит от числа процессов.
+
+iter_* отдают частичные результаты по мере готовности — для прогресс-бара в Streamlit.
+"""
+from __future__ import annotations
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
+from core_strategy import decide_series, series_features
+from backtest import backtest_metrics, simulate
+
+# ---------- walk-forward ----------
+def wf_windows(n: int, train_bars: int, test_bars: int, step: int | None = None,
+               warmup: int = 60) -> list[tuple[int, int, int]]:
+    """(train_start, test_start, test_end) — test_end не включая; первые warmup баров — прогрев."""
+    step = step or test_bars
+    out = []
+    a = warmup
+    while a + train_bars + test_bars <= n - 1:
+        out.append((a, a + train_bars, a + train_bars + test_bars))
+        a += step
+    return out
+
+_W: dict = {}
+
+def _init_wf(df, horizon, features, configs, rank_by, initial_capital, risk_per_trade):
+    _W.update(df=df, horizon=horizon, features=features, configs=configs, rank_by=rank_by,
+              initial_capital=initial_capital, risk_per_trade=risk_per_trade)
+
+def _segment(params: dict | None, a: int, b: int) -> dict:
+    # прогон только на барах [a, b): капитал с нуля, сигналы с прогревом по всей истории до b
+    df = _W["df"]
+    sig = decide_series(df, _W["horizon"], params, _W["features"])
+    eq, tr = simulate(df.iloc[:b + 1], sig.iloc[:b + 1], _W["initial_capital"], _W["risk_per_trade"], start=a)
+    return backtest_metrics(eq, tr, _W["initial_capital"])
+
+def _wf_window(i: int, a: int, b: int, c: int) -> dict:
+    best, train = None, None
+    if _W["configs"]:
+        scored = [(_segment(p, a, b), p) for p in _W["configs"]]
+        train, best = max(scored, key=lambda x: x[0][_W["rank_by"]])
+    test = _segment(best, b, c)
+    idx = _W["df"].index
+    row = {"window": i, "train_start": idx[a], "test_start": idx[b], "test_end": idx[c - 1],
+           "params": best or {}}
+    row.update({f"train_{k}": v for k, v in (train or {}).items()})
+    row.update({f"test_{k}": v for k, v in test.items()})
+    return row
+
+def iter_walk_forward(df: pd.DataFrame, horizon: str, train_bars: int = 504, test_bars: int = 126,
+                      step: int | None = None, configs: list[dict] | None = None,
+                      rank_by: str = "return_pct", initial_capital=100000, risk_per_trade=0.01,
+                      max_workers: int | None = None, ticker: str = ""):
+    """Генератор: (готово, всего, строка окна) по мере завершения окон."""
+    wins = wf_windows(len(df), train_bars, test_bars, step)
+    args = (df, horizon, series_features(df, horizon, ticker), configs, rank_by, initial_capital, risk_per_trade)
+    max_workers = max_workers or os.cpu_count() or 1
+    if max_workers == 1 or len(wins) <= 1:
+        _init_wf(*args)
+        for k, w in enumerate(wins):
+            yield k + 1, len(wins), _wf_window(k, *w)
+        return
+    with ProcessPoolExecutor(min(max_workers, len(wins)), initializer=_init_wf, initargs=args) as pool:
+        futures = [pool.submit(_wf_window, k, *w) for k, w in enumerate(wins)]
+        for done, fut in enumerate(as_completed(futures), 1):
+            yield done, len(wins), fut.result()
+
+def walk_forward(df: pd.DataFrame, horizon: str, **kw) -> pd.DataFrame:
+    rows = [row for _, _, row in iter_walk_forward(df, horizon, **kw)]
+    return pd.DataFrame(rows).sort_values("window").reset_index(drop=True) if rows else pd.DataFrame()
+
+# ---------- Monte Carlo ----------
+def trade_returns(eq: pd.DataFrame, tr: pd.DataFrame) -> np.ndarray:
+    """
+    Изменение капитала по каждой сделке как доля капитала на дату входа.
+    В pnl сделки, закрытой по SL после TP1, половина на TP1 не входит (её зачли раньше) — добавляем.
+    """
+    if tr.empty:
+        return np.zeros(0)
+    pnl = tr["pnl"].to_numpy(dtype=float)
+    if "tp1_hit" in tr:
+        tp1_part = np.where(tr["side"] == "LONG", tr["tp1"] - tr["entry"], tr["entry"] - tr["tp1"]) * tr["size"] * 0.5
+        partial = (tr["tp1_hit"].fillna(False).astype(bool) & (tr["exit"] != tr["tp2"])).to_numpy()
+        pnl = pnl + np.where(partial, tp1_part, 0.0)
+    cap_at_entry = eq["equity"].reindex(tr["entry_date"]).to_numpy(dtype=float)
+    return pnl / cap_at_entry
+
+def _mc_chunk(returns: np.ndarray, n_paths: int, seed) -> tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    m = len(returns)
+    paths = np.cumprod(1.0 + returns[rng.integers(0, m, size=(n_paths, m))], axis=1)
+    peak = np.maximum(np.maximum.accumulate(paths, axis=1), 1.0)
+    dd = np.minimum((paths / peak - 1.0).min(axis=1), 0.0)
+    return 100.0 * (paths[:, -1] - 1.0), 100.0 * dd
+
+# меньше стольких выборок (путей × сделок) пул процессов дороже самого счёта
+MC_INLINE = 2_000_000
+
+def iter_monte_carlo(returns: np.ndarray, n_paths: int = 10_000, seed: int = 0, chunk: int = 1_000,
+                     max_workers: int | None = None):
+    """Генератор: (готово путей, всего, номер чанка, доходности %, просадки %)."""
+    returns = np.asarray(returns, dtype=float)
+    if len(returns) == 0:
+        return
+    sizes = [min(chunk, n_paths - i) for i in range(0, n_paths, chunk)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    max_workers = max_workers or os.cpu_count() or 1
+    done = 0
+    if max_workers == 1 or len(sizes) == 1 or n_paths * len(returns) < MC_INLINE:
+        for k, (n, s) in enumerate(zip(sizes, seeds)):
+            ret, dd = _mc_chunk(returns, n, s)
+            done += n
+            yield done, n_paths, k, ret, dd
+        return
+    with ProcessPoolExecutor(min(max_workers, len(sizes))) as pool:
+        futures = {pool.submit(_mc_chunk, returns, n, s): (k, n) for k, (n, s) in enumerate(zip(sizes, seeds))}
+        for fut in as_completed(futures):
+            k, n = futures[fut]
+            ret, dd = fut.result()
+            done += n
+            yield done, n_paths, k, ret, dd
+
+def monte_carlo(returns: np.ndarray, n_paths: int = 10_000, seed: int = 0, chunk: int = 1_000,
+                max_workers: int | None = None) -> pd.DataFrame:
+    """Пути в порядке чанков (детерминированно): return_pct, max_dd_pct на путь."""
+    parts = {k: (ret, dd) for _, _, k, ret, dd in
+             iter_monte_carlo(returns, n_paths, seed, chunk, max_workers)}
+    if not parts:
+        return pd.DataFrame(columns=["return_pct", "max_dd_pct"])
+    ret = np.concatenate([parts[k][0] for k in sorted(parts)])
+    dd = np.concatenate([parts[k][1] for k in sorted(parts)])
+    return pd.DataFrame({"return_pct": ret, "max_dd_pct": dd})
+
+def distribution(mc: pd.DataFrame, q=(0.05, 0.25, 0.5, 0.75, 0.95)) -> pd.DataFrame:
+    """Квантили доходности и просадки по путям Monte Carlo."""
+    return mc.quantile(list(q)).rename_axis("quantile")
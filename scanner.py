@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+Пакетный сканер: decide() по списку тикеров и горизонтов в пуле процессов.
+
+    python scanner.py QQQ SPY AAPL -H ST MID LT --period 3y --workers 8 --out scan.csv
+    python scanner.py --file universe.txt
+
+Одна строка результата = (тикер, горизонт). Ошибка по тикеру не прерывает прогон:
+она попадает в колонку error, а время загрузки/расчёта — в load_s/decide_s.
+"""
+from __future__ import annotations
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import pandas as pd
+from core_strategy import MTFBars, decide
+from price_store import load_history
+
+HORIZONS = ("ST", "MID", "LT")
+MIN_BARS = 80  # как в app.py: меньше — «мало данных для анализа»
+
+def flatten_decision(dec: dict) -> dict:
+    """decide() -> плоская строка: base_*/alt_*, уровни пивотов и поля ctx."""
+    row = {"price": dec["price"]}
+    for side in ("base", "alt"):
+        for k, v in dec[side].items():
+            row[f"{side}_{k}"] = v
+    for k, v in dec["pivots"].items():
+        row[f"piv_{k}"] = v
+    ctx = dict(dec["ctx"])
+    row["pullback_lo"], row["pullback_hi"] = ctx.pop("pullback_zone")
+    row.update(ctx)
+    return row
+
+def scan_ticker(ticker: str, horizons=HORIZONS, period: str = "3y", loader=load_history) -> list[dict]:
+    t0 = time.perf_counter()
+    try:
+        df = loader(ticker, period)
+        if len(df) < MIN_BARS:
+            raise ValueError(f"мало данных: {len(df)} баров")
+    except Exception as e:
+        load_s = time.perf_counter() - t0
+        return [{"ticker": ticker, "horizon": hz, "error": f"{type(e).__name__}: {e}",
+                 "load_s": load_s, "decide_s": 0.0} for hz in horizons]
+    load_s = time.perf_counter() - t0
+
+    rows = []
+    bars = MTFBars(df)  # W/M/Y-агрегаты общие для всех горизонтов тикера
+    for hz in horizons:
+        t1 = time.perf_counter()
+        row = {"ticker": ticker, "horizon": hz, "bars": len(df), "asof": df.index[-1]}
+        try:
+            row.update(flatten_decision(decide(df, hz, bars, ticker=ticker)))
+            row["error"] = None
+        except Exception as e:
+            row["error"] = f"{type(e).__name__}: {e}"
+        row["load_s"], row["decide_s"] = load_s, time.perf_counter() - t1
+        rows.append(row)
+    return rows
+
+def _scan_chunk(tickers: list[str], horizons, period: str, loader) -> list[dict]:
+    rows = []
+    for t in tickers:
+        rows.extend(scan_ticker(t, horizons, period, loader))
+    return rows
+
+def _chunks(items: list, size: int):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def scan(tickers, horizons=HORIZONS, period: str = "3y", max_workers: int | None = None,
+         chunksize: int | None = None, loader=load_history, progress=None,
+         prefetch: int | None = None) -> pd.DataFrame:
+    """
+    decide() для каждого (тикер, горизонт). loader(ticker, period) -> OHLC DataFrame,
+    должен быть функцией уровня модуля (передаётся в дочерние процессы).
+    progress(done, total) — необязательный колбэк после каждого чанка.
+    prefetch — сначала загрузить все тикеры асинхронно с таким параллелизмом
+    (сеть не ждёт CPU; процессам остаётся чтение из локального хранилища).
+    """
+    tickers = list(dict.fromkeys(t.upper().strip() for t in tickers if t.strip()))
+    if prefetch:
+        from async_data import load_many  # asyncio не нужен воркерам, импортирующим этот модуль
+        load_many(tickers, period, loader, max_concurrency=prefetch)  # ошибки повторит scan_ticker
+    horizons = tuple(horizons)
+    max_workers = max_workers or os.cpu_count() or 1
+    if chunksize is None:
+        # ~4 чанка на процесс: баланс нагрузки без лишних накладных на pickle
+        chunksize = max(1, len(tickers) // (max_workers * 4))
+
+    rows: list[dict] = []
+    done = 0
+    if max_workers == 1:
+        for chunk in _chunks(tickers, chunksize):
+            rows.extend(_scan_chunk(chunk, horizons, period, loader))
+            done += len(chunk)
+            if progress: progress(done, len(tickers))
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            futures = {pool.submit(_scan_chunk, chunk, horizons, period, loader): chunk
+                       for chunk in _chunks(tickers, chunksize)}
+            for fut in as_completed(futures):
+                chunk = futures[fut]
+                try:
+                    rows.extend(fut.result())
+                except Exception as e:  # упал сам процесс (BrokenProcessPool и т.п.)
+                    rows.extend({"ticker": t, "horizon": hz, "error": f"{type(e).__name__}: {e}",
+                                 "load_s": float("nan"), "decide_s": float("nan")}
+                                for t in chunk for hz in horizons)
+                done += len(chunk)
+                if progress: progress(done, len(tickers))
+
+    out = pd.DataFrame(rows)
+    if out.empty:
+        return out
+    order = {t: i for i, t in enumerate(tickers)}
+    out["_o"] = out["ticker"].map(order)
+    out["_h"] = out["horizon"].map({hz: i for i, hz in enumerate(horizons)})
+    return out.sort_values(["_o", "_h"]).drop(columns=["_o", "_h"]).reset_index(drop=True)
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Пакетный прогон decide() по списку тикеров")
+    ap.add_argument("tickers", nargs="*", help="тикеры через пробел")
+    ap.add_argument("--file", help="файл со списком тикеров (по одному в строке или через запятую)")
+    ap.add_argument("-H", "--horizons", nargs="+", default=list(HORIZONS), choices=HORIZONS)
+    ap.add_argument("--period", default="3y", help="период истории yfinance (1y, 3y, 5y...)")
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--chunksize", type=int, default=None)
+    ap.add_argument("--prefetch", type=int, default=8, help="параллельных загрузок до расчёта (0 — без)")
+    ap.add_argument("--out", help="куда сохранить CSV (по умолчанию — stdout)")
+    args = ap.parse_args(argv)
+
+    tickers = list(args.tickers)
+    if args.file:
+        with open(args.file, encoding="utf-8") as f:
+            tickers += [t for line in f for t in line.replace(",", " ").split()]
+    if not tickers:
+        ap.error("нужен хотя бы один тикер")
+
+    t0 = time.perf_counter()
+    res = scan(tickers, args.horizons, args.period, args.workers, args.chunksize,
+               progress=lambda d, n: print(f"\r{d}/{n}", end="", file=sys.stderr), prefetch=args.prefetch)
+    print(file=sys.stderr)
+    if args.out:
+        res.to_csv(args.out, index=False)
+    else:
+        res.to_csv(sys.stdout, index=False)
+
+    failed = res.loc[res["error"].notna(), "ticker"].unique() if "error" in res else []
+    print(f"тикеров: {res['ticker'].nunique()}, ошибок: {len(failed)}, "
+          f"время: {time.perf_counter() - t0:.1f} с", file=sys.stderr)
+    for t in failed:
+        print(f"  {t}: {res.loc[res['ticker'] == t, 'error'].iloc[0]}", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
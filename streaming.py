@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""
+Потоковое состояние индикаторов: O(1) на новый бар вместо пересчёта всей истории.
+
+    st = IndicatorState.from_frame(df, "MID")   # прогрев по истории (один проход)
+    dec = st.update(bar)                         # bar: Series с Open/High/Low/Close, name=дата
+
+Решение совпадает с decide(df_с_новым_баром, horizon): ewm и rolling-mean ATR с компенсацией
+Кахана идут в тех же формулах, что у pandas (режим — до float-погрешности).
+Повторный бар с той же датой (внутридневное обновление свечи) заменяет последний бар.
+"""
+from __future__ import annotations
+import copy
+import math
+from collections import deque
+import numpy as np
+import pandas as pd
+from core_strategy import (fib_pivots, heikin_ashi_step, overheat_ctx, candle_confirmation,
+                           events_guard, decision_from, horizon_params, _ewm_alpha, _ewm_step,
+                           _kahan_step)
+
+_DAY_NS = 86_400_000_000_000
+
+def _period_key(ts: pd.Timestamp, tf: str) -> int:
+    # те же корзины, что core_strategy.period_keys / resample()
+    if ts.tz is not None:
+        ts = ts.tz_localize(None)
+    if tf == "D":
+        return ts.value // _DAY_NS
+    if tf == "W":
+        return (ts.value // _DAY_NS + 3) // 7
+    if tf == "M":
+        return (ts.year - 1970) * 12 + ts.month - 1
+    return ts.year - 1970
+
+class PeriodAgg:
+    """
+    Текущий (неполный) период ТФ + H/L/C прошлого периода + закрытия завершённых периодов.
+    Свои корзины (торговые сессии intraday.IntradayState) — через keyfunc.
+    """
+
+    def __init__(self, tf: str, keep_closes: int = 59, keyfunc=None):
+        """keyfunc(ts) -> номер периода; по умолчанию календарные корзины _period_key."""
+        self.tf = tf
+        self.keyfunc = keyfunc
+        self.key = None
+        self.count = 0            # непустых периодов, включая текущий
+        self.cur = None           # [H, L, C] текущего периода
+        self.prev = None          # (H, L, C) последнего завершённого
+        self.closes = deque(maxlen=keep_closes)
+
+    def copy(self) -> "PeriodAgg":
+        out = copy.copy(self)
+        out.cur = list(self.cur) if self.cur is not None else None
+        out.closes = self.closes.copy()
+        return out
+
+    def push(self, ts: pd.Timestamp, h: float, l: float, c: float):
+        key = self.keyfunc(ts) if self.keyfunc is not None else _period_key(ts, self.tf)
+        if key != self.key:
+            if self.cur is not None:
+                self.prev = tuple(self.cur)
+                self.closes.append(self.cur[2])
+            self.key, self.cur = key, [h, l, c]
+            self.count += 1
+        else:
+            self.cur[0] = max(self.cur[0], h)
+            self.cur[1] = min(self.cur[1], l)
+            self.cur[2] = c
+
+class IndicatorState:
+    """EMA/Wilder/rolling-состояние MACD, RSI, ATR, Heikin-Ashi и HLC старших ТФ для одного тикера."""
+
+    ATR_PERIOD = 14
+
+    def __init__(self, horizon: str, params: dict | None = None, ticker: str = ""):
+        self.horizon = horizon
+        self.ticker = ticker      # для календаря событий
+        self.params = horizon_params(horizon, params)
+        self.n = 0
+        self.last_ts = None
+        self.prev_bar = None      # (H, L, C) предыдущего бара — фолбэк df.iloc[-2] и TR
+        self.bar = None           # (O, H, L, C) последнего бара
+        # Heikin-Ashi
+        self.ha_open = self.ha_close = float("nan")
+        self.ha_streak = 0
+        # MACD
+        self.ema12 = self.ema26 = self.signal = float("nan")
+        self.hist = float("nan")
+        self.hist_pos = self.hist_neg = 0
+        self.hist_tail = deque(maxlen=7)
+        # RSI (Wilder)
+        self.roll_up = self.roll_down = float("nan")
+        # ATR: окно TR и сумма с отдельными компенсациями добавления/удаления, как в indicator_arrays
+        self.tr = deque(maxlen=self.ATR_PERIOD)
+        self.tr_sum = self.tr_add = self.tr_rem = 0.0
+        self.tr_same = 0          # подряд одинаковых TR
+        # старшие ТФ: цепочка фолбэков aggregate_prev_HLC + ТФ режима
+        self.pivot_chain = {"ST": ["W"], "MID": ["M", "W"], "LT": ["Y", "M"]}[horizon]
+        self.regime_tf = {"ST": "W", "MID": "M", "LT": "Y"}[horizon]
+        self.periods = {tf: PeriodAgg(tf) for tf in {*self.pivot_chain, self.regime_tf}}
+        self._snapshot = None
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, horizon: str, params: dict | None = None,
+                   ticker: str = "") -> "IndicatorState":
+        st = cls(horizon, params, ticker=ticker)
+        cols = [df[k].to_numpy(dtype=float) for k in ("Open", "High", "Low", "Close")]
+        last = len(df) - 1
+        for i, (ts, o, h, l, c) in enumerate(zip(df.index, *cols)):
+            if i == last:
+                st._take_snapshot()
+            st._push(ts, o, h, l, c)
+        return st
+
+    # ---------- update ----------
+    def update(self, bar, ts=None) -> dict | None:
+        """Добавить бар (или заменить последний, если дата та же) и вернуть решение как у decide()."""
+        ts = pd.Timestamp(bar.name if ts is None else ts)
+        o, h, l, c = (float(bar[k]) for k in ("Open", "High", "Low", "Close"))
+        if self.last_ts is not None and ts == self.last_ts:
+            self.__dict__.update(self._snapshot)
+        elif self.last_ts is not None and ts < self.last_ts:
+            raise ValueError(f"бар {ts} старше последнего {self.last_ts}")
+        self._take_snapshot()
+        self._push(ts, o, h, l, c)
+        return self.decision()
+
+    def _take_snapshot(self):
+        # состояние до последнего бара — чтобы его можно было заменить обновлённой свечой
+        snap = dict(self.__dict__)
+        snap["_snapshot"] = None
+        snap["hist_tail"] = self.hist_tail.copy()
+        snap["tr"] = self.tr.copy()
+        snap["periods"] = {tf: agg.copy() for tf, agg in self.periods.items()}
+        self._snapshot = snap
+
+    def _push(self, ts: pd.Timestamp, o: float, h: float, l: float, c: float):
+        prev_close = self.bar[3] if self.bar is not None else float("nan")
+        if self.bar is not None:
+            self.prev_bar = self.bar[1:]
+
+        # Heikin-Ashi
+        if self.n == 0:
+            ha_close = (o + h + l + c) / 4.0
+            ha_open = ha_close
+        else:
+            ha_open, ha_close = heikin_ashi_step(self.ha_open, self.ha_close, o, h, l, c)
+            d = ha_close - self.ha_close
+            if d > 0: self.ha_streak += 1
+            elif d < 0: self.ha_streak = 0
+        self.ha_open, self.ha_close = ha_open, ha_close
+
+        # MACD histogram
+        self.ema12 = _ewm_step(self.ema12, c, _ewm_alpha(span=12))
+        self.ema26 = _ewm_step(self.ema26, c, _ewm_alpha(span=26))
+        macd = self.ema12 - self.ema26
+        self.signal = _ewm_step(self.signal, macd, _ewm_alpha(span=9))
+        self.hist = macd - self.signal
+        if self.hist > 0: self.hist_pos += 1; self.hist_neg = 0
+        elif self.hist < 0: self.hist_neg += 1; self.hist_pos = 0
+        self.hist_tail.append(self.hist)
+
+        # RSI (Wilder) и ATR
+        if self.n > 0:
+            delta = c - prev_close
+            a = _ewm_alpha(alpha=1 / 14)
+            self.roll_up = _ewm_step(self.roll_up, max(delta, 0.0), a)
+            self.roll_down = _ewm_step(self.roll_down, max(-delta, 0.0), a)
+            t = max(h - l, abs(h - prev_close), abs(l - prev_close))
+        else:
+            t = h - l
+        if len(self.tr) == self.ATR_PERIOD:
+            self.tr_sum, self.tr_rem = _kahan_step(self.tr_sum, self.tr_rem, -self.tr[0])
+        self.tr_sum, self.tr_add = _kahan_step(self.tr_sum, self.tr_add, t)
+        self.tr_same = self.tr_same + 1 if self.tr and t == self.tr[-1] else 1
+        self.tr.append(t)
+
+        for agg in self.periods.values():
+            agg.push(ts, h, l, c)
+
+        self.bar = (o, h, l, c)
+        self.last_ts = ts
+        self.n += 1
+
+    # ---------- derived values ----------
+    @property
+    def atr(self) -> float:
+        if len(self.tr) < self.ATR_PERIOD:
+            return float("nan")
+        res = self.tr[-1] if self.tr_same >= self.ATR_PERIOD else self.tr_sum / self.ATR_PERIOD
+        return max(res, 0.0)
+
+    @property
+    def rsi(self) -> float:
+        if not self.roll_down or math.isnan(self.roll_down) or math.isnan(self.roll_up):
+            return 50.0
+        return 100 - 100 / (1 + self.roll_up / self.roll_down)
+
+    def prev_HLC(self) -> tuple[float, float, float]:
+        # aggregate_prev_HLC: основной ТФ, затем фолбэк, затем предыдущий бар
+        for tf in self.pivot_chain:
+            if self.periods[tf].count >= 2:
+                return self.periods[tf].prev
+        return self.prev_bar
+
+    def regime(self) -> str:
+        agg = self.periods[self.regime_tf]
+        if agg.count < 60:
+            return "FLAT"
+        s = np.array([*agg.closes, self.bar[3]])
+        ma_last = s[-50:].mean()
+        ma_10 = s[-59:-9].mean()
+        slope = (ma_last - ma_10) / max(1e-9, ma_10)
+        vol = s[-14:].std(ddof=1) / s[-1]
+        slope_min, vol_max = self.params["regime_slope"], self.params["regime_vol"]
+        if slope > slope_min and vol < vol_max:
+            return "UP"
+        if slope < -slope_min and vol < vol_max:
+            return "DOWN"
+        return "FLAT"
+
+    def flatness(self) -> float:
+        diffs = np.abs(np.diff(np.array(self.hist_tail)))
+        tail = diffs[-6:] if self.n > 6 else diffs
+        return float(tail.mean()) if len(tail) else 0.0
+
+    def decision(self) -> dict | None:
+        if self.n < 2:
+            return None
+        o, h, l, c = self.bar
+        price = float(c)
+        piv = fib_pivots(*self.prev_HLC())
+        hist_streak = self.hist_pos if self.hist > 0 else (self.hist_neg if self.hist < 0 else 0)
+        ctx = overheat_ctx(price, piv, self.horizon, self.ha_streak, hist_streak, self.flatness(), self.params)
+        confirmed = events_guard(self.last_ts, self.ticker) and candle_confirmation(o, h, l, c)
+        return decision_from(self.horizon, price, piv, ctx, self.atr, self.regime(), confirmed, self.params)
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+Перебор порогов стратегии (DEFAULT_PARAMS) по истории одного тикера.
+
+    space = {"need_ha": [3, 4, 5], "need_hist": [4, 6], "min_rr": (1.5, 3.0)}
+    res = run_sweep(df, "MID", grid(space))                 # полная сетка (только списки)
+    res = run_sweep(df, "MID", random_sample(space, 2000))  # случайная выборка
+
+Индикаторы, не зависящие от порогов (series_features), считаются один раз на горизонт
+и передаются процессам пула при старте; на конфигурацию остаются пороги + ведение позиции.
+Результат — таблица, отсортированная по rank_by: return_pct, max_dd_pct, hit_rate, trades.
+"""
+from __future__ import annotations
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from core_strategy import DEFAULT_PARAMS, decide_series, series_features
+from backtest import backtest_metrics, simulate
+
+def grid(space: dict) -> list[dict]:
+    """Все сочетания значений; значения space — списки."""
+    keys = list(space)
+    return [dict(zip(keys, vals)) for vals in itertools.product(*(space[k] for k in keys))]
+
+def random_sample(space: dict, n: int, seed: int = 0) -> list[dict]:
+    """
+    n случайных конфигураций: список — выбор из значений,
+    (lo, hi) — равномерно на отрезке (целые, если обе границы int).
+    """
+    rng = np.random.default_rng(seed)
+    out = []
+    for _ in range(n):
+        cfg = {}
+        for k, v in space.items():
+            if isinstance(v, tuple):
+                lo, hi = v
+                cfg[k] = int(rng.integers(lo, hi + 1)) if isinstance(lo, int) and isinstance(hi, int) \
+                    else float(rng.uniform(lo, hi))
+            else:
+                cfg[k] = v[rng.integers(len(v))]
+        out.append(cfg)
+    return out
+
+# ---------- worker ----------
+_W: dict = {}
+
+def _init_worker(df, horizon, features, initial_capital, risk_per_trade):
+    _W.update(df=df, horizon=horizon, features=features,
+              initial_capital=initial_capital, risk_per_trade=risk_per_trade)
+
+def _run_config(params: dict) -> dict:
+    sig = decide_series(_W["df"], _W["horizon"], params, _W["features"])
+    eq, tr = simulate(_W["df"], sig, _W["initial_capital"], _W["risk_per_trade"])
+    return {**params, **backtest_metrics(eq, tr, _W["initial_capital"])}
+
+def _run_chunk(configs: list[dict]) -> list[dict]:
+    rows = []
+    for params in configs:
+        try:
+            rows.append(_run_config(params))
+        except Exception as e:
+            rows.append({**params, "error": f"{type(e).__name__}: {e}"})
+    return rows
+
+def run_sweep(df: pd.DataFrame, horizon: str, configs: list[dict], initial_capital=100000,
+              risk_per_trade=0.01, max_workers: int | None = None, chunksize: int | None = None,
+              rank_by: str = "return_pct", progress=None, ticker: str = "") -> pd.DataFrame:
+    """
+    progress(done, total) — необязательный колбэк после каждого чанка конфигураций;
+    ticker — для календаря событий.
+    """
+    unknown = {k for cfg in configs for k in cfg} - set(DEFAULT_PARAMS)
+    if unknown:
+        raise KeyError(f"неизвестные параметры: {sorted(unknown)}")
+    features = series_features(df, horizon, ticker)
+    args = (df, horizon, features, initial_capital, risk_per_trade)
+    max_workers = max_workers or os.cpu_count() or 1
+    chunksize = chunksize or max(1, len(configs) // (max_workers * 8))
+    chunks = [configs[i:i + chunksize] for i in range(0, len(configs), chunksize)]
+
+    rows: list[dict] = []
+    if max_workers == 1:
+        _init_worker(*args)
+        parts = map(_run_chunk, chunks)
+    else:
+        pool = ProcessPoolExecutor(max_workers, initializer=_init_worker, initargs=args)
+        parts = pool.map(_run_chunk, chunks)
+    try:
+        for part in parts:
+            rows.extend(part)
+            if progress: progress(len(rows), len(configs))
+    finally:
+        if max_workers != 1:
+            pool.shutdown()
+
+    res = pd.DataFrame(rows)
+    if rank_by in res:
+        res = res.sort_values([rank_by, "max_dd_pct"], ascending=[False, False], na_position="last")
+    return res.reset_index(drop=True)
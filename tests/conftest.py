@@ -0,0 +1,10 @@
+# -*- coding: utf-8 -*-
+# модули проекта лежат в корне репозитория, без пакета
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def pytest_configure(config):
+    # алиасы 'M'/'Y' в resample (как в benchmarks/run.py)
+    config.addinivalue_line("filterwarnings", "ignore:'[MY]' is deprecated:FutureWarning")
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""AsyncFetcher: склейка одинаковых запросов, повторы временных ошибок, фатальные — сразу."""
+from __future__ import annotations
+import asyncio
+import pandas as pd
+import pytest
+from async_data import AsyncFetcher, load_many
+
+class StubSource:
+    """async-источник: считает вызовы по тикеру, ошибки — по расписанию {тикер: [исключение | None, ...]}."""
+
+    def __init__(self, schedule=None, delay: float = 0.01):
+        self.schedule = {t: list(s) for t, s in (schedule or {}).items()}
+        self.delay = delay
+        self.calls: dict[str, int] = {}
+        self.active = self.peak = 0
+
+    async def fetch(self, ticker, arg):
+        self.calls[ticker] = self.calls.get(ticker, 0) + 1
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+            plan = self.schedule.get(ticker)
+            err = plan.pop(0) if plan else None
+            if err is not None:
+                raise err
+            return pd.DataFrame({"Close": [1.0]}, index=[pd.Timestamp("2024-01-02")]).assign(ticker=ticker)
+        finally:
+            self.active -= 1
+
+def run(coro):
+    return asyncio.run(coro)
+
+def test_duplicate_requests_coalesce():
+    src = StubSource(delay=0.05)
+    fetcher = AsyncFetcher(src.fetch, backoff=0)
+
+    async def go():
+        return await asyncio.gather(*(fetcher.fetch("QQQ", "1y") for _ in range(5)), fetcher.fetch("QQQ", "3y"))
+
+    res = run(go())
+    assert src.calls == {"QQQ": 2}  # разные arg — разные запросы
+    assert fetcher.coalesced == 4 and fetcher.calls == 2
+    assert all(r is res[0] for r in res[:5])
+    # fetch_many убирает повторы тикеров из списка
+    out = run(fetcher.fetch_many(["SPY", "SPY", "QQQ"]))
+    assert list(out) == ["SPY", "QQQ"]
+    # завершённый запрос не кэшируется: новый fetch снова идёт в источник
+    run(fetcher.fetch("QQQ", "1y"))
+    assert src.calls["QQQ"] == 4
+
+def test_transient_errors_retried():
+    src = StubSource({"SPY": [ConnectionError("reset"), TimeoutError(), None]})
+    fetcher = AsyncFetcher(src.fetch, retries=2, backoff=0)
+    df = run(fetcher.fetch("SPY"))
+    assert df["ticker"].iat[0] == "SPY"
+    assert src.calls == {"SPY": 3}
+    assert fetcher.retried == 2
+
+def test_retries_exhausted():
+    src = StubSource({"SPY": [ConnectionError("1"), ConnectionError("2"), ConnectionError("3")]})
+    fetcher = AsyncFetcher(src.fetch, retries=1, backoff=0)
+    with pytest.raises(ConnectionError, match="2"):
+        run(fetcher.fetch("SPY"))
+    assert src.calls == {"SPY": 2}
+
+@pytest.mark.parametrize("err", [KeyError("NOPE"), FileNotFoundError("x.csv"), ValueError("bad period")])
+def test_fatal_errors_fail_fast(err):
+    src = StubSource({"NOPE": [err, None]})
+    fetcher = AsyncFetcher(src.fetch, retries=3, backoff=0)
+    out = run(fetcher.fetch_many(["NOPE", "QQQ"]))
+    assert out["NOPE"] is err
+    assert isinstance(out["QQQ"], pd.DataFrame)  # ошибка одного тикера не мешает остальным
+    assert src.calls == {"NOPE": 1, "QQQ": 1}
+    assert fetcher.retried == 0
+
+def test_concurrency_limit():
+    src = StubSource(delay=0.02)
+    fetcher = AsyncFetcher(src.fetch, max_concurrency=3)
+    out = run(fetcher.fetch_many([f"T{i}" for i in range(10)]))
+    assert len(out) == 10 and src.peak == 3
+
+def test_load_many_sync_source():
+    calls = []
+
+    def fn(ticker, arg):
+        calls.append((ticker, arg))
+        if ticker == "BAD":
+            raise KeyError(ticker)
+        return pd.DataFrame({"Close": [float(len(ticker))]})
+
+    out = load_many(["QQQ", "BAD", "QQQ"], "1y", fn=fn, backoff=0)
+    assert sorted(calls) == [("BAD", "1y"), ("QQQ", "1y")]
+    assert isinstance(out["BAD"], KeyError) and out["QQQ"]["Close"].iat[0] == 3.0
@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+"""
+Быстрые пути против эталона decide(): векторный бэктест, decide_series, decide_arrays,
+decide_panel и потоковый IndicatorState. Рекурсии (ewm, rolling mean с Каханом) повторяют
+pandas бит в бит — эти проверки ловят расхождение при обновлении pandas или правке формул.
+"""
+from __future__ import annotations
+import numpy as np
+import pandas as pd
+import pytest
+from benchmarks.synthetic import synthetic_ohlc
+from backtest import run_backtest, run_backtest_replay
+from core_strategy import atr, decide, decide_arrays, decide_series, heikin_ashi, macd_hist, rsi_wilder
+from cross_section import atr_panel, decide_panel, heikin_ashi_panel, macd_hist_panel, panel, rsi_wilder_panel
+from streaming import IndicatorState
+
+HORIZONS = ("ST", "MID", "LT")
+SIDES = ("base", "alt")
+LEVELS = ("entry", "tp1", "tp2", "sl")
+
+def history(n: int, seed: int, tz: str | None = None, holes: float = 0.0) -> pd.DataFrame:
+    """Синтетика с гэпами, плоскими барами, пропусками дней и (опционально) tz-aware индексом."""
+    df = synthetic_ohlc(n, seed=seed, gap_prob=0.05, flat_prob=0.03, start="2012-01-02")
+    if holes:
+        df = df[np.random.default_rng(seed).random(len(df)) > holes]
+    if tz:
+        df.index = df.index.tz_localize(tz)
+    return df
+
+def row_decision(row: pd.Series) -> dict:
+    return {side: (row[f"{side}_action"],) + tuple(None if np.isnan(row[f"{side}_{k}"]) else row[f"{side}_{k}"]
+                                                   for k in LEVELS) for side in SIDES}
+
+def dict_decision(dec: dict) -> dict:
+    return {side: tuple(dec[side][k] for k in ("action", *LEVELS)) for side in SIDES}
+
+# ---------- frozen reference ----------
+# Исходный цикл run_backtest() из 3208d44 без изменений (кроме имени): decide() на каждом
+# префиксе. Эталон не правится вместе с backtest.py — ловит расхождение и в run_backtest,
+# и в run_backtest_replay.
+def reference_backtest(df: pd.DataFrame, horizon: str, initial_capital=100000, risk_per_trade=0.01):
+    cap = initial_capital
+    pos = None
+    trades = []
+    equity = []
+
+    for i in range(60, len(df)):
+        sub = df.iloc[:i].copy()
+        dec = decide(sub, horizon)
+        price = sub["Close"].iloc[-1]
+        date  = sub.index[-1].date()
+
+        # управление активной позицией
+        if pos:
+            high = sub["High"].iloc[-1]
+            low  = sub["Low"].iloc[-1]
+            closed = False
+
+            if pos["side"] == "LONG":
+                if low <= pos["sl"]:
+                    pnl = (pos["sl"] - pos["entry"]) * pos["size"]
+                    cap += pnl
+                    pos["exit"], pos["pnl"], pos["exit_date"] = pos["sl"], pnl, date
+                    trades.append(pos); pos=None; closed=True
+                if not closed:
+                    if high >= pos["tp1"] and not pos.get("tp1_hit"):
+                        pnl = (pos["tp1"] - pos["entry"]) * pos["size"]*0.5
+                        cap += pnl; pos["tp1_hit"]=True
+                    if high >= pos["tp2"]:
+                        pnl = (pos["tp2"] - pos["entry"]) * pos["size"]*0.5
+                        cap += pnl
+                        pos["exit"], pos["pnl"], pos["exit_date"] = pos["tp2"], pnl + (pos["tp1"]-pos["entry"]) * pos["size"]*0.5, date
+                        trades.append(pos); pos=None
+
+            else:  # SHORT
+                if high >= pos["sl"]:
+                    pnl = (pos["entry"] - pos["sl"]) * pos["size"]
+                    cap += pnl
+                    pos["exit"], pos["pnl"], pos["exit_date"] = pos["sl"], pnl, date
+                    trades.append(pos); pos=None; closed=True
+                if not closed:
+                    if low <= pos["tp1"] and not pos.get("tp1_hit"):
+                        pnl = (pos["entry"] - pos["tp1"]) * pos["size"]*0.5
+                        cap += pnl; pos["tp1_hit"]=True
+                    if low <= pos["tp2"]:
+                        pnl = (pos["entry"] - pos["tp2"]) * pos["size"]*0.5
+                        cap += pnl
+                        pos["exit"], pos["pnl"], pos["exit_date"] = pos["tp2"], pnl + (pos["entry"]-pos["tp1"]) * pos["size"]*0.5, date
+                        trades.append(pos); pos=None
+
+        # открытие новой позиции
+        if (pos is None) and (dec["base"]["action"] in ["LONG","SHORT"]):
+            entry, tp1, tp2, sl = dec["base"]["entry"], dec["base"]["tp1"], dec["base"]["tp2"], dec["base"]["sl"]
+            if None not in [entry,tp1,tp2,sl]:
+                risk_amt = cap * risk_per_trade
+                risk_per_share = abs(entry - sl)
+                if risk_per_share > 0:
+                    size = max(1, int(risk_amt / risk_per_share))
+                    pos = {
+                        "side": dec["base"]["action"],
+                        "entry": entry, "tp1": tp1, "tp2": tp2, "sl": sl,
+                        "size": size, "entry_date": date, "comment": ""
+                    }
+
+        equity.append({"date": date, "equity": cap})
+
+    eq = pd.DataFrame(equity).set_index("date")
+    tr = pd.DataFrame(trades)
+    return eq, tr
+
+def normalized_reference(df: pd.DataFrame, horizon: str) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """reference_backtest() в типах run_backtest(): даты — datetime64, tp1_hit — bool, без comment."""
+    eq, tr = reference_backtest(df, horizon)
+    eq.index = pd.to_datetime(eq.index)
+    eq["equity"] = eq["equity"].astype(float)
+    if len(tr):
+        tr = tr.drop(columns="comment")
+        tr["tp1_hit"] = tr["tp1_hit"].eq(True) if "tp1_hit" in tr else False
+        for col in ("entry_date", "exit_date"):
+            tr[col] = pd.to_datetime(tr[col])
+    return eq, tr
+
+@pytest.mark.parametrize("horizon", HORIZONS)
+def test_backtest_matches_replay(horizon):
+    df = history(450, seed=1, holes=0.03)
+    eq, tr = run_backtest(df, horizon)
+    eq0, tr0 = run_backtest_replay(df, horizon)
+    pd.testing.assert_frame_equal(eq, eq0)
+    pd.testing.assert_frame_equal(tr, tr0)
+
+@pytest.mark.parametrize("horizon", HORIZONS)
+def test_backtest_matches_frozen_reference(horizon):
+    df = history(450, seed=2, holes=0.03)
+    eq, tr = run_backtest(df, horizon)
+    eq0, tr0 = normalized_reference(df, horizon)
+    assert len(tr0)
+    pd.testing.assert_frame_equal(eq, eq0, check_names=False, check_freq=False)
+    tr = tr.assign(side=tr["side"].astype(str))
+    pd.testing.assert_frame_equal(tr, tr0[tr.columns], check_dtype=False)
+
+@pytest.mark.parametrize("tz", [None, "America/New_York"])
+@pytest.mark.parametrize("horizon", HORIZONS)
+def test_decide_series_matches_decide(horizon, tz):
+    df = history(1200, seed=2, tz=tz, holes=0.03)
+    sig = decide_series(df, horizon)
+    for t in range(60, len(df), 11):
+        dec = decide(df.iloc[:t + 1], horizon)
+        assert row_decision(sig.iloc[t]) == dict_decision(dec), t
+        assert sig["regime"].iloc[t] == dec["ctx"]["regime"], t
+
+@pytest.mark.parametrize("horizon", HORIZONS)
+def test_decide_arrays_matches_decide_series(horizon):
+    for n, seed in ((30, 3), (2500, 4)):
+        df = history(n, seed)
+        sig = decide_series(df, horizon)
+        arr = decide_arrays(df.index.asi8, df[["Open", "High", "Low", "Close"]].to_numpy(), horizon)
+        for k in sig.columns:
+            v = sig[k]
+            v = v.cat.codes.to_numpy() if hasattr(v, "cat") else v.to_numpy()
+            w = arr[k] % 3 if k.endswith("action") else arr[k]
+            np.testing.assert_array_equal(np.asarray(v, dtype=float), np.asarray(w, dtype=float), err_msg=k)
+
+def _universe() -> dict[str, pd.DataFrame]:
+    # разная длина, разное начало, дыры в части историй
+    rng = np.random.default_rng(5)
+    data = {}
+    for k in range(12):
+        df = synthetic_ohlc(int(rng.integers(40, 1500)), seed=k, gap_prob=0.05,
+                            start=str((pd.Timestamp("2010-01-04") + pd.Timedelta(days=int(rng.integers(0, 900)))).date()))
+        data[f"T{k}"] = df[rng.random(len(df)) > 0.05] if k % 3 == 0 else df
+    return data
+
+def test_panel_indicators_match_per_ticker():
+    data = _universe()
+    pan = panel(data)
+    hist = macd_hist_panel(pan["close"])
+    rsi = rsi_wilder_panel(pan["close"])
+    atr_ = atr_panel(pan["high"], pan["low"], pan["close"])
+    ha_open, ha_close = heikin_ashi_panel(pan["open"], pan["high"], pan["low"], pan["close"])
+    for j, t in enumerate(pan["tickers"]):
+        df = data[t]
+        rows = np.searchsorted(pan["calendar"], df.index.values)
+        ha = heikin_ashi(df)
+        for name, x, y in (("macd", hist, macd_hist(df["Close"])), ("rsi", rsi, rsi_wilder(df["Close"])),
+                           ("atr", atr_, atr(df)), ("ha_open", ha_open, ha["HA_Open"]),
+                           ("ha_close", ha_close, ha["HA_Close"])):
+            np.testing.assert_array_equal(x[rows, j], y.to_numpy(), err_msg=f"{t} {name}")
+        missing = np.ones(len(pan["calendar"]), dtype=bool)
+        missing[rows] = False
+        assert np.isnan(rsi[missing, j]).all()
+
+@pytest.mark.parametrize("horizon", HORIZONS)
+def test_decide_panel_matches_last_row(horizon):
+    data = _universe()
+    table = decide_panel(data, horizon)
+    for t, df in data.items():
+        last = decide_series(df, horizon).iloc[-1]
+        got = table.loc[t]
+        assert got["date"] == df.index[-1]
+        for k in last.index:
+            a, b = last[k], got[k]
+            assert a == b or (pd.isna(a) and pd.isna(b)), (t, k, a, b)
+
+@pytest.mark.parametrize("horizon", HORIZONS)
+def test_streaming_matches_decide(horizon):
+    df = history(900, seed=6)
+    st = IndicatorState.from_frame(df.iloc[:80], horizon)
+    for t in range(80, len(df)):
+        dec = st.update(df.iloc[t])
+        if t % 9 == 0:
+            exp = decide(df.iloc[:t + 1], horizon)
+            assert dec["pivots"] == exp["pivots"], t
+            assert dict_decision(dec) == dict_decision(exp), t
+            assert st.atr == atr(df.iloc[:t + 1]).iloc[-1], t
+    # внутридневная правка последнего бара заменяет его, а не добавляет новый
+    bar = df.iloc[-1].copy()
+    bar["Close"] *= 1.01
+    bar["High"] = max(bar["High"], bar["Close"])
+    exp = decide(pd.concat([df.iloc[:-1], bar.to_frame().T]), horizon)
+    assert dict_decision(st.update(bar)) == dict_decision(exp)
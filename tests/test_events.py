@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""Календарь событий: слияние окон, скаляр против маски, tz-aware даты, WAIT в decide()."""
+from __future__ import annotations
+import numpy as np
+import pandas as pd
+import pytest
+import events
+from benchmarks.synthetic import synthetic_ohlc
+from core_strategy import decide, decide_series
+from events import ALL, EMPTY, EventCalendar, from_frame, load_calendar, set_default_calendar
+
+EVENTS = pd.DataFrame({
+    "ticker": ["AAA", "aaa ", "AAA", "BBB", "BBB", "*", None],
+    "date": ["2024-05-01", "2024-05-03", "2024-06-10", "2024-05-02", "2024-05-02", "2024-06-12", "2024-07-01"],
+    "kind": ["earnings", "dividend", "earnings", "earnings", "dividend", "macro", "macro"],
+    "before": [np.nan, np.nan, 3, np.nan, np.nan, np.nan, 1],
+    "after": [np.nan, np.nan, np.nan, 5, np.nan, np.nan, np.nan],
+})
+
+def day(s: str) -> int:
+    return int(np.datetime64(s, "D").astype(np.int64))
+
+@pytest.fixture
+def cal():
+    return from_frame(EVENTS)
+
+@pytest.fixture(autouse=True)
+def no_default_calendar(monkeypatch):
+    monkeypatch.delenv("CAPINTEL_EVENTS", raising=False)
+    set_default_calendar(None)
+    yield
+    set_default_calendar(None)
+
+def test_windows_merge(cal):
+    # AAA: отчёт 1 мая ±1 и дивиденд 3 мая сливаются; 10 июня -3/+1 смыкается с макро 12 июня
+    s, e = cal.windows("AAA")
+    assert list(s) == [day("2024-04-30"), day("2024-06-07"), day("2024-06-30")]
+    assert list(e) == [day("2024-05-03"), day("2024-06-12"), day("2024-07-01")]
+    # BBB: два события в один день, after=5 из колонки перекрывает ширину по kind
+    s, e = cal.windows(" bbb")
+    assert list(s) == [day("2024-05-01"), day("2024-06-12"), day("2024-06-30")]
+    assert list(e) == [day("2024-05-07"), day("2024-06-12"), day("2024-07-01")]
+    # неизвестный тикер и пустой — только общие события
+    for t in ("ZZZ", ""):
+        s, e = cal.windows(t)
+        assert list(s) == [day("2024-06-12"), day("2024-06-30")]
+    assert cal.events == len(EVENTS)
+
+@pytest.mark.parametrize("ticker", ["AAA", "bbb", "ZZZ", ""])
+@pytest.mark.parametrize("tz", [None, "America/New_York", "Asia/Tokyo"])
+def test_scalar_matches_mask(cal, ticker, tz):
+    idx = pd.date_range("2024-04-01 09:30", "2024-07-15 16:00", freq="7h", tz=tz)
+    mask = cal.allowed_mask(idx, ticker)
+    scalar = np.array([cal.allowed(ts, ticker) for ts in idx])
+    np.testing.assert_array_equal(scalar, mask)
+    # tz-aware — по местной дате бара, как у наивного индекса в той же зоне
+    naive = idx.tz_localize(None) if tz else idx
+    np.testing.assert_array_equal(cal.allowed_mask(naive, ticker), mask)
+    np.testing.assert_array_equal(cal.allowed_mask(naive.asi8, ticker), mask)
+    np.testing.assert_array_equal(cal.allowed_mask(naive.to_numpy(), ticker), mask)
+    assert (~mask).any()
+
+def test_window_edges(cal):
+    # before/after включительно, в календарных днях
+    assert cal.allowed(pd.Timestamp("2024-04-29 23:59"), "AAA")
+    assert not cal.allowed(pd.Timestamp("2024-04-30 00:00"), "AAA")
+    assert not cal.allowed(pd.Timestamp("2024-05-03 23:59"), "AAA")
+    assert cal.allowed(pd.Timestamp("2024-05-04"), "AAA")
+    assert not cal.allowed(pd.Timestamp("2024-05-07"), "BBB") and cal.allowed(pd.Timestamp("2024-05-08"), "BBB")
+    # после полуночи в Токио, но ещё 29 апреля по UTC: решает местная дата
+    assert not cal.allowed(pd.Timestamp("2024-04-30 01:00", tz="Asia/Tokyo"), "AAA")
+
+def test_kinds_filter_and_version(cal, tmp_path):
+    only = from_frame(EVENTS, kinds=["earnings"])
+    assert only.events == 3
+    assert list(only.windows("AAA")[0]) == [day("2024-04-30"), day("2024-06-07")]
+    assert only.version and only.version != cal.version
+    assert EMPTY.version == "" and EMPTY.allowed(pd.Timestamp("2024-05-01"), "AAA")
+    assert EMPTY.allowed_mask(pd.date_range("2024-01-01", periods=3)).all()
+    path = tmp_path / "events.csv"
+    EVENTS.to_csv(path, index=False)
+    assert load_calendar(str(path)).version == cal.version
+    # общий тикер можно задать и явно
+    assert EventCalendar([ALL], np.array(["2024-06-12"], dtype="datetime64[ns]"), [0], [0]).windows("X")[0][0] == day("2024-06-12")
+
+def test_default_calendar_from_env(monkeypatch, tmp_path):
+    assert events.default_calendar() is EMPTY
+    path = tmp_path / "events.csv"
+    EVENTS.to_csv(path, index=False)
+    monkeypatch.setenv("CAPINTEL_EVENTS", str(path))
+    assert events.default_calendar() is EMPTY  # уже загружен — до сброса не перечитывается
+    set_default_calendar(None)
+    assert not events.default_calendar().allowed(pd.Timestamp("2024-05-01"), "AAA")
+
+def test_decide_waits_on_event():
+    df = synthetic_ohlc(600, seed=3, start="2021-01-04")
+    ser = decide_series(df, "ST")
+    hits = np.flatnonzero((ser["base_action"] != "WAIT").to_numpy())
+    assert len(hits)
+    bars = df.iloc[:hits[-1] + 1]
+    on = bars.index[-1]
+    free = decide(bars, "ST", ticker="AAA")
+    assert free["base"]["action"] != "WAIT"
+
+    set_default_calendar(from_frame(pd.DataFrame({"ticker": ["AAA"], "date": [on], "kind": ["earnings"]})))
+    blocked = decide(bars, "ST", ticker="AAA")
+    assert blocked["base"]["action"] == "WAIT" and blocked["alt"]["action"] == "WAIT"
+    assert blocked["pivots"] == free["pivots"]
+    assert decide(bars, "ST", ticker="BBB") == free  # событие другого тикера
+    assert decide(bars, "ST") == free
+    # векторный путь — то же окно: отчёт ±1 день
+    ev = decide_series(df, "ST", ticker="AAA")["base_action"].to_numpy()
+    near = np.abs((df.index - on).days) <= 1
+    assert (ev[near] == "WAIT").all()
+    assert (ev[~near] == ser["base_action"].to_numpy()[~near]).all()
+
+    set_default_calendar(None)  # CAPINTEL_EVENTS не задан — запретов снова нет
+    assert decide(bars, "ST", ticker="AAA") == free
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""simulate_fills против скалярного эталона: бар за баром, сделка за сделкой."""
+from __future__ import annotations
+import numpy as np
+import pandas as pd
+import pytest
+from benchmarks.synthetic import synthetic_ohlc
+from core_strategy import decide_series
+from fills import PATHS, _codes, simulate_fills
+
+def reference(df, sig, entry, path, gaps, slippage_bps, breakeven, capital=100000, risk_per_trade=0.01):
+    """Прямой цикл по барам с теми же правилами исполнения; [(reason, бар выхода, цена, size, pnl)]."""
+    o, h, l, c = (df[k].to_numpy(dtype=float) for k in ("Open", "High", "Low", "Close"))
+    act = _codes(sig["base_action"])
+    E, T1, T2, SL = (sig[f"base_{k}"].to_numpy(dtype=float) for k in ("entry", "tp1", "tp2", "sl"))
+    slip, end, out, t = slippage_bps / 1e4, len(df) - 1, [], 59
+    while t < end:
+        if act[t] == 0 or t + 1 >= end:
+            t += 1
+            continue
+        sd = int(act[t])
+        base = o[t + 1] if entry == "next_open" else E[t]
+        fill = base * (1 + sd * slip)
+        sl, tp1, tp2 = SL[t], T1[t], T2[t]
+        if (fill - sl) * sd <= 0 or (entry == "next_open" and (tp1 - base) * sd <= 0):
+            t += 1
+            continue
+        size = max(1, int(capital * risk_per_trade / ((fill - sl) * sd)))
+        stop2 = fill if breakeven else sl
+        half, stop, res, pnl = False, sl, None, 0.0
+        for j in range(t + 1, end):
+            # «лонговые» координаты: у шорта цены с обратным знаком
+            lo, hi = (l[j], h[j]) if sd == 1 else (-h[j], -l[j])
+            O, A, B = o[j] * sd, tp1 * sd, tp2 * sd
+
+            def first(target, gap_stop):
+                if gap_stop:
+                    return False
+                if gaps and O >= target:
+                    return True
+                return {"worst": False, "best": True}.get(path, (c[j] >= o[j]) != (sd == 1))
+
+            def stop_px(level, gap_stop):
+                return (o[j] if gap_stop else level) * (1 - sd * slip)
+
+            def target_px(level):
+                return o[j] if gaps and O >= level * sd else level
+
+            if not half:
+                gap_stop = gaps and O <= sl * sd
+                if lo <= sl * sd and not (hi >= A and first(A, gap_stop)):
+                    px = stop_px(sl, gap_stop)
+                    res, pnl = ("SL", j, px), (px - fill) * sd * size
+                    break
+                if hi >= A:
+                    half = True
+                    pnl += (target_px(tp1) - fill) * sd * size * 0.5
+                    # остаток на том же баре: если бар задел и стоп (общий бар или гэп через TP1) —
+                    # TP2 против стопа по правилу path, стоп выставлен уже внутри бара
+                    same = (lo <= sl * sd or (gaps and O >= A)) and lo <= stop2 * sd
+                    if same and not (hi >= B and first(B, False)):
+                        px = stop2 * (1 - sd * slip)
+                        res, pnl = ("TP1+SL", j, px), pnl + (px - fill) * sd * size * 0.5
+                        break
+                    if hi >= B:
+                        px = target_px(tp2)
+                        res, pnl = ("TP2", j, px), pnl + (px - fill) * sd * size * 0.5
+                        break
+                    stop = stop2
+            else:
+                gap_stop = gaps and O <= stop * sd
+                if lo <= stop * sd and not (hi >= B and first(B, gap_stop)):
+                    px = stop_px(stop, gap_stop)
+                    res, pnl = ("TP1+SL", j, px), pnl + (px - fill) * sd * size * 0.5
+                    break
+                if hi >= B:
+                    px = target_px(tp2)
+                    res, pnl = ("TP2", j, px), pnl + (px - fill) * sd * size * 0.5
+                    break
+        if res is None:
+            out.append(("OPEN",))
+            break
+        capital += pnl
+        out.append((res[0], res[1], round(res[2], 6), size, round(pnl, 4)))
+        t = res[1]
+    return out
+
+def _trades(df, tr):
+    pos = {d: i for i, d in enumerate(df.index.normalize().values)}
+    got = []
+    for row in tr.itertuples():
+        if row.reason == "OPEN":
+            got.append(("OPEN",))
+            break
+        got.append((row.reason, pos[row.exit_date.to_datetime64()], round(row.exit, 6), row.size, round(row.pnl, 4)))
+    return got
+
+@pytest.mark.parametrize("seed", [0, 3])
+@pytest.mark.parametrize("horizon", ["ST", "MID", "LT"])
+def test_matches_reference(seed, horizon):
+    df = synthetic_ohlc(2500, seed=seed, gap_prob=0.1)
+    sig = decide_series(df, horizon)
+    for entry in ("next_open", "signal"):
+        for path in PATHS:
+            for gaps in (True, False):
+                for be in (False, True):
+                    _, tr = simulate_fills(df, sig, entry=entry, path=path, gaps=gaps, slippage_bps=7, breakeven=be)
+                    assert _trades(df, tr) == reference(df, sig, entry, path, gaps, 7, be), (entry, path, gaps, be)
+
+def _one_bar(o, h, l, c):
+    """Лонг 100 / SL 98 / TP1 104 / TP2 108: сигнал на баре 59, ведение — с бара 60."""
+    n = 63
+    df = pd.DataFrame({"Open": 100.0, "High": 100.5, "Low": 99.5, "Close": 100.0},
+                      index=pd.bdate_range("2020-01-01", periods=n))
+    df.iloc[60] = [o, h, l, c]
+    sig = pd.DataFrame({"base_action": "WAIT", "base_entry": np.nan, "base_tp1": np.nan,
+                        "base_tp2": np.nan, "base_sl": np.nan}, index=df.index)
+    sig.iloc[59] = ["LONG", 100.0, 104.0, 108.0, 98.0]
+    return df, sig
+
+@pytest.mark.parametrize("path, reason", [("worst", "TP1+SL"), ("ohlc", "TP1+SL"), ("best", "TP2")])
+def test_gap_through_tp1_then_stop_and_tp2_on_same_bar(path, reason):
+    # гэп через TP1, затем на том же баре и стоп, и TP2: белая свеча — O-L-H, стоп раньше
+    df, sig = _one_bar(105.0, 109.0, 97.0, 106.0)
+    _, tr = simulate_fills(df, sig, entry="signal", path=path)
+    assert list(tr["reason"]) == [reason]
+    assert tr["exit_tp1"].iloc[0] == 105.0
+    assert _trades(df, tr) == reference(df, sig, "signal", path, True, 0, False)
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+JobScheduler на настоящем spawn-пуле: дедупликация, статусы, результат после перезапуска.
+Процессы пула импортируют этот модуль заново, поэтому окружение (CAPINTEL_DATA_DIR с
+заранее загруженной историей) задаётся в фикстуре, а не на уровне модуля.
+"""
+from __future__ import annotations
+import os
+import time
+import pandas as pd
+import pytest
+from benchmarks.synthetic import synthetic_ohlc
+from jobs import ACTIVE, JobScheduler, read_job, write_job
+from market_data import FrameSource
+from price_store import PriceStore
+
+def wait(sched: JobScheduler, jid: str, timeout: float = 120.0) -> dict:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        meta = sched.status(jid)
+        if meta["status"] not in ACTIVE:
+            return meta
+        time.sleep(0.05)
+    raise TimeoutError(f"{jid}: {meta}")
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    # хранилище свежее и с полной историей: процессы пула не ходят в сеть
+    df = synthetic_ohlc(400, seed=5)
+    df.index = pd.bdate_range(end=pd.Timestamp.now().normalize(), periods=len(df))
+    root = str(tmp_path / "prices")
+    PriceStore(root, FrameSource({"QQQ": df})).load("QQQ", "max")
+    monkeypatch.setenv("CAPINTEL_DATA_DIR", root)
+    return root
+
+@pytest.fixture
+def sched(tmp_path, data_dir):
+    s = JobScheduler(str(tmp_path / "jobs"), max_workers=1)
+    yield s
+    s.shutdown(wait=True)
+
+def test_job_lifecycle_and_restart(sched, tmp_path):
+    jid = sched.submit("backtest", ticker="QQQ", period="1y", horizon="MID")
+    # та же задача в другом написании — тот же id, второй раз не ставится
+    assert sched.submit("backtest", ticker="qqq ", period="1y", horizon="MID") == jid
+    assert len(sched._futures) <= 1
+    assert sched.status(jid)["status"] in ACTIVE + ("done",)
+    assert sched.submit("backtest", ticker="QQQ", period="1y", horizon="ST") != jid
+
+    meta = wait(sched, jid)
+    assert meta["status"] == "done", meta.get("error")
+    assert meta["progress"] == 1.0 and meta["spec"]["ticker"] == "QQQ"
+    res = sched.result(jid)
+    assert set(res) >= {"equity", "trades", "metrics"} and len(res["equity"])
+
+    # новый планировщик на том же каталоге (перезапуск скрипта): статус и результат с диска
+    again = JobScheduler(sched.directory)
+    assert again.status(jid)["status"] == "done"
+    pd.testing.assert_frame_equal(again.result(jid)["equity"], res["equity"])
+    assert again.submit("backtest", ticker=" qqq", period="1y", horizon="MID") == jid
+    assert again._pool is None  # готовая задача не пересчитывается
+    assert jid in {m["id"] for m in again.jobs()}
+
+    # результат потерян — задача ставится заново
+    os.remove(os.path.join(sched.directory, jid, "result.pkl"))
+    assert again.submit("backtest", ticker="QQQ", period="1y", horizon="MID") == jid
+    assert wait(again, jid)["status"] == "done" and again.result(jid) is not None
+    again.shutdown(wait=True)
+
+def test_failed_job(sched):
+    jid = sched.submit("backtest", ticker="QQQ", period="1y", fills={"no_such_option": 1})
+    meta = wait(sched, jid)
+    assert meta["status"] == "failed" and meta["error"].startswith("TypeError")
+    assert sched.result(jid) is None
+    # упавшая задача перезапускается тем же id
+    assert sched.submit("backtest", ticker="QQQ", period="1y", fills={"no_such_option": 1}) == jid
+    assert wait(sched, jid)["status"] == "failed"
+
+def test_orphaned_job_reported_failed(tmp_path):
+    directory = str(tmp_path / "jobs")
+    sched = JobScheduler(directory)
+    # запись от умершего процесса: статус running, а pid уже не существует
+    write_job(directory, "backtest-dead", {"id": "backtest-dead", "kind": "backtest", "spec": {},
+                                          "status": "running", "pid": 2 ** 22 + 1, "submitted": 0})
+    assert sched.status("backtest-dead")["status"] == "failed"
+    assert read_job(directory, "backtest-dead")["status"] == "running"  # на диске не трогаем
+
+def test_unknown_kind(tmp_path):
+    with pytest.raises(ValueError):
+        JobScheduler(str(tmp_path)).submit("nope", ticker="QQQ")
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""PriceStore поверх FrameSource: содержимое memmap после каждой докачки равно источнику."""
+from __future__ import annotations
+import numpy as np
+import pandas as pd
+import pytest
+import price_store
+from benchmarks.synthetic import synthetic_ohlc
+from market_data import FrameSource
+from price_store import PriceStore, period_start
+
+class CountingSource(FrameSource):
+    def __init__(self, frames):
+        super().__init__(frames)
+        self.calls = []
+
+    def fetch(self, ticker, start):
+        self.calls.append(start)
+        return super().fetch(ticker, start)
+
+def recent(n: int, seed: int = 0) -> pd.DataFrame:
+    # история, кончающаяся сегодня: period_start() считает от текущей даты
+    df = synthetic_ohlc(n, seed=seed)
+    df.index = pd.bdate_range(end=pd.Timestamp.now().normalize(), periods=n)
+    return df
+
+def assert_stored(store: PriceStore, ticker: str, expected: pd.DataFrame):
+    ts, px = store.read_arrays(ticker)
+    np.testing.assert_array_equal(ts, expected.index.asi8)
+    np.testing.assert_array_equal(px, expected[["Open", "High", "Low", "Close"]].to_numpy(dtype=px.dtype))
+
+@pytest.fixture
+def src():
+    return CountingSource({"AAA": recent(800)})
+
+def test_first_load_into_empty_store(tmp_path, src):
+    store = PriceStore(str(tmp_path), src)
+    assert store.read_arrays("AAA")[0].size == 0
+    df = store.load("AAA", "max")
+    assert src.calls == [None]
+    assert_stored(store, "AAA", src.frames["AAA"])
+    pd.testing.assert_frame_equal(df, src.frames["AAA"], check_freq=False)
+
+def test_fresh_store_skips_source(tmp_path, src):
+    store = PriceStore(str(tmp_path), src)
+    store.load("AAA", "max")
+    store.load("AAA", "max")
+    assert store.top_up("AAA") == 0
+    assert len(src.calls) == 1
+
+def test_tail_rewrite_and_append(tmp_path, src):
+    full = src.frames["AAA"]
+    src.frames["AAA"] = full.iloc[:700].copy()
+    store = PriceStore(str(tmp_path), src)
+    store.top_up("AAA")
+    assert_stored(store, "AAA", full.iloc[:700])
+    ts_before, _ = store.read_arrays("AAA")  # чужой memmap должен пережить докачку
+
+    # последний сохранённый бар был неполным: источник отдаёт его обновлённым и ещё 100 новых
+    grown = full.copy()
+    grown.iloc[699] = grown.iloc[699] * 1.01
+    src.frames["AAA"] = grown
+    written = store.top_up("AAA", force=True)
+    assert src.calls[-1] == full.index[699]
+    assert written == 101
+    assert_stored(store, "AAA", grown)
+    np.testing.assert_array_equal(ts_before, grown.index.asi8[:700])
+
+    # без новых баров: перезапись только последнего
+    grown2 = grown.copy()
+    grown2.iloc[-1] = grown2.iloc[-1] * 0.99
+    src.frames["AAA"] = grown2
+    assert store.top_up("AAA", force=True) == 1
+    assert_stored(store, "AAA", grown2)
+
+def test_backfill_on_longer_period(tmp_path, src):
+    full = src.frames["AAA"]
+    store = PriceStore(str(tmp_path), src)
+    s1 = full.index[500]
+    store.top_up("AAA", s1)
+    assert_stored(store, "AAA", full[full.index >= s1])
+    # запрошено раньше, чем хранится, — полная перекачка с новой даты, даже если данные свежие
+    s2 = full.index[200]
+    store.top_up("AAA", s2)
+    assert src.calls == [s1, s2]
+    assert_stored(store, "AAA", full[full.index >= s2])
+    # более короткий период — без запроса к источнику
+    store.top_up("AAA", full.index[300])
+    assert len(src.calls) == 2
+    # вся история
+    store.top_up("AAA", None)
+    assert src.calls[-1] is None
+    assert_stored(store, "AAA", full)
+
+@pytest.mark.parametrize("dtype", ["f8", "f4"])
+def test_load_slices_period(tmp_path, src, dtype):
+    store = PriceStore(str(tmp_path), src, dtype=dtype)
+    full = src.frames["AAA"]
+    for period in ("1y", "6mo", "60d", "max"):
+        start = period_start(period)
+        exp = full if start is None else full[full.index >= start]
+        got = store.load("AAA", period)
+        np.testing.assert_array_equal(got.index.asi8, exp.index.asi8)
+        np.testing.assert_array_equal(got.to_numpy(), exp.to_numpy(dtype=dtype))
+
+def test_load_history_uses_default_store(tmp_path, src, monkeypatch):
+    monkeypatch.setattr(price_store, "_default", PriceStore(str(tmp_path), src))
+    df = price_store.load_history("aaa", "1y")
+    full = src.frames["AAA"]
+    pd.testing.assert_frame_equal(df, full[full.index >= period_start("1y")], check_freq=False)